@@ -1,41 +1,90 @@
 import dash
-from dash import dcc, html, Input, Output, State, no_update, callback_context
+from dash import dcc, html, dash_table, Input, Output, State, no_update, callback_context
 import dash_bootstrap_components as dbc
 import plotly.graph_objs as go
-import sqlite3
+import functools
 import os
+import time
+import datetime
 
 
 # Importaciones locales
 from db import (
-    init_db, add_user, user_exists, authenticate_user,
+    init_db, add_user, user_exists, bootstrap_session,
     get_patients_by_user, get_patient_info, save_patient_info,
     guardar_entrenamiento, create_patient,
     save_questionnaire_for_patient, get_nombre_paciente_from_username,
-    get_patient_averages, get_training_data_for_patient
+    get_patient_averages, count_sessions, ensure_patient,
+    get_roster, coach_scope
 )
-from questionnaires import questionnaire_layout, get_training_data, get_comparison_figure
-from sensors import load_ecg_and_compute_bpm
+from questionnaires import questionnaire_layout, get_training_data, get_comparison_figure, get_workload_figure
+import ecg_cache
+from jobs import submit_job, get_job
+from ecg_store import ensure_binary
+from ecg_downsample import get_trace
+from live_ingest import LIVE_PORT, hub as live_hub, start_in_thread as start_live_ingest
+import numpy as np
+from figure_cache import cache_stats
+from fig_json import figure_dict, configure as configure_json
+from flask_compress import Compress
+from metrics import instrument_dash, metrics_response, profile_report
+from flask import request as flask_request
+import db
+from workload import squad_status
+from squad import squad_overview
 
 
 # Inicialización
 init_db()
+if LIVE_PORT: start_live_ingest()
 
 
 external_stylesheets = [dbc.themes.DARKLY]
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets, suppress_callback_exceptions=True)
 app = dash.Dash(__name__)
 server = app.server 
+# Respuestas comprimidas (brotli si el navegador lo acepta, si no gzip) y JSON con orjson
+server.config.update(COMPRESS_ALGORITHM=["br", "gzip"], COMPRESS_LEVEL=6, COMPRESS_BR_LEVEL=4)
+Compress(server)
+configure_json()
 app.title = "BioMonitor Pro"
+# A partir de aquí todos los @app.callback quedan instrumentados (ver metrics.py)
+instrument_dash(app)
+
+
+# Contadores de la caché de figuras y de la de análisis de ECG (para dimensionar FIGURE_CACHE_SIZE y ECG_CACHE_MB)
+@server.route("/cache-stats")
+def cache_stats_endpoint(): return {**cache_stats(), "ecg": ecg_cache.stats()}
+
+
+# Histogramas de latencia en formato Prometheus y perfil muestreado (PROFILE_SAMPLE)
+@server.route("/metrics")
+def metrics_endpoint():
+    text = metrics_response(flask_request.remote_addr)
+    if text is None: return "forbidden\n", 403
+    return text, 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+@server.route("/metrics/profile")
+def profile_endpoint():
+    if metrics_response(flask_request.remote_addr) is None: return "forbidden\n", 403
+    return profile_report(), 200, {"Content-Type": "text/plain; charset=utf-8"}
 
 
 COLOR_BG = "#121212"
 COLOR_CARD = "#1E1E1E"
+ECG_MAX_POINTS = 3000
+LIVE_TICK_MS = 1000
+LIVE_WINDOW_S = 10
 
 
 # -------------------------------------------------------------------------
 # GHOSTS (Elementos ocultos OBLIGATORIOS)
 # -------------------------------------------------------------------------
+# Las partes estáticas de las páginas se construyen una sola vez (lru_cache) y el router
+# las reutiliza; por petición solo se crea lo que depende de la sesión. Nadie debe
+# modificar estos componentes después de crearlos: son compartidos entre peticiones.
+@functools.lru_cache(maxsize=None)
 def get_runner_ghosts():
     return html.Div(style={"display": "none"}, children=[
         dbc.Button(id="btn-view-register"), dbc.Button(id="btn-view-graphs"), dbc.Button(id="btn-run-save-profile"),
@@ -46,23 +95,30 @@ def get_runner_ghosts():
         html.Div(id="kpi-fatiga"), html.Div(id="kpi-rpe"), html.Div(id="kpi-suenio"), html.Div(id="kpi-carga"), html.Div(id="kpi-bpm"),
         html.Div(id="data-debug-msg"),
         dcc.Input(id="fatiga"), dcc.Input(id="suenio"), dcc.Input(id="rpe"), dbc.Input(id="tiempo_entrenamiento"),
-        dcc.Dropdown(id="sensor-file-dropdown"), html.Div(id="ecg-graph-container"),      
+        dcc.Dropdown(id="sensor-file-dropdown"), html.Div(id="ecg-graph-container"),
+        dcc.Graph(id="ecg-graph"), dcc.Store(id="ecg-file"), dcc.Store(id="ecg-job"), dcc.Interval(id="ecg-job-poll", disabled=True),
+        dbc.RadioItems(id="runner-load-range"), dcc.Store(id="runner-data"), dcc.Store(id="runner-data-request"),
         dbc.Button(id="submit-questionnaire"), html.Div(id="runner-feedback")
     ])
 
 
+@functools.lru_cache(maxsize=None)
 def get_manager_ghosts():
     return html.Div(style={"display": "none"}, children=[
         dbc.Button(id="btn-new-patient"),
         dcc.Dropdown(id="patient-dropdown"),
         html.Div(id="dashboard-content"),
-        html.Div(id="patient-list")
+        html.Div(id="patient-list"),
+        dash_table.DataTable(id="squad-table"),
+        dcc.Graph(id="load-graph"), dbc.RadioItems(id="load-range"),
+        dcc.Graph(id="live-ecg-graph"), dcc.Interval(id="live-tick", disabled=True), dcc.Store(id="live-cursor"), html.Span(id="live-bpm")
     ])
 
 
 # -------------------------------------------------------------------------
 # LOGIN
 # -------------------------------------------------------------------------
+@functools.lru_cache(maxsize=None)
 def login_layout():
     login_form = html.Div(id="login-view", children=[
         dbc.Form([
@@ -95,10 +151,12 @@ def login_layout():
 # -------------------------------------------------------------------------
 # DASHBOARD CORREDOR (ATLETA)
 # -------------------------------------------------------------------------
-def runner_dashboard_layout(username):
-    pac_name = get_nombre_paciente_from_username(username)
-    info = get_patient_info(pac_name) if pac_name else {}
-   
+def runner_dashboard_layout(username, info=None):
+    # La ficha llega en la sesión (bootstrap_session); las sesiones antiguas la consultan aquí
+    if info is None:
+        pac_name = get_nombre_paciente_from_username(username)
+        info = get_patient_info(pac_name) if pac_name else {}
+
     register_view = html.Div(id="runner-register-view", children=[
         html.H3("📝 Mis Datos", className="text-white mb-4 text-center"),
         dbc.Card([dbc.CardHeader("Perfil Físico"), dbc.CardBody([
@@ -108,14 +166,26 @@ def runner_dashboard_layout(username):
                          dbc.Col([html.Label("VO2 Max"), dbc.Input(id="run-vo2", type="number", value=info.get("vo2",45), className="bg-dark text-white")])], className="mb-3"),
                 dbc.Button("💾 Actualizar Perfil", id="btn-run-save-profile", color="success", size="sm", className="w-100")
         ])], style={"backgroundColor": COLOR_CARD}, className="mb-4"),
+        *runner_session_card()
+    ])
+
+    return dbc.Container([
+        html.Div([html.H2(f"Hola, {username}", className="text-white"), html.P("Panel Atleta", className="text-muted")], className="py-4"),
+        runner_nav(), register_view, runner_graphs_view(), runner_footer()
+    ], fluid=True)
 
 
+@functools.lru_cache(maxsize=None)
+def runner_session_card():
+    return (
         dbc.Card([dbc.CardHeader("Sesión de Hoy"), dbc.CardBody(questionnaire_layout)], style={"backgroundColor": COLOR_CARD}),
         html.Div(id="runner-feedback", className="mt-3 text-center")
-    ])
+    )
 
 
-    graphs_view = html.Div(id="runner-graphs-view", style={"display": "none"}, children=[
+@functools.lru_cache(maxsize=None)
+def runner_graphs_view():
+    return html.Div(id="runner-graphs-view", style={"display": "none"}, children=[
         dbc.Row([dbc.Col(html.H3("📊 Tu Rendimiento", className="text-white"), width=8), dbc.Col(dbc.Button("🔙 Volver", id="btn-back-to-register", color="light", outline=True, className="float-end"), width=4)], className="mb-4"),
        
         html.Div(id="data-debug-msg", className="text-center mb-3 text-info small"),
@@ -128,19 +198,25 @@ def runner_dashboard_layout(username):
             dbc.Col(dbc.Card([dbc.CardBody([html.H6("BPM Medio", className="text-muted"), html.H2(id="kpi-bpm", className="text-success")])], style={"backgroundColor": COLOR_CARD}, className="mb-3"), width=6, lg=3),
         ]),
         dbc.Row([
-            dbc.Col(dbc.Card([dbc.CardHeader("Evolución de Carga"), dbc.CardBody(dcc.Graph(id="runner-graph-load", style={"height": "350px"}))], style={"backgroundColor": COLOR_CARD}), md=12, className="mb-4"),
+            dbc.Col(dbc.Card([dbc.CardHeader(["Evolución de Carga", load_range_selector("runner-load-range")]), dbc.CardBody(dcc.Graph(id="runner-graph-load", style={"height": "350px"}))], style={"backgroundColor": COLOR_CARD}), md=12, className="mb-4"),
             dbc.Col(dbc.Card([dbc.CardHeader("Comparativa con Equipo"), dbc.CardBody(dcc.Graph(id="runner-graph-compare", style={"height": "350px"}))], style={"backgroundColor": COLOR_CARD}), md=12),
-        ])
+        ]),
+        # Datos de las gráficas precargados al entrar; se piden de nuevo solo tras guardar
+        dcc.Store(id="runner-data"), dcc.Store(id="runner-data-request")
     ])
 
 
-    return dbc.Container([
-        html.Div([html.H2(f"Hola, {username}", className="text-white"), html.P("Panel Atleta", className="text-muted")], className="py-4"),
-        dbc.Row([dbc.Col(dbc.Button("📝 REGISTRO", id="btn-view-register", color="primary", className="w-100"), width=6), dbc.Col(dbc.Button("📈 GRÁFICAS", id="btn-view-graphs", color="info", className="w-100"), width=6)], className="mb-4"),
-        register_view, graphs_view,
+@functools.lru_cache(maxsize=None)
+def runner_nav():
+    return dbc.Row([dbc.Col(dbc.Button("📝 REGISTRO", id="btn-view-register", color="primary", className="w-100"), width=6), dbc.Col(dbc.Button("📈 GRÁFICAS", id="btn-view-graphs", color="info", className="w-100"), width=6)], className="mb-4")
+
+
+@functools.lru_cache(maxsize=None)
+def runner_footer():
+    return html.Div([
         html.Div(dbc.Button("Salir", id="btn-logout", color="danger", outline=True, size="sm"), className="mt-5"),
         get_manager_ghosts()
-    ], fluid=True)
+    ])
 
 
 # -------------------------------------------------------------------------
@@ -149,26 +225,31 @@ def runner_dashboard_layout(username):
 def manager_dashboard_layout(session):
     role = session["role"]
     username = session["user"]
-    patients = get_patients_by_user(username, role)
+    # Primera página del desplegable y tamaño de la plantilla, ya leídos en el login
+    roster = session.get("plantilla")
+    patients = roster["opciones"] if roster else get_patients_by_user(username, role)
     btn_new_style = {"display": "block"} if role == "entrenador" else {"display": "none"}
    
     sidebar = dbc.Col([
         html.H4("BioMonitor", className="text-white mb-4"),
-        html.Label("Seleccionar Atleta:", className="text-muted small"),
-        dcc.Dropdown(id="patient-dropdown", options=patients, placeholder="Elige un corredor...", className="mb-4"),
+        html.Label(f"Seleccionar Atleta ({roster['atletas']}):" if roster else "Seleccionar Atleta:", className="text-muted small"),
+        dcc.Dropdown(id="patient-dropdown", options=patients, placeholder="Busca un corredor...", className="mb-4"),
        
         dbc.Button("➕ Nuevo Atleta", id="btn-new-patient", color="success", className="w-100 mb-3", size="sm", style=btn_new_style),
         dbc.Button("Salir", id="btn-logout", color="danger", outline=True, className="w-100 mt-auto", size="sm")
     ], width=12, lg=3, className="bg-dark p-3 vh-100")
    
-    # ZONA PRINCIPAL: MUESTRA DATOS DIRECTAMENTE
-    content = dbc.Col([
+    return dbc.Row([sidebar, manager_content()], className="g-0")
+
+
+# ZONA PRINCIPAL: MUESTRA DATOS DIRECTAMENTE
+@functools.lru_cache(maxsize=None)
+def manager_content():
+    return dbc.Col([
         html.H3("Panel de Entrenador", className="text-white mt-4 mb-4"),
         html.Div(id="dashboard-content"), # AQUÍ SE PINTARÁN LAS GRÁFICAS
         get_runner_ghosts()
     ], width=12, lg=9)
-   
-    return dbc.Row([sidebar, content], className="g-0")
 
 
 app.layout = html.Div(style={"backgroundColor": COLOR_BG, "color": "#E0E0E0", "minHeight": "100vh"}, children=[
@@ -180,8 +261,13 @@ app.layout = html.Div(style={"backgroundColor": COLOR_BG, "color": "#E0E0E0", "m
 # -------------------------------------------------------------------------
 # CALLBACKS GENERALES
 # -------------------------------------------------------------------------
-@app.callback([Output("login-view", "style"), Output("register-view", "style")], Input("login-tabs", "active_tab"))
-def switch_forms(tab): return ({"display": "none"}, {"display": "block"}) if tab == "tab-register" else ({"display": "block"}, {"display": "none"})
+# Cambiar de pestaña solo cambia estilos: se resuelve en el navegador, sin petición al servidor
+app.clientside_callback(
+    """function(tab) {
+        return tab === "tab-register" ? [{display: "none"}, {display: "block"}] : [{display: "block"}, {display: "none"}];
+    }""",
+    [Output("login-view", "style"), Output("register-view", "style")], Input("login-tabs", "active_tab")
+)
 
 
 @app.callback([Output("auth-feedback", "children"), Output("url", "pathname"), Output("session", "data")], [Input("btn-log", "n_clicks"), Input("btn-reg", "n_clicks")], [State("log-user", "value"), State("log-pass", "value"), State("reg-user", "value"), State("reg-pass", "value"), State("reg-role", "value")], prevent_initial_call=True)
@@ -194,51 +280,77 @@ def auth_handler(n_log, n_reg, l_u, l_p, r_u, r_p, r_role):
         if add_user(r_u, r_p, r_role): return "✅ Cuenta creada. Entra.", no_update, no_update
         return "❌ Error BD", no_update, no_update
     if trigger == "btn-log":
-        role = authenticate_user(l_u, l_p)
-        if role: return "", "/dashboard", {"user": l_u, "role": role}
+        # Rol, ficha y resumen de la plantilla en una consulta: el router ya no vuelve a la BD
+        session = bootstrap_session(l_u, l_p)
+        if session: return "", "/dashboard", session
         return "❌ Credenciales incorrectas", no_update, no_update
     return no_update, no_update, no_update
 
 
-# --- CALLBACK DE CORREDOR ---
-@app.callback(
-    [Output("runner-register-view", "style"), Output("runner-graphs-view", "style"),
-     Output("runner-graph-load", "figure"), Output("runner-graph-compare", "figure"),
+# --- CALLBACKS DE CORREDOR ---
+# Registro/gráficas es solo mostrar u ocultar: en el navegador
+app.clientside_callback(
+    """function(nReg, nGraph, nBack) {
+        const trigger = dash_clientside.callback_context.triggered_id;
+        if (trigger === "btn-view-graphs") return [{display: "none"}, {display: "block"}];
+        if (trigger === "btn-view-register" || trigger === "btn-back-to-register") return [{display: "block"}, {display: "none"}];
+        return [dash_clientside.no_update, dash_clientside.no_update];
+    }""",
+    [Output("runner-register-view", "style"), Output("runner-graphs-view", "style")],
+    [Input("btn-view-register", "n_clicks"), Input("btn-view-graphs", "n_clicks"), Input("btn-back-to-register", "n_clicks")],
+    prevent_initial_call=True
+)
+
+# Al montar el panel del corredor se pide una vez el paquete de datos de las gráficas
+# (los fantasmas del login y del entrenador no cuentan: allí no hay sesión de corredor)
+app.clientside_callback(
+    """function(id, session) {
+        return session && session.role === "paciente" ? Date.now() : dash_clientside.no_update;
+    }""",
+    Output("runner-data-request", "data"), Input("runner-graphs-view", "id"), State("session", "data")
+)
+
+
+@app.callback(Output("runner-data", "data"), Input("runner-data-request", "data"),
+              [State("session", "data"), State("run-name", "value"), State("runner-load-range", "value")], prevent_initial_call=True)
+def runner_fetch_data(request, session, run_name_input, days):
+    # Único viaje al servidor de la vista de gráficas: figuras, KPIs y mensaje en un Store
+    if not request or not (session or run_name_input): return no_update
+    user = session["user"] if session else run_name_input
+    target = session_patient(session, user)
+    try:
+        fig_load = get_training_data(target, *load_range_dates(days, None, ""))
+        fig_comp = get_comparison_figure([target])
+        avgs = get_patient_averages(target)
+        n_sessions = count_sessions(target)
+        msg = f"⚠️ NO HAY DATOS para '{target}'. Registra una sesión primero." if n_sessions == 0 else f"✅ Mostrando {n_sessions} registros para '{target}'."
+        return {"load": fig_load, "compare": fig_comp, "msg": msg,
+                "kpis": {"fatiga": str(avgs["fatiga"]), "rpe": str(avgs["rpe"]), "suenio": str(avgs["suenio"]), "bpm": f"{avgs['bpm']} bpm"}}
+    except Exception as e:
+        return {"msg": f"Error: {str(e)}"}
+
+
+# Del Store a las gráficas y KPIs, en el navegador
+app.clientside_callback(
+    """function(data) {
+        const nu = dash_clientside.no_update;
+        if (!data) return [nu, nu, nu, nu, nu, nu, nu];
+        const k = data.kpis || {};
+        return [data.load || nu, data.compare || nu, k.fatiga || nu, k.rpe || nu, k.suenio || nu, k.bpm || nu, data.msg];
+    }""",
+    [Output("runner-graph-load", "figure"), Output("runner-graph-compare", "figure"),
      Output("kpi-fatiga", "children"), Output("kpi-rpe", "children"),
      Output("kpi-suenio", "children"), Output("kpi-bpm", "children"),
      Output("data-debug-msg", "children")],
-    [Input("btn-view-register", "n_clicks"), Input("btn-view-graphs", "n_clicks"), Input("btn-back-to-register", "n_clicks")],
-    [State("session", "data"), State("run-name", "value")], prevent_initial_call=True
+    Input("runner-data", "data")
 )
-def runner_view_toggle(n_reg, n_graph, n_back, session, run_name_input):
-    if not session and not run_name_input: return no_update, no_update, no_update, no_update, no_update, no_update, no_update, no_update, no_update
-    ctx = callback_context
-    trigger = ctx.triggered[0]['prop_id'].split('.')[0]
-    user = session["user"] if session else run_name_input
-   
-    if trigger == "btn-view-register" or trigger == "btn-back-to-register":
-        return {"display": "block"}, {"display": "none"}, no_update, no_update, no_update, no_update, no_update, no_update, ""
-   
-    if trigger == "btn-view-graphs":
-        pac = get_nombre_paciente_from_username(user)
-        target = pac if pac else user
-       
-        try:
-            fig_load = get_training_data(target)
-            fig_comp = get_comparison_figure([target])
-            avgs = get_patient_averages(target)
-            raw_data = get_training_data_for_patient(target)
-            msg = f"⚠️ NO HAY DATOS para '{target}'. Registra una sesión primero." if len(raw_data) == 0 else f"✅ Mostrando {len(raw_data)} registros para '{target}'."
-            return {"display": "none"}, {"display": "block"}, fig_load, fig_comp, str(avgs["fatiga"]), str(avgs["rpe"]), str(avgs["suenio"]), f"{avgs['bpm']} bpm", msg
-        except Exception as e:
-            return no_update, no_update, no_update, no_update, no_update, no_update, no_update, no_update, f"Error: {str(e)}"
-       
-    return no_update, no_update, no_update, no_update, no_update, no_update, no_update, no_update, no_update
 
 
 # --- CALLBACK DE GUARDADO ---
 @app.callback(
-    [Output("runner-feedback", "children"), Output("ecg-graph-container", "children")],
+    [Output("runner-feedback", "children"), Output("ecg-graph-container", "children"),
+     Output("ecg-job", "data"), Output("ecg-job-poll", "disabled"),
+     Output("runner-data-request", "data", allow_duplicate=True)],
     Input("submit-questionnaire", "n_clicks"),
     [State("session", "data"), State("run-name", "value"),
      State("fatiga", "value"), State("suenio", "value"),
@@ -248,66 +360,170 @@ def runner_view_toggle(n_reg, n_graph, n_back, session, run_name_input):
 def runner_submit_data(n, session, run_name_input, f, s, r, t, sensor_file):
     if session: user = session["user"]
     elif run_name_input: user = run_name_input
-    else: return html.Div("❌ Error: Escribe tu nombre arriba.", className="text-danger"), None
+    else: return html.Div("❌ Error: Escribe tu nombre arriba.", className="text-danger"), None, None, True, no_update
 
 
     try:
         val_fatiga, val_suenio, val_rpe, val_tiempo = int(f), int(s), int(r), float(t)
-        pac = get_nombre_paciente_from_username(user)
-        if not pac: pac = user
+        pac = session_patient(session, user)
         save_questionnaire_for_patient(user, pac, val_fatiga, val_suenio, val_rpe, val_tiempo)
        
-        calculated_bpm = 0
+        ecg_path = None
         ecg_graph = None
+        job = None
         if sensor_file and sensor_file != 'none':
             file_path = os.path.join("data", sensor_file)
             if os.path.exists(file_path):
-                time_ax, ecg_signal, bpm_val = load_ecg_and_compute_bpm(file_path)
-                calculated_bpm = int(bpm_val)
-                fig_ecg = go.Figure()
-                fig_ecg.add_trace(go.Scatter(x=time_ax[:1000], y=ecg_signal[:1000], mode='lines', name='ECG', line=dict(color="#FF0000")))
-                fig_ecg.update_layout(title=f"ECG Detectado - BPM: {calculated_bpm}", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color="white"), height=250, margin=dict(l=20,r=20,t=40,b=20))
-                ecg_graph = dcc.Graph(figure=fig_ecg)
+                # El CSV se convierte una vez a .ecg binario; después todo va por memmap
+                ecg_path = ensure_binary(file_path)
             else:
                 ecg_graph = html.Div(f"⚠️ Archivo no encontrado: {file_path}", className="text-warning")
 
 
-        guardar_entrenamiento(pac, val_tiempo, val_fatiga, val_rpe, bpm=calculated_bpm)
+        # El bpm se guarda a 0 y lo rellena el trabajo de ECG cuando termina
+        entrenamiento_id = guardar_entrenamiento(pac, val_tiempo, val_fatiga, val_rpe, bpm=0)
+        if ecg_path:
+            job = {"id": submit_job(pac, ecg_path, entrenamiento_id), "path": ecg_path}
+            info = get_job(job["id"])
+            # Grabación ya analizada (ecg_cache): el resultado se pinta ya, sin sondeo
+            if info["estado"] == "hecho": ecg_graph, job = ecg_result_view(job, info["resultado"]), None
+            else: ecg_graph = ecg_progress(0)
         feedback = html.Div([
             html.Div(f"✅ Guardado para: {pac}", className="text-success fw-bold"),
-            html.Div(f"BPM: {calculated_bpm}" if calculated_bpm > 0 else "", className="text-info small")
+            html.Div("⏳ Analizando ECG en segundo plano..." if job else "", className="text-info small")
         ])
-        return feedback, ecg_graph
-    except Exception as e: return html.Div(f"❌ Error: {str(e)}", className="text-danger"), None
+        # Hay datos nuevos: las gráficas se vuelven a pedir (una vez, no en cada clic)
+        return feedback, ecg_graph, job, job is None, time.time()
+    except Exception as e: return html.Div(f"❌ Error: {str(e)}", className="text-danger"), None, None, True, no_update
 
 
-@app.callback(Output("btn-run-save-profile", "children"), Input("btn-run-save-profile", "n_clicks"), [State("session", "data"), State("run-name", "value"), State("run-nac", "value"), State("run-fcr", "value"), State("run-vo2", "value")], prevent_initial_call=True)
+def ecg_progress(progress):
+    return html.Div([
+        html.Div("🫀 Procesando señal ECG...", className="text-muted small mb-1"),
+        dbc.Progress(value=int(progress * 100), striped=True, animated=True, className="mb-2")
+    ])
+
+
+# --- SONDEO DEL TRABAJO DE ECG ---
+@app.callback(
+    [Output("ecg-graph-container", "children", allow_duplicate=True), Output("ecg-job-poll", "disabled", allow_duplicate=True),
+     Output("runner-data-request", "data", allow_duplicate=True)],
+    Input("ecg-job-poll", "n_intervals"), State("ecg-job", "data"), prevent_initial_call=True
+)
+def ecg_job_status(n, job):
+    if not job: return no_update, True, no_update
+    info = get_job(job["id"])
+    if not info: return html.Div("⚠️ Trabajo de ECG no encontrado", className="text-warning"), True, no_update
+    if info["estado"] in ("pendiente", "en_curso"): return ecg_progress(info["progreso"] or 0), False, no_update
+    if info["estado"] == "error": return html.Div(f"❌ Error analizando ECG: {info['error']}", className="text-danger"), True, no_update
+
+    return ecg_result_view(job, info["resultado"]), True, time.time()  # el BPM medio ha cambiado: refrescar las gráficas
+
+
+def ecg_result_view(job, res):
+    bpm = int(res["bpm"])
+    return html.Div([
+        html.Div(f"BPM: {bpm}" if bpm > 0 else "", className="text-info small"),
+        html.Div(hrv_summary(res.get("hrv")), className="text-muted small"),
+        dcc.Store(id="ecg-file", data={"path": job["path"], "bpm": bpm}),
+        dcc.Graph(id="ecg-graph", figure=ecg_figure(job["path"], bpm, trace=res["trace"]))
+    ])
+
+
+def hrv_summary(hrv):
+    if not hrv or not hrv["rmssd"]: return ""
+    zones = " ".join(f"Z{z}: {hrv[f'zona{z}_s'] / 60:.0f}'" for z in range(1, 6))
+    return f"RMSSD {hrv['rmssd']:.0f} ms · SDNN {hrv['sdnn']:.0f} ms · pNN50 {hrv['pnn50']:.0f}% · {zones}"
+
+
+def ecg_figure(ecg_path, bpm, t_start=None, t_end=None, trace=None):
+    # Sesión completa (o el tramo del zoom) con presupuesto fijo de puntos. Siempre con
+    # arrays de numpy: una lista de floats se valida elemento a elemento y viaja como texto.
+    if trace: time_ax, ecg_signal = np.asarray(trace["t"], dtype=float), np.asarray(trace["y"], dtype=np.float32)
+    else: time_ax, ecg_signal = get_trace(ecg_path, t_start, t_end, max_points=ECG_MAX_POINTS)
+    fig_ecg = go.Figure()
+    fig_ecg.add_trace(go.Scattergl(x=time_ax, y=ecg_signal, mode='lines', name='ECG', line=dict(color="#FF0000", width=1)))
+    fig_ecg.update_layout(title=f"ECG Detectado - BPM: {bpm}", paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color="white"), height=250, margin=dict(l=20,r=20,t=40,b=20), uirevision=ecg_path)
+    if t_start is not None and t_end is not None: fig_ecg.update_xaxes(range=[t_start, t_end])
+    return figure_dict(fig_ecg)
+
+
+# --- ZOOM DEL ECG: pide a la pirámide el nivel adecuado al tramo visible ---
+@app.callback(Output("ecg-graph", "figure"), Input("ecg-graph", "relayoutData"), State("ecg-file", "data"), prevent_initial_call=True)
+def ecg_zoom(relayout, ecg_file):
+    if not relayout or not ecg_file: return no_update
+    if "xaxis.range[0]" in relayout:
+        t_start, t_end = float(relayout["xaxis.range[0]"]), float(relayout["xaxis.range[1]"])
+    elif relayout.get("xaxis.autorange"):
+        t_start, t_end = None, None
+    else: return no_update
+    return ecg_figure(ecg_file["path"], ecg_file["bpm"], t_start, t_end)
+
+
+# --- RANGO DE LA GRÁFICA DE CARGA: cada rango se pide a la BD con la agrupación adecuada ---
+LOAD_RANGES = [("1M", 30), ("3M", 91), ("6M", 182), ("1A", 365), ("Todo", 0)]
+
+
+def load_range_selector(component_id):
+    return dbc.RadioItems(id=component_id, options=[{"label": l, "value": d} for l, d in LOAD_RANGES], value=0,
+                          inline=True, className="float-end small")
+
+
+def load_range_dates(days, relayout, trigger):
+    # (inicio, fin) ISO; el zoom de la gráfica manda sobre el selector
+    if trigger.endswith("relayoutData") and relayout and "xaxis.range[0]" in relayout:
+        return str(relayout["xaxis.range[0]"])[:10], str(relayout["xaxis.range[1]"])[:10]
+    if trigger.endswith("relayoutData") and not (relayout and relayout.get("xaxis.autorange")):
+        return None
+    if not days: return None, None
+    today = datetime.date.today()
+    return (today - datetime.timedelta(days=days - 1)).isoformat(), today.isoformat()
+
+
+@app.callback(Output("load-graph", "figure"), [Input("load-range", "value"), Input("load-graph", "relayoutData")], State("patient-dropdown", "value"), prevent_initial_call=True)
+def manager_load_range(days, relayout, patient):
+    dates = load_range_dates(days, relayout, callback_context.triggered[0]["prop_id"])
+    if not patient or dates is None: return no_update
+    return get_training_data(patient, *dates)
+
+
+@app.callback(Output("runner-graph-load", "figure", allow_duplicate=True), [Input("runner-load-range", "value"), Input("runner-graph-load", "relayoutData")], [State("session", "data"), State("run-name", "value")], prevent_initial_call=True)
+def runner_load_range(days, relayout, session, run_name_input):
+    dates = load_range_dates(days, relayout, callback_context.triggered[0]["prop_id"])
+    user = session["user"] if session else run_name_input
+    if not user or dates is None: return no_update
+    return get_training_data(session_patient(session, user), *dates)
+
+
+@app.callback([Output("btn-run-save-profile", "children"), Output("session", "data", allow_duplicate=True)], Input("btn-run-save-profile", "n_clicks"), [State("session", "data"), State("run-name", "value"), State("run-nac", "value"), State("run-fcr", "value"), State("run-vo2", "value")], prevent_initial_call=True)
 def runner_save_profile(n, session, name, nac, fcr, vo2):
     if session: username = session["user"]
     elif name: username = name
-    else: return "❌ Escribe Nombre"
+    else: return "❌ Escribe Nombre", no_update
    
     pac = get_nombre_paciente_from_username(username)
     if not pac:
-        try:
-            conn = sqlite3.connect("database.db")
-            c = conn.cursor()
-            c.execute("INSERT INTO pacientes (username, nombre_paciente, entrenador_asociado, full_name, equipo, deporte, fcr, vo2) VALUES (?, ?, 'Auto', ?, 'Club', 'Running', 60, 45)", (username, username, username))
-            conn.commit()
-            conn.close()
-            pac = username
-        except: return "❌ Error DB"
+        try: pac = ensure_patient(username)
+        except: return "❌ Error DB", no_update
     try: val_fcr = int(fcr)
     except: val_fcr = 60
     try: val_vo2 = float(vo2)
     except: val_vo2 = 45.0
     save_patient_info(pac, name if name else pac, 0, 0, 0, "Personal", "Running", "Runner", nac, val_fcr, val_vo2)
-    return "✅ Actualizado"
+    # La ficha de la sesión es la que pinta el router al recargar: se mantiene al día
+    if not session: return "✅ Actualizado", no_update
+    perfil = {"full_name": name if name else pac, "nacionalidad": nac, "fcr": val_fcr, "vo2": val_vo2}
+    return "✅ Actualizado", {**session, "paciente": pac, "perfil": perfil}
+
+
+def session_patient(session, user):
+    # Paciente del corredor: viene en la sesión desde el login; si no, se busca por usuario
+    return (session or {}).get("paciente") or get_nombre_paciente_from_username(user) or user
 
 
 @app.callback(Output("page-content", "children"), [Input("url", "pathname"), State("session", "data")])
 def router(path, session):
-    if path == "/dashboard" and session: return runner_dashboard_layout(session["user"]) if session["role"] == "paciente" else manager_dashboard_layout(session)
+    if path == "/dashboard" and session: return runner_dashboard_layout(session["user"], session.get("perfil")) if session["role"] == "paciente" else manager_dashboard_layout(session)
     return login_layout()
 
 
@@ -317,20 +533,21 @@ def router(path, session):
               [Input("patient-dropdown", "value")],
               [State("session", "data")])
 def render_manager_view(patient_selected, session):
-    # Si no hay selección, mostramos mensaje de bienvenida
+    # Si no hay selección, mostramos la vista de plantilla
     if not patient_selected:
-        return html.Div([
-            html.H1("👈", className="display-1"),
-            html.H4("Selecciona un atleta en el menú lateral"),
-            html.P("Verás sus datos inmediatamente.")
-        ], className="text-center mt-5 text-muted")
+        return squad_view(squad_overview(db.DB_PATH, coach_scope(session["user"], session["role"]) if session else None))
    
     # Calculamos datos del seleccionado
     try:
         patient = patient_selected
         fig_load = get_training_data(patient)
         fig_comp = get_comparison_figure([patient])
+        fig_acwr = get_workload_figure(patient)
         avgs = get_patient_averages(patient)
+        # Estado de carga de toda la plantilla visible en una sola pasada vectorizada
+        roster = get_roster(session["user"], session["role"]) if session else [patient]
+        squad = [s for path, athletes in db.by_shard(roster).items() for s in squad_status(path, athletes)]
+        current = next((s for s in squad if s["paciente"] == patient), None)
        
         # INTERFAZ IDÉNTICA A LA DEL CORREDOR
         return dbc.Container([
@@ -344,23 +561,142 @@ def render_manager_view(patient_selected, session):
             ]),
             # Gráficas
             dbc.Row([
-                dbc.Col(dbc.Card([dbc.CardHeader("Evolución Carga"), dbc.CardBody(dcc.Graph(figure=fig_load, style={"height": "350px"}))], style={"backgroundColor": COLOR_CARD}), md=6),
+                dbc.Col(dbc.Card([dbc.CardHeader(["Evolución Carga", load_range_selector("load-range")]), dbc.CardBody(dcc.Graph(id="load-graph", figure=fig_load, style={"height": "350px"}))], style={"backgroundColor": COLOR_CARD}), md=6),
                 dbc.Col(dbc.Card([dbc.CardHeader("Métricas Físicas"), dbc.CardBody(dcc.Graph(figure=fig_comp, style={"height": "350px"}))], style={"backgroundColor": COLOR_CARD}), md=6)
-            ])
+            ]),
+            # Carga aguda:crónica del atleta y alertas de la plantilla
+            dbc.Row([
+                dbc.Col(dbc.Card([dbc.CardHeader(["ACWR · ", acwr_badge(current)]), dbc.CardBody(dcc.Graph(figure=fig_acwr, style={"height": "350px"}))], style={"backgroundColor": COLOR_CARD}), md=8),
+                dbc.Col(dbc.Card([dbc.CardHeader("⚠️ Riesgo en la plantilla"), dbc.CardBody(squad_risk_list(squad))], style={"backgroundColor": COLOR_CARD}), md=4)
+            ], className="mt-4"),
+            live_panel(patient) if LIVE_PORT else None
         ])
     except Exception as e:
         return html.Div(f"Error cargando datos: {str(e)}", className="text-danger")
 
 
+# -------------------------------------------------------------------------
+# VISTA DE PLANTILLA (todos los atletas, una consulta)
+# -------------------------------------------------------------------------
+SQUAD_COLUMNS = [
+    ("atleta", "Atleta"), ("equipo", "Equipo"), ("ultima", "Última"), ("sesiones", "Sesiones"),
+    ("fatiga", "Fatiga"), ("rpe", "RPE"), ("suenio", "Sueño"), ("bpm", "BPM"),
+    ("carga_7d", "Carga 7d"), ("acwr", "ACWR"), ("monotonia", "Monotonía"), ("riesgo", "Riesgo"), ("tendencia", "Últimos 28 días"),
+]
+RISK_STYLES = {"riesgo alto": "#EA4335", "monotonía alta": "#FBBC05", "baja carga": "#4285F4"}
+
+
+def squad_view(rows):
+    if not rows:
+        return html.Div([
+            html.H1("👈", className="display-1"),
+            html.H4("Crea un atleta en el menú lateral"),
+        ], className="text-center mt-5 text-muted")
+    # Virtualización: el navegador solo pinta las filas visibles aunque haya miles
+    return html.Div([
+        html.H5(f"Plantilla · {len(rows)} atletas", className="text-white mb-3"),
+        dash_table.DataTable(
+            id="squad-table", data=rows, columns=[{"name": n, "id": c} for c, n in SQUAD_COLUMNS],
+            virtualization=True, fixed_rows={"headers": True}, page_action="none",
+            sort_action="native", filter_action="native",
+            style_table={"height": "600px", "overflowY": "auto"},
+            style_header={"backgroundColor": "#2A2A2A", "color": "#90CAF9", "fontWeight": "600"},
+            style_cell={"backgroundColor": COLOR_CARD, "color": "#E0E0E0", "border": "1px solid #333", "minWidth": "70px", "textAlign": "left"},
+            style_cell_conditional=[{"if": {"column_id": "tendencia"}, "fontFamily": "monospace", "minWidth": "200px", "color": "#4285F4"}],
+            style_data_conditional=[{"if": {"filter_query": f'{{riesgo}} = "{r}"', "column_id": "riesgo"}, "color": color, "fontWeight": "600"} for r, color in RISK_STYLES.items()],
+        ),
+        html.P("Haz clic en un atleta para ver su detalle.", className="text-muted small mt-2")
+    ])
+
+
+@app.callback(Output("patient-dropdown", "value"), Input("squad-table", "active_cell"), prevent_initial_call=True)
+def squad_select(cell):
+    # Las filas llevan "id" = nombre_paciente, así funciona aunque la tabla esté ordenada o filtrada
+    return cell["row_id"] if cell and cell.get("row_id") else no_update
+
+
+RISK_COLORS = {"riesgo alto": "danger", "monotonía alta": "warning", "baja carga": "info", "ok": "success", "sin historial": "secondary"}
+
+
+def acwr_badge(status):
+    if not status: return dbc.Badge("sin datos", color="secondary")
+    return dbc.Badge(f"{status['acwr']:.2f} · monotonía {status['monotonia']:.1f} · {status['riesgo']}", color=RISK_COLORS[status["riesgo"]])
+
+
+def squad_risk_list(squad):
+    flagged = sorted((s for s in squad if s["riesgo"] not in ("ok", "sin historial")), key=lambda s: -s["acwr"])
+    if not flagged: return html.P("Toda la plantilla dentro de la zona óptima.", className="text-muted")
+    return html.Ul([
+        html.Li([html.Strong(s["paciente"]), f" · ACWR {s['acwr']:.2f} · monot. {s['monotonia']:.1f} ",
+                 dbc.Badge(s["riesgo"], color=RISK_COLORS[s["riesgo"]])], className="mb-1")
+        for s in flagged
+    ], className="list-unstyled small")
+
+
+# -------------------------------------------------------------------------
+# EN DIRECTO (sensores conectados a live_ingest)
+# -------------------------------------------------------------------------
+def live_panel(patient):
+    fig = go.Figure(go.Scattergl(x=[], y=[], mode='lines', name='ECG', line=dict(color="#FF0000", width=1)))
+    fig.update_layout(paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)', font=dict(color="white"), height=250, margin=dict(l=20,r=20,t=20,b=20))
+    return dbc.Card([
+        dbc.CardHeader(["🔴 En directo · ", html.Span(id="live-bpm", children="sin señal")]),
+        dbc.CardBody(dcc.Graph(id="live-ecg-graph", figure=fig, style={"height": "250px"})),
+        dcc.Interval(id="live-tick", interval=LIVE_TICK_MS),
+        dcc.Store(id="live-cursor", data={"athlete": patient, "index": None})
+    ], style={"backgroundColor": COLOR_CARD}, className="mt-4")
+
+
+@app.callback([Output("live-ecg-graph", "extendData"), Output("live-cursor", "data"), Output("live-bpm", "children")],
+              Input("live-tick", "n_intervals"), State("live-cursor", "data"), prevent_initial_call=True)
+def live_tick(n, cursor):
+    # Cada tick envía solo las muestras nuevas desde el último índice enviado
+    stream = live_hub.get(cursor["athlete"]) if cursor else None
+    if not stream: return no_update, no_update, "sin señal"
+    index = cursor["index"]
+    # Stream nuevo (cambió la fs o se desalojó y volvió): su índice empieza de cero
+    reset = index is None or cursor.get("stream") != stream.id or index > stream.ring.total
+    if reset: index = stream.ring.total - LIVE_WINDOW_S * stream.fs
+    # Vistas sin copia del búfer circular: se serializan directamente con tolist()
+    start, parts = stream.ring.views(index)
+    n = sum(len(p) for p in parts)
+    bpm = live_summary(stream.stats.snapshot())
+    if not n: return no_update, no_update, bpm
+    t = (start + np.arange(n)) / stream.fs
+    y = [v for p in parts for v in p.tolist()]
+    # maxPoints recorta la traza en el navegador a los últimos LIVE_WINDOW_S segundos;
+    # al reiniciar deja solo lo recién enviado (descarta la traza del stream anterior)
+    return (dict(x=[t.tolist()], y=[y]), [0], n if reset else LIVE_WINDOW_S * stream.fs), \
+        {"athlete": cursor["athlete"], "stream": stream.id, "index": start + n}, bpm
+
+
+def live_summary(snap):
+    # "72 lpm · 1 min 70 (62-85) · 5 min 68 (55-91) · RMSSD 42 ms"
+    if not snap["10s"]["beats"]: return "sin latidos"
+    parts = [f"{snap['10s']['hr_mean']:.0f} lpm"]
+    for key, label in (("60s", "1 min"), ("300s", "5 min")):
+        w = snap[key]
+        if w["beats"]: parts.append(f"{label} {w['hr_mean']:.0f} ({w['hr_min']:.0f}-{w['hr_max']:.0f})")
+    parts.append(f"RMSSD {snap['60s']['rmssd']:.0f} ms")
+    return " · ".join(parts)
+
+
 @app.callback([Output("url", "pathname", allow_duplicate=True), Output("session", "data", allow_duplicate=True)], Input("btn-logout", "n_clicks"), prevent_initial_call=True)
 def logout(n): return "/", None
 
 
-@app.callback([Output("patient-dropdown", "options"), Output("selected-patient", "data", allow_duplicate=True)], [Input("session", "data"), Input("btn-new-patient", "n_clicks")], prevent_initial_call=True)
-def update_patients_dropdown(session, n_new):
+@app.callback([Output("patient-dropdown", "options"), Output("selected-patient", "data", allow_duplicate=True)], [Input("session", "data"), Input("btn-new-patient", "n_clicks"), Input("patient-dropdown", "search_value")], State("patient-dropdown", "value"), prevent_initial_call=True)
+def update_patients_dropdown(session, n_new, search, current):
+    # Búsqueda en el servidor: el desplegable solo recibe la primera página de coincidencias
     if not session or session["role"] == "paciente": return no_update, no_update
-    new_p = create_patient(session["user"]) if callback_context.triggered[0]['prop_id'] == "btn-new-patient.n_clicks" else None
-    opts = get_patients_by_user(session["user"], session["role"])
+    trigger = callback_context.triggered[0]['prop_id']
+    # Recién entrado: la primera página ya vino en la sesión
+    if trigger == "session.data" and session.get("plantilla"): return session["plantilla"]["opciones"], no_update
+    new_p = create_patient(session["user"]) if trigger == "btn-new-patient.n_clicks" else None
+    opts = get_patients_by_user(session["user"], session["role"], search or "")
+    # El seleccionado (o el recién creado) tiene que seguir en las opciones para no perder la etiqueta
+    for keep in (new_p, current):
+        if keep and all(o["value"] != keep for o in opts): opts.append({"label": keep, "value": keep, "search": keep})
     return opts, ({"patient": new_p} if new_p else no_update)
 
 
@@ -0,0 +1,96 @@
+import sys
+from db_pool import fetch_one, fetch_all, transaction
+
+# Tabla materializada con sumas y contadores por atleta. Guardamos un contador por
+# columna porque AVG ignora los NULL: media = suma / n reproduce AVG exactamente.
+STATS_COLUMNS = ["n_fatiga", "sum_fatiga", "n_rpe", "sum_rpe", "n_suenio", "sum_suenio",
+                 "n_carga", "sum_carga", "n_bpm", "sum_bpm"]
+
+CREATE_SQL = "CREATE TABLE IF NOT EXISTS athlete_stats (paciente TEXT PRIMARY KEY NOT NULL, " + \
+    ", ".join(f"{col} {'INTEGER' if col.startswith('n_') else 'REAL'} DEFAULT 0" for col in STATS_COLUMNS) + ")"
+
+# La misma agregación sirve para una fila (WHERE id = ?) y para reconstruir todo
+_QUEST_AGG = """
+    SELECT paciente, COUNT(fatiga), TOTAL(fatiga), COUNT(rpe), TOTAL(rpe), COUNT(suenio), TOTAL(suenio),
+           COUNT(rpe * tiempo_entrenamiento), TOTAL(rpe * tiempo_entrenamiento)
+    FROM cuestionarios WHERE paciente IS NOT NULL AND {where} GROUP BY paciente
+"""
+_BPM_AGG = """
+    SELECT paciente, COUNT(bpm), TOTAL(bpm)
+    FROM entrenamientos WHERE paciente IS NOT NULL AND bpm > 0 AND {where} GROUP BY paciente
+"""
+
+_QUEST_COLS = STATS_COLUMNS[:8]
+_BPM_COLS = STATS_COLUMNS[8:]
+
+
+def _upsert_sql(cols, select_sql, sign="+"):
+    updates = ", ".join(f"{col} = {col} {sign} excluded.{col}" for col in cols)
+    return f"INSERT INTO athlete_stats (paciente, {', '.join(cols)}) {select_sql} ON CONFLICT(paciente) DO UPDATE SET {updates}"
+
+
+def apply_questionnaire(c, row_id, sign="+"):
+    # Llamar dentro de la misma transacción que el INSERT en cuestionarios
+    c.execute(_upsert_sql(_QUEST_COLS, _QUEST_AGG.format(where="id = ?"), sign), (row_id,))
+
+
+def apply_training(c, row_id, sign="+"):
+    # Llamar dentro de la misma transacción que el INSERT/UPDATE en entrenamientos.
+    # sign="-" descuenta una fila antes de modificar su bpm.
+    c.execute(_upsert_sql(_BPM_COLS, _BPM_AGG.format(where="id = ?"), sign), (row_id,))
+
+
+def apply_range(c, table, first_id, last_id):
+    # Importaciones masivas: suma de golpe las filas con id entre first_id y last_id.
+    # Con las dos cotas SQLite recorre el rango de rowid y no el índice entero.
+    agg, cols = (_QUEST_AGG, _QUEST_COLS) if table == "cuestionarios" else (_BPM_AGG, _BPM_COLS)
+    c.execute(_upsert_sql(cols, agg.format(where="id BETWEEN ? AND ?")), (first_id, last_id))
+
+
+def get_stats(path, paciente):
+    row = fetch_one(path, f"SELECT {', '.join(STATS_COLUMNS)} FROM athlete_stats WHERE paciente = ?", (paciente,))
+    return dict(zip(STATS_COLUMNS, row)) if row else None
+
+
+def rebuild(c):
+    c.execute(CREATE_SQL)
+    c.execute("DELETE FROM athlete_stats")
+    c.execute(_upsert_sql(_QUEST_COLS, _QUEST_AGG.format(where="1")))
+    c.execute(_upsert_sql(_BPM_COLS, _BPM_AGG.format(where="1")))
+
+
+def _fresh(path):
+    fresh = {}
+    for row in fetch_all(path, _QUEST_AGG.format(where="1")):
+        fresh.setdefault(row[0], dict.fromkeys(STATS_COLUMNS, 0)).update(zip(_QUEST_COLS, row[1:]))
+    for row in fetch_all(path, _BPM_AGG.format(where="1")):
+        fresh.setdefault(row[0], dict.fromkeys(STATS_COLUMNS, 0)).update(zip(_BPM_COLS, row[1:]))
+    return fresh
+
+
+def verify(path, tolerance=1e-6):
+    # Recalcula desde las filas crudas y devuelve [(paciente, columna, guardado, real)]
+    fresh = _fresh(path)
+    stored = {r[0]: dict(zip(STATS_COLUMNS, r[1:])) for r in fetch_all(path, f"SELECT paciente, {', '.join(STATS_COLUMNS)} FROM athlete_stats")}
+    drift = []
+    for paciente in sorted(set(fresh) | set(stored)):
+        real = fresh.get(paciente, dict.fromkeys(STATS_COLUMNS, 0))
+        saved = stored.get(paciente, dict.fromkeys(STATS_COLUMNS, 0))
+        for col in STATS_COLUMNS:
+            if abs((saved[col] or 0) - (real[col] or 0)) > tolerance * max(1, abs(real[col] or 0)):
+                drift.append((paciente, col, saved[col], real[col]))
+    return drift
+
+
+if __name__ == "__main__":
+    # python athlete_stats.py [ruta.db] [--rebuild]
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    path = args[0] if args else "database.db"
+    drift = verify(path)
+    for paciente, col, saved, real in drift:
+        print(f"⚠️ {paciente}.{col}: guardado={saved} real={real}")
+    print(f"Desviaciones encontradas: {len(drift)}")
+    if "--rebuild" in sys.argv:
+        with transaction(path) as c: rebuild(c)
+        print(f"✅ athlete_stats reconstruida. Desviaciones tras reconstruir: {len(verify(path))}")
+    elif drift: sys.exit(1)
@@ -0,0 +1,68 @@
+# Tiempo hasta el panel tras el login según el tamaño de la plantilla: credenciales +
+# datos de la sesión + árbol de la página que devuelve el router. "antes" es el camino sin
+# bootstrap (authenticate_user y el layout consultando por su cuenta, con los esqueletos
+# reconstruidos en cada llamada); "bootstrap" es bootstrap_session y los esqueletos en caché.
+# Uso: python benchmarks/bench_bootstrap.py [--sizes 50,500,5000] [--repeat 50]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+import numpy as np
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return np.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="50,500,5000")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    import synthetic
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        import app as app_module
+        import db
+        from db_pool import close_pools
+        cached = [app_module.get_runner_ghosts, app_module.get_manager_ghosts, app_module.login_layout, app_module.runner_session_card,
+                  app_module.runner_nav, app_module.runner_graphs_view, app_module.runner_footer, app_module.manager_content]
+
+        def before(user):
+            for fn in cached: fn.cache_clear()
+            role = db.authenticate_user(user, synthetic.PASSWORD)
+            return app_module.router("/dashboard", {"user": user, "role": role})
+
+        def after(user):
+            return app_module.router("/dashboard", db.bootstrap_session(user, synthetic.PASSWORD))
+
+        for n in [int(s) for s in args.sizes.split(",")]:
+            path = os.path.join(tmp, f"roster_{n}.db")
+            synthetic.populate(path, coaches=1, athletes=n, years=0.05)
+            close_pools()
+            db.DB_PATH = path
+            for role, user in (("entrenador", synthetic.coach_name(0)), ("corredor", synthetic.athlete_name(0))):
+                after(user)
+                rows.append((n, role, measure(lambda: before(user), args.repeat), measure(lambda: after(user), args.repeat)))
+        close_pools()
+        os.chdir(HERE)
+
+    print(f"{'plantilla':>9} {'panel':<11} {'antes':>9} {'bootstrap':>10}")
+    for n, role, old, new in rows:
+        print(f"{n:>9} {role:<11} {old:>7.2f}ms {new:>8.2f}ms  ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Importación masiva de sesiones (bulk.py) frente al camino de la app (un INSERT y un
+# commit por fila), reimportación del mismo fichero (todo duplicado) y exportación.
+# Uso: python benchmarks/bench_bulk.py [--rows 500000] [--athletes 500] [--naive 2000]
+import argparse
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+
+
+def sessions_frame(rows, athletes, rng):
+    # Sesiones con fechas únicas por atleta (una cada ~día y medio hacia atrás)
+    per = -(-rows // athletes)
+    end = datetime.datetime(2026, 1, 1, 18, 0, 0)
+    offsets = np.tile(np.arange(per) * 36, athletes)[:rows]
+    names = np.repeat([f"Atleta_{i}" for i in range(athletes)], per)[:rows]
+    return pd.DataFrame({
+        "paciente": names,
+        "fecha": (end - pd.to_timedelta(offsets, unit="h")).strftime("%Y-%m-%d %H:%M:%S"),
+        "fatiga": rng.integers(1, 11, rows), "suenio": rng.integers(1, 11, rows), "rpe": rng.integers(1, 11, rows),
+        "tiempo_entrenamiento": rng.integers(20, 120, rows).astype(float), "bpm": rng.integers(110, 175, rows),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--athletes", type=int, default=500)
+    parser.add_argument("--naive", type=int, default=2000, help="filas para medir el camino de un commit por fila")
+    args = parser.parse_args()
+
+    import athlete_stats
+    import bulk
+    import db
+    import workload
+    from db_pool import fetch_one, close_pools
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "sesiones.csv")
+        sessions_frame(args.rows, args.athletes, rng).to_csv(csv_path, index=False)
+        db.DB_PATH = os.path.join(tmp, "bulk.db")
+        db.init_db()
+
+        t0 = time.perf_counter()
+        stats = bulk.ingest(db.DB_PATH, bulk.read_chunks(csv_path), "sesiones")
+        wall = time.perf_counter() - t0
+        q = stats["cuestionarios"]
+        print(f"Importación: {q['leidas']} sesiones ({2 * q['insertadas']} filas en 2 tablas) en {wall:.2f} s "
+              f"-> {q['leidas'] / wall:,.0f} sesiones/s, {2 * q['insertadas'] / wall:,.0f} filas/s")
+
+        t0 = time.perf_counter()
+        again = bulk.ingest(db.DB_PATH, bulk.read_chunks(csv_path), "sesiones")
+        wall = time.perf_counter() - t0
+        print(f"Reimportación: {again['cuestionarios']['duplicadas']} duplicadas descartadas en {wall:.2f} s")
+
+        out = os.path.join(tmp, "export.csv")
+        t0 = time.perf_counter()
+        n = bulk.export(db.DB_PATH, "cuestionarios", out)
+        wall = time.perf_counter() - t0
+        print(f"Exportación: {n} filas en {wall:.2f} s -> {n / wall:,.0f} filas/s ({os.path.getsize(out) / 2**20:.1f} MiB)")
+        total = fetch_one(db.DB_PATH, "SELECT COUNT(*) FROM cuestionarios")[0]
+
+        # Camino actual de la app: INSERT + agregados + commit por sesión
+        t0 = time.perf_counter()
+        for i in range(args.naive):
+            db.save_questionnaire_for_patient("naive", "Naive", 5, 7, 6, 60.0)
+            db.guardar_entrenamiento("Naive", 60.0, 5, 6, bpm=140)
+        wall = time.perf_counter() - t0
+        print(f"Fila a fila (app): {args.naive} sesiones en {wall:.2f} s -> {args.naive / wall:,.0f} sesiones/s")
+
+        drift = len(athlete_stats.verify(db.DB_PATH)) + len(workload.verify(db.DB_PATH))
+        close_pools()
+        ok = q["insertadas"] == args.rows and again["cuestionarios"]["insertadas"] == 0 and n == total and drift == 0
+        print(f"Agregados materializados sin desviaciones: {drift == 0}")
+        print("✅ OK" if ok else "❌ Resultado inesperado")
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# Peticiones de callback al servidor en una sesión típica de corredor, contadas sobre el
+# grafo de callbacks registrado en la app (sin navegador): qué callbacks dispara cada
+# gesto, cuáles se resuelven en el navegador (clientside) y cuáles son un POST a
+# /_dash-update-component. Se asume que toda salida cambia salvo las silenciadas en el guion.
+# Uso: python benchmarks/bench_callbacks.py [--repo RUTA]   (RUTA: otro checkout para comparar)
+import argparse
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# (gesto, props que cambia el usuario, salidas que ese gesto deja sin cambiar)
+RUNNER_SESSION = [
+    ("cargar /", None, {"runner-data-request.data"}),
+    ("pestaña Registro", {"login-tabs.active_tab"}, set()),
+    ("pestaña Entrar", {"login-tabs.active_tab"}, set()),
+    ("entrar", {"btn-log.n_clicks"}, set()),
+    ("GRÁFICAS", {"btn-view-graphs.n_clicks"}, set()),
+    ("REGISTRO", {"btn-view-register.n_clicks"}, set()),
+    ("GRÁFICAS", {"btn-view-graphs.n_clicks"}, set()),
+    ("Volver", {"btn-back-to-register.n_clicks"}, set()),
+    ("guardar sesión", {"submit-questionnaire.n_clicks"}, set()),
+    ("GRÁFICAS", {"btn-view-graphs.n_clicks"}, set()),
+    ("rango 3M", {"runner-load-range.value"}, set()),
+    ("REGISTRO", {"btn-view-register.n_clicks"}, set()),
+    ("GRÁFICAS", {"btn-view-graphs.n_clicks"}, set()),
+]
+
+
+def _prop(s): return s.split("@")[0]
+
+
+def _outputs(cb):
+    out = cb["output"]
+    return [_prop(o) for o in out.strip(".").split("...")] if out.startswith("..") else [_prop(out)]
+
+
+def _ids(component):
+    found = {getattr(component, "id", None)}
+    for child in component._traverse(): found.add(getattr(child, "id", None))
+    return {i for i in found if isinstance(i, str)}
+
+
+def simulate(app_module, session, script=RUNNER_SESSION):
+    app = app_module.app
+    callbacks = [{"inputs": [f"{i['id']}.{i['property']}" for i in cb["inputs"]], "outputs": _outputs(cb),
+                  "clientside": bool(cb.get("clientside_function")), "initial": not cb.get("prevent_initial_call")}
+                 for cb in app._callback_list]
+    shell = _ids(app.layout) - _ids(app.layout["page-content"])
+    state = {"present": set(), "server": 0, "client": 0}
+    pages = {"/": app_module.login_layout, "/dashboard": lambda: app_module.runner_dashboard_layout(session["user"])}
+
+    def run(changed, mounted, mute):
+        # Una ronda por nivel del grafo; cada callback corre como mucho una vez por gesto
+        fired = set()
+        frontier = [i for i, cb in enumerate(callbacks) if any(p in changed for p in cb["inputs"])]
+        frontier += [i for i, cb in enumerate(callbacks) if cb["initial"] and
+                     any(p.split(".")[0] in mounted for p in cb["inputs"]) and
+                     all(p.split(".")[0] in state["present"] for p in cb["inputs"])]
+        while frontier:
+            nxt = set()
+            for i in dict.fromkeys(frontier):
+                if i in fired: continue
+                fired.add(i)
+                cb = callbacks[i]
+                state["client" if cb["clientside"] else "server"] += 1
+                for out in cb["outputs"]:
+                    if out in mute: continue
+                    if out == "page-content.children":
+                        # El router cambia de página: lo nuevo se monta y dispara sus callbacks iniciales
+                        new = _ids(pages[state["path"]]())
+                        state["present"] = shell | new
+                        nxt.update(j for j, c in enumerate(callbacks) if c["initial"] and
+                                   any(p.split(".")[0] in new for p in c["inputs"]) and
+                                   all(p.split(".")[0] in state["present"] for p in c["inputs"]))
+                    nxt.update(j for j, c in enumerate(callbacks) if out in c["inputs"])
+            frontier = list(nxt - fired)
+        return fired
+
+    rows = []
+    for name, changed, mute in script:
+        before = state["server"], state["client"]
+        if changed is None:
+            state["path"] = "/"
+            state["present"] = _ids(app.layout)
+            run(set(), state["present"], mute)
+        else:
+            if "btn-log.n_clicks" in changed: state["path"] = "/dashboard"
+            run(changed, set(), mute)
+        rows.append((name, state["server"] - before[0], state["client"] - before[1]))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repo", default=os.path.dirname(HERE))
+    args = parser.parse_args()
+    sys.path.insert(0, HERE)
+    import synthetic
+    # Después de synthetic (que añade este checkout): la app se importa de --repo
+    sys.path.insert(0, os.path.abspath(args.repo))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        synthetic.populate(os.path.join(tmp, "database.db"), coaches=1, athletes=5, years=0.2)
+        import app as app_module
+        rows = simulate(app_module, {"user": synthetic.athlete_name(0), "role": "paciente"})
+    print(f"{'gesto':<20} {'servidor':>9} {'navegador':>10}")
+    for name, server, client in rows:
+        print(f"{name:<20} {server:>9} {client:>10}")
+    print(f"{'TOTAL':<20} {sum(r[1] for r in rows):>9} {sum(r[2] for r in rows):>10}")
+
+
+if __name__ == "__main__":
+    main()
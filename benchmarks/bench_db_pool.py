@@ -0,0 +1,105 @@
+# Benchmark de concurrencia: conexión por llamada (antes) vs pool WAL (después).
+# Uso: python benchmarks/bench_db_pool.py [--threads 8] [--seconds 5]
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db
+import db_pool
+
+READ_SQL = "SELECT AVG(fatiga), AVG(rpe), AVG(suenio), AVG(rpe * tiempo_entrenamiento) FROM cuestionarios WHERE paciente = ?"
+WRITE_SQL = "INSERT INTO cuestionarios (paciente, username, fecha, fatiga, suenio, rpe, tiempo_entrenamiento) VALUES (?, ?, datetime('now'), 5, 7, 6, 60)"
+
+
+def seed(path, athletes=50, rows=20):
+    db.DB_PATH = path
+    db.init_db()
+    with db_pool.transaction(path) as c:
+        c.executemany(WRITE_SQL, [(f"Atleta_{i % athletes}", "bench") for i in range(athletes * rows)])
+
+
+def per_call_read(path, pac):
+    conn = sqlite3.connect(path)
+    conn.execute(READ_SQL, (pac,)).fetchone()
+    conn.close()
+
+
+def per_call_write(path, pac):
+    conn = sqlite3.connect(path)
+    conn.execute(WRITE_SQL, (pac, "bench"))
+    conn.commit()
+    conn.close()
+
+
+def pooled_read(path, pac):
+    db_pool.fetch_one(path, READ_SQL, (pac,))
+
+
+def pooled_write(path, pac):
+    db_pool.execute(path, WRITE_SQL, (pac, "bench"))
+
+
+def run(path, read_fn, write_fn, threads, seconds, write_ratio):
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(n):
+        local = {"reads": 0, "writes": 0, "errors": 0}
+        i = 0
+        while time.perf_counter() < deadline:
+            pac = f"Atleta_{(n * 7 + i) % 50}"
+            try:
+                if i % write_ratio == 0:
+                    write_fn(path, pac)
+                    local["writes"] += 1
+                else:
+                    read_fn(path, pac)
+                    local["reads"] += 1
+            except sqlite3.OperationalError:
+                local["errors"] += 1
+            i += 1
+        with lock:
+            for k in counts:
+                counts[k] += local[k]
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers: w.start()
+    for w in workers: w.join()
+    return {k: v / seconds if k != "errors" else v for k, v in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--write-every", type=int, default=10, help="1 escritura cada N operaciones")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        before = os.path.join(tmp, "before.db")
+        # Modo "antes": journal por defecto (DELETE) y sin pool
+        seed(before)
+        db_pool.close_pools()
+        conn = sqlite3.connect(before)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+        res_before = run(before, per_call_read, per_call_write, args.threads, args.seconds, args.write_every)
+
+        after = os.path.join(tmp, "after.db")
+        seed(after)
+        res_after = run(after, pooled_read, pooled_write, args.threads, args.seconds, args.write_every)
+        db_pool.close_pools()
+
+    print(f"{'modo':<12}{'lecturas/s':>14}{'escrituras/s':>14}{'errores':>10}")
+    for name, res in (("antes", res_before), ("pool+WAL", res_after)):
+        print(f"{name:<12}{res['reads']:>14.0f}{res['writes']:>14.0f}{res['errors']:>10}")
+
+
+if __name__ == "__main__":
+    main()
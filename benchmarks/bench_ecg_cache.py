@@ -0,0 +1,94 @@
+# Caché de análisis de ECG (ecg_cache.py): análisis completo frente a reenvío de la misma
+# grabación, desalojo por tamaño y varios procesos leyendo/escribiendo a la vez.
+# Uso: python benchmarks/bench_ecg_cache.py [--minutes 30] [--repeat 5] [--procs 4]
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+import numpy as np
+
+
+def _hammer(args):
+    # En otro proceso: mezcla de lecturas y escrituras sobre las mismas claves
+    cache_path, worker, rounds = args
+    import ecg_cache
+    ecg_cache.CACHE_PATH = cache_path
+    rng = np.random.default_rng(worker)
+    for i in range(rounds):
+        key = f"clave_{rng.integers(0, 20)}"
+        entry = ecg_cache.get(key)
+        if entry is None:
+            ecg_cache.put(key, 250, 60.0, np.arange(500) * 250, np.arange(3000) / 250, rng.normal(size=3000), max_bytes=10 * 2**17)
+        elif len(entry["peaks"]) != 500:
+            raise RuntimeError(f"entrada corrupta en {key}")
+    return rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--procs", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=300)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        import db
+        import ecg_cache
+        import jobs
+        import synthetic
+        from db_pool import close_pools
+        db.DB_PATH = os.path.join(tmp, "database.db")
+        db.init_db()
+        ecg_cache.CACHE_PATH = os.path.join(tmp, "ecg_cache.db")
+        path = synthetic.write_ecg(os.path.join(tmp, "sesion.ecg"), synthetic.synthetic_ecg(args.minutes * 60), 250)
+
+        def timed(fn):
+            t0 = time.perf_counter()
+            out = fn()
+            return (time.perf_counter() - t0) * 1000, out
+
+        cold = []
+        for _ in range(args.repeat):
+            ecg_cache.clear()
+            cold.append(timed(lambda: jobs.analyze_ecg(path)))
+        warm = [timed(lambda: jobs.analyze_ecg(path)) for _ in range(args.repeat)]
+        same = all(r == cold[0][1] for _, r in cold + warm)
+        # Reenvío desde la app: el trabajo nace terminado sin pasar por el pool
+        submit = [timed(lambda: jobs.submit_job("Atleta", path))[0] for _ in range(args.repeat)]
+        pending = sum(1 for i in range(1, args.repeat + 1) if jobs.get_job(i)["estado"] != "hecho")
+        print(f"Grabación de {args.minutes:g} min ({os.path.getsize(path) / 2**20:.1f} MiB)")
+        print(f"análisis completo: {np.median([c[0] for c in cold]):8.1f} ms | desde caché: {np.median([w[0] for w in warm]):6.2f} ms "
+              f"| submit_job con acierto: {np.median(submit):6.2f} ms | resultados idénticos: {same}")
+
+        # Desalojo: 40 entradas de ~128 KiB con un límite de ~1.25 MiB
+        ecg_cache.clear()
+        for i in range(40):
+            ecg_cache.put(f"e{i}", 250, 60.0, np.arange(1000), np.arange(8000) / 250, np.zeros(8000), max_bytes=10 * 2**17)
+        s = ecg_cache.stats()
+        bounded = s["bytes"] <= 10 * 2**17 and ecg_cache.get("e39") is not None and ecg_cache.get("e0") is None
+        print(f"desalojo: {s['size']} entradas, {s['bytes'] / 2**10:.0f} KiB (límite {10 * 2**17 / 2**10:.0f} KiB) -> {'OK' if bounded else 'MAL'}")
+
+        ecg_cache.clear()
+        close_pools()
+        t0 = time.perf_counter()
+        with ProcessPoolExecutor(args.procs) as pool:
+            done = sum(pool.map(_hammer, [(ecg_cache.CACHE_PATH, w, args.rounds) for w in range(args.procs)]))
+        wall = time.perf_counter() - t0
+        print(f"concurrencia: {args.procs} procesos, {done} operaciones en {wall:.2f} s sin errores")
+        close_pools()
+        os.chdir(HERE)
+    ok = same and bounded and not pending
+    print("✅ OK" if ok else "❌ Resultado inesperado")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
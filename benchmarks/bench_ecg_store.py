@@ -0,0 +1,73 @@
+# Benchmark CSV vs .ecg binario: tiempo de apertura/parseo y RSS máximo.
+# Uso: python benchmarks/bench_ecg_store.py [--minutes 60] [--fs 250]
+# Cada medición corre en un subproceso para que el RSS máximo sea independiente.
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import numpy as np
+
+
+def current_rss_mb():
+    # RSS actual (Linux); fuera de Linux se usa el máximo como aproximación
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(mode, path):
+    import pandas as pd
+    import ecg_store
+    rss_before = current_rss_mb()
+    t0 = time.perf_counter()
+    if mode == "csv":
+        signal = pd.to_numeric(pd.read_csv(path)["ECG"], errors="coerce").fillna(0).values
+        window = signal[len(signal) // 2:len(signal) // 2 + 2500]
+    elif mode == "ecg":
+        meta, data = ecg_store.open_recording(path)
+        window = np.asarray(data[len(data) // 2:len(data) // 2 + 2500], dtype=float)
+    elapsed = time.perf_counter() - t0
+    # Crecimiento del RSS respecto a después de los imports
+    rss_mb = current_rss_mb() - rss_before
+    print(f"{elapsed:.4f} {rss_mb:.1f} {len(window)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=float, default=60)
+    parser.add_argument("--fs", type=int, default=250)
+    args = parser.parse_args()
+    import ecg_store
+
+    with tempfile.TemporaryDirectory() as tmp:
+        n = int(args.minutes * 60 * args.fs)
+        csv_path = os.path.join(tmp, "rec.csv")
+        rng = np.random.default_rng(0)
+        with open(csv_path, "w") as f:
+            f.write("ECG\n")
+            for i in range(0, n, 1_000_000):
+                np.savetxt(f, rng.normal(0, 0.5, min(1_000_000, n - i)), fmt="%.6f")
+        t0 = time.perf_counter()
+        ecg_path = ecg_store.convert_csv(csv_path, fs=args.fs)
+        convert_s = time.perf_counter() - t0
+
+        print(f"{n} muestras | CSV {os.path.getsize(csv_path) / 1e6:.1f} MB | .ecg {os.path.getsize(ecg_path) / 1e6:.1f} MB | conversión {convert_s:.2f} s")
+        print(f"{'formato':<10}{'abrir+ventana (s)':>20}{'Δ RSS (MB)':>17}")
+        for mode, path in (("csv", csv_path), ("ecg", ecg_path)):
+            out = subprocess.run([sys.executable, __file__, "--measure", mode, path], capture_output=True, text=True, check=True).stdout.split()
+            print(f"{mode:<10}{float(out[0]):>20.4f}{float(out[1]):>17.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--measure":
+        measure(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,65 @@
+# Micro-benchmark de hrv.compute_hrv sobre sesiones sintéticas de varias horas.
+# Uso: python benchmarks/bench_hrv.py [--hours 1 4 12] [--fs 250] [--ecg-hours 1]
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import hrv
+
+
+def synthetic_peaks(hours, fs, seed=0):
+    # FC que sube y baja entre ~65 y ~145 lpm (el detector admite hasta 150) con variabilidad latido a latido
+    rng = np.random.default_rng(seed)
+    n_beats = int(hours * 3600 * 105 / 60)
+    phase = np.linspace(0, hours * 2 * np.pi, n_beats)
+    hr = 105 + 40 * np.sin(phase)
+    rr = 60 / hr + rng.normal(0, 0.02, n_beats)
+    return np.round(np.cumsum(rr) * fs).astype(np.int64)
+
+
+def timeit(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hours", type=float, nargs="+", default=[1, 4, 12])
+    parser.add_argument("--fs", type=int, default=250)
+    parser.add_argument("--ecg-hours", type=float, default=1, help="0 para omitir la detección sobre señal")
+    args = parser.parse_args()
+
+    print(f"{'horas':>6}{'latidos':>10}{'compute_hrv (ms)':>18}{'latidos/s':>14}")
+    for hours in args.hours:
+        peaks = synthetic_peaks(hours, args.fs)
+        elapsed = timeit(lambda: hrv.compute_hrv(peaks, args.fs, fcr=55, hr_max=190))
+        print(f"{hours:>6g}{len(peaks):>10}{elapsed * 1000:>18.2f}{len(peaks) / elapsed:>14.0f}")
+
+    if args.ecg_hours:
+        # Extremo a extremo: detección de picos por ventanas + métricas
+        import ecg_store
+        import sensors
+        peaks = synthetic_peaks(args.ecg_hours, args.fs)
+        signal = np.random.default_rng(1).normal(0, 0.05, peaks[-1] + args.fs)
+        signal[peaks] += 1.5
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "rec.ecg")
+            ecg_store.write_recording(path, signal, fs=args.fs)
+            t0 = time.perf_counter()
+            found = sensors.detect_peaks(path)
+            metrics = hrv.compute_hrv(found, args.fs, fcr=55, hr_max=190)
+            elapsed = time.perf_counter() - t0
+        print(f"ECG {args.ecg_hours:g} h: {len(found)} picos ({len(peaks)} reales) en {elapsed:.2f} s | "
+              f"RMSSD {metrics['rmssd']:.0f} ms, FC media {metrics['hr_media']:.0f} lpm")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Carga de la cola de trabajos de ECG: muchos trabajos concurrentes, rendimiento y reparto.
+# Uso: python benchmarks/bench_jobs.py [--athletes 8] [--jobs 64] [--minutes 10] [--workers N]
+# Un atleta "acaparador" encola la mitad de los trabajos antes que nadie; con un reparto
+# justo el primer trabajo de cada atleta debe empezar antes que casi toda su cola.
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--athletes", type=int, default=8)
+    parser.add_argument("--jobs", type=int, default=64)
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Se mide la cola: sin caché de resultados, cada trabajo pasa por el pool (ver ecg_cache.py)
+        os.environ.update(ECG_CACHE_MB="0", ECG_CACHE_PATH=os.path.join(tmp, "ecg_cache.db"))
+        import db
+        import jobs
+        import ecg_store
+        from db_pool import fetch_all
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.init_db()
+        fs = 250
+        rng = np.random.default_rng(0)
+        paths = []
+        for i in range(4):
+            n = int(args.minutes * 60 * fs)
+            signal = rng.normal(0, 0.05, n)
+            signal[::int(fs * 60 / (60 + 10 * i))] += 1.5
+            path = os.path.join(tmp, f"rec_{i}.ecg")
+            ecg_store.write_recording(path, signal, fs=fs)
+            paths.append(path)
+
+        # Mitad de los trabajos del acaparador primero, el resto repartido entre los demás
+        hog = args.jobs // 2
+        order = ["Atleta_0"] * hog + [f"Atleta_{1 + i % (args.athletes - 1)}" for i in range(args.jobs - hog)]
+        jobs.MAX_WORKERS = args.workers
+        t0 = time.perf_counter()
+        threads = [threading.Thread(target=jobs.submit_job, args=(pac, paths[i % len(paths)])) for i, pac in enumerate(order)]
+        for th in threads: th.start()
+        for th in threads: th.join()
+        while fetch_all(db.DB_PATH, "SELECT 1 FROM ecg_jobs WHERE estado IN ('pendiente', 'en_curso') LIMIT 1"):
+            time.sleep(0.1)
+        wall = time.perf_counter() - t0
+        jobs.get_runner().stop()
+
+        rows = fetch_all(db.DB_PATH, "SELECT paciente, estado FROM ecg_jobs ORDER BY iniciado, id")
+        errors = sum(1 for r in rows if r[1] != "hecho")
+        # Posición de la cola en la que empezó el primer trabajo de cada atleta
+        first = {}
+        for pos, (pac, _) in enumerate(rows):
+            first.setdefault(pac, pos)
+        worst = max(v for k, v in first.items() if k != "Atleta_0")
+
+    print(f"{args.jobs} trabajos, {args.athletes} atletas, {args.workers} procesos, grabaciones de {args.minutes} min")
+    print(f"tiempo total: {wall:.2f} s | rendimiento: {args.jobs / wall:.2f} trabajos/s | errores: {errors}")
+    # Round-robin: todos los atletas deben haber empezado en la primera "vuelta"
+    fair = worst < args.athletes + args.workers
+    print(f"reparto: el primer trabajo de cada atleta empezó como muy tarde en la posición {worst} de {args.jobs} -> {'OK' if fair else 'INJUSTO'}")
+    if errors or not fair: sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
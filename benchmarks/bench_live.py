@@ -0,0 +1,90 @@
+# Carga de la ingesta en vivo: N atletas simulados enviando a ritmo real (o acelerado)
+# contra un servidor live_ingest en el mismo proceso, mientras un "navegador" pide
+# extendData cada segundo como haría dcc.Interval.
+# Uso: python benchmarks/bench_live.py [--athletes 50] [--fs 250] [--seconds 20] [--speed 1]
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--athletes", type=int, default=50)
+    parser.add_argument("--fs", type=int, default=250)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--packet-ms", type=int, default=40)
+    parser.add_argument("--port", type=int, default=9199)
+    args = parser.parse_args()
+
+    import live_ingest
+    import live_simulator
+
+    hub = live_ingest.LiveHub()
+    live_ingest.start_in_thread("127.0.0.1", args.port, hub)
+    time.sleep(0.3)
+
+    # Señal sintética ~70 lpm: no depende de ficheros en data/
+    fs = args.fs
+    rng = np.random.default_rng(0)
+    signal = rng.normal(0, 0.01, fs * 60).astype(np.float32)
+    signal[::int(fs * 60 / 70)] += 1.5
+
+    # Lector tipo dashboard: cada segundo pide solo lo nuevo de cada atleta
+    stop = threading.Event()
+    reads = {"ticks": 0, "samples": 0, "lat": []}
+
+    def reader():
+        cursors = {}
+        while not stop.wait(1.0 / args.speed):
+            t0 = time.perf_counter()
+            for name, st in list(hub.streams.items()):
+                start, new = st.ring.since(cursors.get(name, 0))
+                cursors[name] = start + len(new)
+                reads["samples"] += len(new)
+                st.bpm()
+            reads["lat"].append(time.perf_counter() - t0)
+            reads["ticks"] += 1
+
+    th = threading.Thread(target=reader, daemon=True)
+    th.start()
+
+    async def run():
+        stats = {"samples": 0}
+        await asyncio.gather(*[
+            live_simulator.replay(f"Atleta_{i}", signal, fs, "127.0.0.1", args.port, args.seconds, args.packet_ms, args.speed, stats)
+            for i in range(args.athletes)
+        ])
+        return stats
+
+    t0 = time.perf_counter()
+    sent = asyncio.run(run())["samples"]
+    wall = time.perf_counter() - t0
+    time.sleep(0.2)
+    stop.set()
+    th.join()
+
+    expected_wall = args.seconds / args.speed
+    dropped = sum(st.dropped for st in hub.streams.values())
+    bpms = [st.bpm() for st in hub.streams.values()]
+    lat = np.array(reads["lat"]) * 1000 if reads["lat"] else np.zeros(1)
+    print(f"Atletas: {args.athletes} a {fs} Hz, {args.seconds} s de señal x{args.speed}")
+    print(f"Enviadas: {sent} muestras, recibidas: {hub.samples} en {hub.frames} tramas, {dropped} huecos de secuencia")
+    print(f"Ritmo sostenido: {hub.samples / wall:,.0f} muestras/s (tiempo {wall:.2f} s, ideal {expected_wall:.2f} s, retraso {100 * (wall / expected_wall - 1):.1f}%)")
+    print(f"Lectura dashboard: {reads['ticks']} ticks, p50 {np.percentile(lat, 50):.2f} ms, p95 {np.percentile(lat, 95):.2f} ms para todos los atletas")
+    per_athlete = max(st.nbytes for st in hub.streams.values())
+    print(f"Memoria fija por atleta: {per_athlete / 1024:.0f} KiB (total {per_athlete * len(hub.streams) / 2**20:.1f} MiB)")
+    print(f"BPM estimado: media {np.mean(bpms):.1f} (esperado ~70)")
+    ok = hub.samples == sent and dropped == 0
+    print("✅ OK" if ok else "❌ Se perdieron muestras")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# Gráfica de carga con históricos largos: la serie completa de cuestionarios frente a
+# la agrupada en SQL por día/semana/mes. El payload debe quedar acotado.
+# Uso: python benchmarks/bench_load_range.py [--years 1 5 20] [--per-day 2]
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--per-day", type=int, default=2)
+    args = parser.parse_args()
+
+    import db
+    import workload
+    import questionnaires
+    from db_pool import transaction, fetch_all, close_pools
+
+    print(f"{'años':>5} {'filas':>8} {'antes KB':>9} {'antes ms':>9} | {'rango':>6} {'agrupación':>10} {'puntos':>7} {'KB':>6} {'ms':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in args.years:
+            db.DB_PATH = os.path.join(tmp, f"load_{years}.db")
+            db.init_db()
+            today = datetime.date.today()
+            start = today - datetime.timedelta(days=365 * years)
+            rows = [("H", "H", (start + datetime.timedelta(days=d)).isoformat() + f" {8 + k:02d}:00:00", 5, 7, 6, 60.0)
+                    for d in range(365 * years) for k in range(args.per_day)]
+            with transaction(db.DB_PATH) as c:
+                c.executemany("INSERT INTO cuestionarios (paciente, username, fecha, fatiga, suenio, rpe, tiempo_entrenamiento) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                workload.rebuild(c)
+
+            # Antes: todas las filas a una spline con marcadores
+            t0 = time.perf_counter()
+            data = fetch_all(db.DB_PATH, "SELECT fecha, CAST(rpe AS FLOAT) * CAST(tiempo_entrenamiento AS FLOAT) FROM cuestionarios WHERE paciente = ? ORDER BY fecha", ("H",))
+            old_kb = len(json.dumps({"x": [r[0] for r in data], "y": [r[1] for r in data]})) / 1024
+            old_ms = (time.perf_counter() - t0) * 1000
+
+            for label, days in [("30d", 30), ("1a", 365), ("todo", 0)]:
+                s = (today - datetime.timedelta(days=days - 1)).isoformat() if days else None
+                e = today.isoformat() if days else None
+                t0 = time.perf_counter()
+                fig = questionnaires._build_training_figure("H", s, e)
+                ms = (time.perf_counter() - t0) * 1000
+                bucket, buckets = db.get_training_load("H", s, e)
+                print(f"{years:>5} {len(rows):>8} {old_kb:>9.0f} {old_ms:>9.1f} | {label:>6} {bucket:>10} {len(buckets):>7} {len(fig.to_json()) / 1024:>6.1f} {ms:>7.1f}")
+            close_pools()
+
+
+if __name__ == "__main__":
+    main()
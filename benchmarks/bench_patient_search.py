@@ -0,0 +1,54 @@
+# Desplegable de atletas con miles de pacientes: búsqueda por prefijo acotada por
+# entrenador frente a la lista completa que se enviaba antes.
+# Uso: python benchmarks/bench_patient_search.py [--patients 20000] [--coaches 50]
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+
+NAMES = ["Ana", "Alberto", "Beatriz", "Carlos", "Carmen", "David", "Elena", "Javier", "Lucía", "Marta", "Pablo", "Sara"]
+SURNAMES = ["García", "López", "Martín", "Pérez", "Sánchez", "Gómez", "Ruiz", "Díaz", "Moreno", "Romero"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=20000)
+    parser.add_argument("--coaches", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    import db
+    from db_pool import transaction, fetch_all
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "search.db")
+        db.init_db()
+        rows = [(f"p{i}", f"p{i}", f"coach{rng.integers(args.coaches)}" if rng.random() > 0.02 else db.UNASSIGNED_COACH,
+                 f"{rng.choice(NAMES)} {rng.choice(SURNAMES)} {i}", f"Equipo {i % 20}") for i in range(args.patients)]
+        with transaction(db.DB_PATH) as c:
+            c.executemany("INSERT INTO pacientes (username, nombre_paciente, entrenador_asociado, full_name, equipo) VALUES (?, ?, ?, ?, ?)", rows)
+
+        # Antes: todas las filas al desplegable en cada carga y tras cada alta
+        t0 = time.perf_counter()
+        for _ in range(5):
+            old = [{"label": f"{r[2] if r[2] else r[0]} ({r[1]})", "value": r[0]} for r in fetch_all(db.DB_PATH, "SELECT nombre_paciente, equipo, full_name, nacionalidad FROM pacientes")]
+        old_ms = (time.perf_counter() - t0) / 5 * 1000
+        print(f"Lista completa: {len(old)} opciones, {len(json.dumps(old)) / 1024:.0f} KB, {old_ms:.1f} ms")
+
+        # Ahora: una consulta por pulsación, escribiendo "Carmen" letra a letra
+        for query in ["", "c", "ca", "car", "carm", "carmen", "p1"]:
+            t0 = time.perf_counter()
+            for _ in range(args.repeat):
+                opts = db.get_patients_by_user("coach7", "entrenador", query)
+            ms = (time.perf_counter() - t0) / args.repeat * 1000
+            print(f"  búsqueda {query!r:10} -> {len(opts):>3} opciones, {len(json.dumps(opts)) / 1024:>5.1f} KB, {ms:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
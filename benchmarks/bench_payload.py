@@ -0,0 +1,107 @@
+# Bytes y tiempo de serialización de las respuestas con figuras: gráfica de carga de 10k
+# puntos y traza de ECG de 100k muestras, con el camino anterior (go.Figure con listas de
+# floats dentro de la respuesta, motor json) y con fig_json (dict con arrays tipados base64
+# y orjson), y el tamaño que viaja comprimido con gzip y brotli (niveles de app.py).
+# Uso: python benchmarks/bench_payload.py [--load-points 10000] [--ecg-samples 100000]
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+import plotly.io as pio
+from dash._utils import to_json
+import fig_json
+import synthetic
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def load_figure(df):
+    # Misma traza que questionnaires._build_training_figure (agrupación diaria)
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=df["fecha"], y=df["carga"], mode="lines+markers", name="Carga", customdata=df["sesiones"],
+        line=dict(color="#4285F4", width=3, shape='spline'), fill='tozeroy',
+        hovertemplate="%{x}<br>Carga %{y:.0f} (%{customdata} sesiones)<extra></extra>"))
+    return fig
+
+
+def ecg_figure(t, y):
+    # Misma traza que app.ecg_figure
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(x=t, y=y, mode='lines', name='ECG', line=dict(color="#FF0000", width=1)))
+    fig.update_layout(title="ECG Detectado - BPM: 70", height=250)
+    return fig
+
+
+def measure(build, engine, repeat):
+    # Construcción de la figura + serialización de la respuesta de Dash que la contiene
+    pio.json.config.default_engine = engine
+    builds, dumps = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fig = build()
+        t1 = time.perf_counter()
+        body = to_json({"multi": True, "response": {"graph": {"figure": fig}}})
+        builds.append((t1 - t0) * 1000)
+        dumps.append((time.perf_counter() - t1) * 1000)
+    raw = body.encode()
+    t0 = time.perf_counter()
+    gz = gzip.compress(raw, 6)
+    gz_ms = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    br = brotli.compress(raw, quality=4) if brotli else b""
+    br_ms = (time.perf_counter() - t0) * 1000
+    return {"build_ms": np.median(builds), "json_ms": np.median(dumps), "raw": len(raw), "gzip": len(gz), "gzip_ms": gz_ms,
+            "br": len(br), "br_ms": br_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--load-points", type=int, default=10_000)
+    parser.add_argument("--ecg-samples", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = args.load_points
+    df = pd.DataFrame({"fecha": pd.date_range("2000-01-01", periods=n).strftime("%Y-%m-%d"),
+                       "carga": rng.integers(0, 900, n).astype(float), "sesiones": rng.integers(1, 3, n)})
+    fs = 250
+    y = synthetic.synthetic_ecg(args.ecg_samples / fs, fs)
+    t = np.arange(len(y)) / fs
+    # Resultado del trabajo de ECG tal como sale de ecg_jobs.resultado (listas JSON)
+    trace = json.loads(json.dumps({"t": t.tolist(), "y": y.tolist()}))
+
+    cases = [
+        (f"carga {n} pts", "antes", lambda: json.loads(load_figure(df).to_json()), "json"),
+        (f"carga {n} pts", "fig_json", lambda: fig_json.loads(fig_json.dumps(fig_json.figure_dict(load_figure(df)))), "orjson"),
+        (f"ECG {len(y)} muestras", "antes", lambda: ecg_figure(trace["t"], trace["y"]), "json"),
+        (f"ECG {len(y)} muestras", "fig_json", lambda: fig_json.figure_dict(ecg_figure(np.asarray(trace["t"]), np.asarray(trace["y"], dtype=np.float32))), "orjson"),
+    ]
+    if fig_json.orjson is None: sys.exit("orjson no está instalado")
+    print(f"{'figura':<20} {'camino':<9} {'construir':>10} {'json':>9} {'bytes':>10} {'gzip':>16} {'brotli':>16}")
+    results = {}
+    for name, label, build, engine in cases:
+        r = results[(name, label)] = measure(build, engine, args.repeat)
+        print(f"{name:<20} {label:<9} {r['build_ms']:>8.1f}ms {r['json_ms']:>7.1f}ms {r['raw'] / 1024:>8.0f}KiB "
+              f"{r['gzip'] / 1024:>6.0f}KiB {r['gzip_ms']:>5.1f}ms {r['br'] / 1024:>6.0f}KiB {r['br_ms']:>5.1f}ms")
+    fig_json.configure()
+    for name in dict.fromkeys(n for n, *_ in cases):
+        old, new = results[(name, "antes")], results[(name, "fig_json")]
+        print(f"{name}: {old['raw'] / new['raw']:.1f}x menos bytes sin comprimir, {old['raw'] / (new['br'] or new['gzip']):.1f}x con compresión, "
+              f"{(old['build_ms'] + old['json_ms']) / (new['build_ms'] + new['json_ms']):.1f}x más rápido")
+
+
+if __name__ == "__main__":
+    main()
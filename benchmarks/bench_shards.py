@@ -0,0 +1,99 @@
+# Escrituras concurrentes con una sola base frente a un shard por entrenador (shards.py):
+# cada proceso hace de la plantilla de un entrenador enviando cuestionarios a la vez
+# (hora punta) durante --seconds, como los workers de gunicorn. Con una sola base todos
+# esperan al mismo lock de escritura; con shards solo compiten los de la misma plantilla.
+# Uso: python benchmarks/bench_shards.py [--coaches 8] [--athletes 20] [--seconds 5]
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+import numpy as np
+
+
+def _squad(args):
+    # En otro proceso: cuestionarios de los atletas de un entrenador hasta el plazo
+    central, shards_dir, athletes, start, seconds = args
+    import db
+    import shards
+    db.DB_PATH = central
+    shards.SHARDS_DIR = shards_dir
+    # Esquemas ya creados y rutas resueltas antes de empezar a medir
+    for paciente in athletes: db.athlete_db(paciente)
+    while time.time() < start: time.sleep(0.001)
+    latencies, i = [], 0
+    # save_questionnaire_for_patient escribe una línea por cuestionario
+    with contextlib.redirect_stdout(io.StringIO()):
+        while time.time() < start + seconds:
+            t0 = time.perf_counter()
+            db.save_questionnaire_for_patient(athletes[i % len(athletes)], athletes[i % len(athletes)], 5, 7, 6, 60)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            i += 1
+    return latencies
+
+
+def run(central, shards_dir, squads, seconds):
+    start = time.time() + 1.0
+    with ProcessPoolExecutor(len(squads)) as pool:
+        results = list(pool.map(_squad, [(central, shards_dir, athletes, start, seconds) for athletes in squads]))
+    lat = np.concatenate([np.array(r) for r in results])
+    return {"writes": len(lat), "per_s": len(lat) / seconds, "p50": np.percentile(lat, 50), "p95": np.percentile(lat, 95),
+            "p99": np.percentile(lat, 99), "min_squad": min(len(r) for r in results)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--coaches", type=int, default=8)
+    parser.add_argument("--athletes", type=int, default=20, help="atletas por entrenador")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+    import synthetic
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        import shards
+        import db
+        from db_pool import close_pools, fetch_all
+        single = os.path.join(tmp, "unica.db")
+        synthetic.populate(single, coaches=args.coaches, athletes=args.coaches * args.athletes, years=0.1)
+        central = os.path.join(tmp, "central.db")
+        # Copia con la API de backup: lo que aún está en el WAL también cuenta
+        src, dst = sqlite3.connect(single), sqlite3.connect(central)
+        src.backup(dst)
+        src.close(), dst.close()
+        shards.split(central, os.path.join(tmp, "shards"))
+        roster = fetch_all(single, "SELECT nombre_paciente, entrenador_asociado FROM pacientes ORDER BY id")
+        squads = [[p for p, c in roster if c == synthetic.coach_name(i)] for i in range(args.coaches)]
+        close_pools()
+
+        before = sum(fetch_all(single, "SELECT COUNT(*) FROM cuestionarios")[0])
+        results = {"una base": run(single, None, squads, args.seconds)}
+        results["shards"] = run(central, os.path.join(tmp, "shards"), squads, args.seconds)
+        written = sum(fetch_all(single, "SELECT COUNT(*) FROM cuestionarios")[0]) - before
+        db.DB_PATH = central
+        in_shards = sum(sum(fetch_all(shards.shard_path(synthetic.coach_name(i), os.path.join(tmp, "shards")), "SELECT COUNT(*) FROM cuestionarios")[0])
+                        for i in range(args.coaches))
+        close_pools()
+        os.chdir(HERE)
+
+    print(f"{args.coaches} plantillas de {args.athletes} atletas enviando cuestionarios durante {args.seconds:g} s ({os.cpu_count()} CPU)")
+    print(f"{'modo':<10} {'escrituras':>10} {'por s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'plantilla más lenta':>20}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['writes']:>10} {r['per_s']:>8.0f} {r['p50']:>6.2f}ms {r['p95']:>6.2f}ms {r['p99']:>6.2f}ms {r['min_squad']:>20}")
+    single_r, sharded_r = results["una base"], results["shards"]
+    print(f"shards: {sharded_r['per_s'] / single_r['per_s']:.1f}x escrituras/s, p95 {single_r['p95'] / sharded_r['p95']:.1f}x menor")
+    ok = written == single_r["writes"] and in_shards >= sharded_r["writes"]
+    print("✅ OK" if ok else "❌ Faltan escrituras")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Vista de plantilla con 10, 100 y 1000 atletas: una consulta sobre tablas materializadas
+# frente al camino antiguo de varias consultas por atleta.
+# Uso: python benchmarks/bench_squad.py [--sizes 10 100 1000] [--days 365] [--repeat 5]
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+
+
+def populate(db, transaction, n_athletes, days, rng):
+    import athlete_stats
+    import workload
+    start = datetime.date.today() - datetime.timedelta(days=days)
+    rows = []
+    for i in range(n_athletes):
+        name = f"Atleta_{i}"
+        trained = np.flatnonzero(rng.random(days) < 0.6)
+        for d in trained:
+            fecha = (start + datetime.timedelta(days=int(d))).isoformat() + " 18:00:00"
+            rows.append((name, name, fecha, int(rng.integers(1, 11)), int(rng.integers(1, 11)), int(rng.integers(1, 11)), float(rng.integers(20, 120))))
+    with transaction(db.DB_PATH) as c:
+        c.executemany("INSERT INTO pacientes (username, nombre_paciente, entrenador_asociado, full_name, equipo) VALUES (?, ?, 'coach', ?, ?)",
+                      [(f"Atleta_{i}", f"Atleta_{i}", f"Atleta {i}", f"Equipo {i % 8}") for i in range(n_athletes)])
+        c.executemany("INSERT INTO cuestionarios (paciente, username, fecha, fatiga, suenio, rpe, tiempo_entrenamiento) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        athlete_stats.rebuild(c)
+        workload.rebuild(c)
+    return len(rows)
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return out, float(np.median(times)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    import db
+    from db_pool import transaction, close_pools
+    from squad import squad_overview
+
+    rng = np.random.default_rng(0)
+    print(f"{'atletas':>8} {'filas':>9} {'consulta':>10} {'payload':>10} {'antiguo N consultas':>20}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            db.DB_PATH = os.path.join(tmp, f"squad_{n}.db")
+            db.init_db()
+            n_rows = populate(db, transaction, n, args.days, rng)
+            rows, ms = timed(lambda: squad_overview(db.DB_PATH, db.coach_scope("coach", "entrenador")), args.repeat)
+            payload = len(json.dumps(rows))
+            # Antes: al menos la serie de carga y las medias de cada atleta por separado
+            names = [r["id"] for r in rows]
+            def naive():
+                for p in names:
+                    db.fetch_all(db.DB_PATH, "SELECT fecha, CAST(rpe AS FLOAT) * CAST(tiempo_entrenamiento AS FLOAT) FROM cuestionarios WHERE paciente = ? ORDER BY fecha", (p,))
+                    db.get_patient_averages(p)
+            _, naive_ms = timed(naive, 1)
+            print(f"{n:>8} {n_rows:>9} {ms:>8.1f}ms {payload / 1024:>8.0f}KB {naive_ms:>18.1f}ms")
+            close_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# Suite de rendimiento de los caminos críticos sobre datos sintéticos (synthetic.py):
+# login, vista de gráficas del corredor, vista del entrenador, envío de ECG y cálculo
+# de BPM. Los callbacks se ejecutan por HTTP con el cliente de pruebas de Flask, igual
+# que los pide el navegador (serialización incluida).
+#
+#   python benchmarks/suite.py                       # resultados en benchmarks/results/
+#   python benchmarks/suite.py --save-baseline       # fija benchmarks/baseline.json
+#   python benchmarks/suite.py --compare             # sale con 1 si algo empeora > --threshold
+#   python benchmarks/suite.py --compare-only a.json # compara un resultado ya guardado
+#
+# La línea base depende de la máquina: regenerarla con --save-baseline al cambiar de equipo.
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import numpy as np
+import synthetic
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, "results")
+BASELINE = os.path.join(HERE, "baseline.json")
+
+
+def measure(fn, repeat, warmup=1, setup=None):
+    for _ in range(warmup):
+        if setup: setup()
+        fn()
+    times = []
+    for _ in range(repeat):
+        if setup: setup()
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return summarize(times)
+
+
+def summarize(times):
+    t = np.asarray(times)
+    return {"median_ms": round(float(np.median(t)), 3), "p95_ms": round(float(np.percentile(t, 95)), 3),
+            "min_ms": round(float(t.min()), 3), "n": len(t)}
+
+
+def dash_call(client, app, inputs, state, trigger):
+    # POST a /_dash-update-component como lo haría el renderer de Dash. inputs/state
+    # son {"id.prop": valor}; el callback se busca por sus entradas.
+    key = next(k for k, cb in app.callback_map.items()
+               if [f"{i['id']}.{i['property']}" for i in cb["inputs"]] == list(inputs))
+    cb = app.callback_map[key]
+    out = cb["output"]
+    spec = lambda o: {"id": o.component_id, "property": o.component_property}
+    body = {"output": key, "outputs": [spec(o) for o in out] if isinstance(out, list) else spec(out),
+            "inputs": [{"id": k.split(".")[0], "property": k.split(".")[1], "value": v} for k, v in inputs.items()],
+            "state": [{"id": s["id"], "property": s["property"], "value": state.get(f"{s['id']}.{s['property']}")} for s in cb["state"]],
+            "changedPropIds": [trigger]}
+    r = client.post("/_dash-update-component", json=body)
+    if r.status_code != 200: raise RuntimeError(f"{key}: HTTP {r.status_code}")
+    return r.get_json()
+
+
+def run_suite(args, workdir):
+    # Todo relativo a workdir: la app usa "database.db" y "data/" relativos al cwd
+    os.chdir(workdir)
+    os.makedirs("data", exist_ok=True)
+    import db
+    db.DB_PATH = os.path.join(workdir, "database.db")
+    t0 = time.perf_counter()
+    counts = synthetic.populate(db.DB_PATH, args.coaches, args.athletes, args.years, seed=args.seed)
+    counts["populate_s"] = round(time.perf_counter() - t0, 2)
+
+    signal = synthetic.synthetic_ecg(args.ecg_minutes * 60, args.fs, args.bpm, args.noise, seed=args.seed)
+    csv_path = synthetic.write_ecg(os.path.join("data", "sintetico.csv"), signal, args.fs)
+    bin_path = synthetic.write_ecg(os.path.join("data", "sintetico_ref.ecg"), signal, args.fs)
+
+    import app as app_module
+    import ecg_cache
+    import figure_cache
+    import jobs
+    import sensors
+    from db_pool import close_pools
+    app = app_module.app
+    client = app.server.test_client()
+    coach = {"user": synthetic.coach_name(0), "role": "entrenador"}
+    runner = {"user": synthetic.athlete_name(0), "role": "paciente"}
+    repeat = args.repeat
+    cases = {}
+
+    cases["login"] = measure(lambda: db.bootstrap_session(coach["user"], synthetic.PASSWORD), repeat * 10)
+    # Hasta tener el árbol del panel: lo que hace el router justo después del login
+    cases["login_dashboard"] = measure(lambda: app_module.router("/dashboard", db.bootstrap_session(coach["user"], synthetic.PASSWORD)), repeat * 10)
+
+    # Vista de gráficas: el único viaje al servidor es el paquete de datos del Store
+    graphs = lambda: dash_call(client, app, {"runner-data-request.data": 1}, {"session.data": runner}, "runner-data-request.data")
+    cases["runner_graphs"] = measure(graphs, repeat)
+    # Sin caché de figuras: lo que ve el primer usuario tras cada escritura
+    cases["runner_graphs_cold"] = measure(graphs, repeat, setup=figure_cache._cache.clear)
+
+    manager = lambda p: lambda: dash_call(client, app, {"patient-dropdown.value": p}, {"session.data": coach}, "patient-dropdown.value")
+    cases["manager_squad"] = measure(manager(None), repeat)
+    cases["manager_athlete"] = measure(manager(runner["user"]), repeat)
+    cases["manager_athlete_cold"] = measure(manager(runner["user"]), repeat, setup=figure_cache._cache.clear)
+
+    # Envío: cuestionario + entrenamiento + trabajo de ECG encolado (lo que espera el usuario),
+    # y por separado el tiempo hasta que el gráfico del trabajo terminado está pintado. Reenviar la misma
+    # grabación sale de ecg_cache; los casos _cold vacían esa caché antes de cada envío.
+    def submit(i):
+        t0 = time.perf_counter()
+        res = dash_call(client, app, {"submit-questionnaire.n_clicks": i + 1},
+                        {"session.data": runner, "fatiga.value": 5, "suenio.value": 7, "rpe.value": 6,
+                         "tiempo_entrenamiento.value": 60, "sensor-file-dropdown.value": os.path.basename(csv_path)},
+                        "submit-questionnaire.n_clicks")
+        t1 = time.perf_counter()
+        job = res["response"]["ecg-job"]["data"]
+        # Sin trabajo: acierto de caché, el gráfico ya viene en la respuesta
+        if not job and "ecg-graph" not in json.dumps(res["response"]["ecg-graph-container"]):
+            raise RuntimeError("el envío no encoló trabajo de ECG")
+        while job and jobs.get_job(job["id"])["estado"] not in ("hecho", "error"): time.sleep(0.005)
+        # Hasta que el usuario ve el gráfico: con trabajo, el sondeo que lo pinta
+        if job: dash_call(client, app, {"ecg-job-poll.n_intervals": 1}, {"ecg-job.data": job}, "ecg-job-poll.n_intervals")
+        return (t1 - t0) * 1000, (time.perf_counter() - t0) * 1000
+
+    # La primera vuelta convierte el CSV y arranca el pool de procesos: no cuenta
+    submit(0)
+    runs = [submit(i + 1) for i in range(repeat)]
+    cases["ecg_submit"] = summarize([r[0] for r in runs])
+    cases["ecg_job"] = summarize([r[1] for r in runs])
+    runs = []
+    for i in range(repeat):
+        ecg_cache.clear()
+        runs.append(submit(repeat + i + 1))
+    jobs.get_runner().stop()
+    cases["ecg_submit_cold"] = summarize([r[0] for r in runs])
+    cases["ecg_job_cold"] = summarize([r[1] for r in runs])
+
+    cases["bpm_csv"] = measure(lambda: sensors.load_ecg_and_compute_bpm(csv_path, args.fs), repeat)
+    cases["bpm_ecg"] = measure(lambda: sensors.load_ecg_and_compute_bpm(bin_path, args.fs), repeat)
+    bpm = sensors.load_ecg_and_compute_bpm(bin_path, args.fs)[2]
+    close_pools()
+    counts["bpm_estimado"] = round(float(bpm), 1)
+    return counts, cases
+
+
+def git_commit():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError: return None
+
+
+def compare(result, baseline, threshold, min_ms):
+    # Regresión: la mediana empeora más de threshold (relativo) y más de min_ms (absoluto),
+    # para que el ruido en casos de microsegundos no dispare la alarma
+    if result["params"] != baseline.get("params"):
+        print(f"⚠️ Parámetros distintos a la línea base: {baseline.get('params')} -> {result['params']}")
+    regressions = []
+    print(f"{'caso':<22} {'base':>10} {'actual':>10} {'cambio':>8}")
+    for name, cur in result["cases"].items():
+        base = baseline["cases"].get(name)
+        if not base:
+            print(f"{name:<22} {'-':>10} {cur['median_ms']:>8.2f}ms {'nuevo':>8}")
+            continue
+        ratio = cur["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+        worse = ratio > 1 + threshold and cur["median_ms"] - base["median_ms"] > min_ms
+        if worse: regressions.append(name)
+        print(f"{name:<22} {base['median_ms']:>8.2f}ms {cur['median_ms']:>8.2f}ms {100 * (ratio - 1):>+7.0f}%{'  ❌' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de los caminos críticos")
+    parser.add_argument("--coaches", type=int, default=5)
+    parser.add_argument("--athletes", type=int, default=200)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--ecg-minutes", type=float, default=10)
+    parser.add_argument("--fs", type=int, default=250)
+    parser.add_argument("--bpm", type=float, default=70)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--out", help="fichero de resultados (por defecto benchmarks/results/<fecha>.json)")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--compare-only", metavar="RESULTADO")
+    parser.add_argument("--threshold", type=float, default=0.25, help="empeoramiento relativo tolerado (0.25 = 25%%)")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="empeoramiento absoluto mínimo para avisar")
+    args = parser.parse_args()
+
+    if args.compare_only:
+        with open(args.compare_only) as f: result = json.load(f)
+    else:
+        params = {k: getattr(args, k) for k in ("coaches", "athletes", "years", "ecg_minutes", "fs", "bpm", "noise", "seed", "repeat")}
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            try: data, cases = run_suite(args, tmp)
+            finally: os.chdir(cwd)
+        result = {"fecha": datetime.datetime.now().isoformat(timespec="seconds"), "commit": git_commit(),
+                  "python": platform.python_version(), "maquina": platform.platform(), "cpus": os.cpu_count(),
+                  "params": params, "datos": data, "cases": cases}
+        out = args.out or os.path.join(RESULTS_DIR, datetime.datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+        os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+        with open(out, "w") as f: json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"Datos: {data}")
+        for name, c in cases.items():
+            print(f"{name:<22} p50 {c['median_ms']:>9.2f} ms   p95 {c['p95_ms']:>9.2f} ms   (n={c['n']})")
+        print(f"Resultados en {out}")
+        if args.save_baseline:
+            with open(args.baseline, "w") as f: json.dump(result, f, indent=2, ensure_ascii=False)
+            print(f"✅ Línea base guardada en {args.baseline}")
+
+    if args.compare or args.compare_only:
+        if not os.path.exists(args.baseline): sys.exit(f"No hay línea base en {args.baseline} (usar --save-baseline)")
+        with open(args.baseline) as f: baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold, args.min_ms)
+        if regressions:
+            print(f"❌ Regresiones (> {args.threshold:.0%}): {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ Sin regresiones")
+
+
+if __name__ == "__main__":
+    main()
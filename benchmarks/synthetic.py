@@ -0,0 +1,112 @@
+# Generadores de datos sintéticos para los benchmarks: entrenadores, atletas, años
+# de cuestionarios/entrenamientos y señales ECG de duración y ruido configurables.
+# Uso: python benchmarks/synthetic.py ruta.db [--coaches 5] [--athletes 200] [--years 2]
+#      python benchmarks/synthetic.py --ecg data/sintetico.csv [--minutes 10] [--noise 0.05]
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+
+PASSWORD = "bench"
+TEAMS = ["Club", "Juvenil", "Élite", "Máster"]
+SPORTS = ["Running", "Trail", "Triatlón"]
+
+
+def coach_name(i): return f"coach_{i}"
+def athlete_name(i): return f"runner_{i}"
+
+
+def synthetic_ecg(seconds, fs=250, bpm=70, noise=0.05, hrv=0.03, seed=0):
+    # Complejo QRS gaussiano en cada latido + deriva de línea base + ruido blanco.
+    # La frecuencia varía ±hrv entre latidos para que el RR no sea constante.
+    rng = np.random.default_rng(seed)
+    n = int(seconds * fs)
+    rr = 60.0 / bpm * (1 + hrv * rng.standard_normal(int(seconds * bpm / 60) + 2))
+    beats = np.cumsum(rr)
+    beats = (beats[beats < seconds] * fs).astype(np.int64)
+    signal = rng.normal(0, noise, n) + 0.1 * np.sin(2 * np.pi * 0.25 * np.arange(n) / fs)
+    width = max(1, int(0.01 * fs))
+    qrs = np.exp(-0.5 * (np.arange(-3 * width, 3 * width + 1) / width) ** 2)
+    for b in beats:
+        lo, hi = max(0, b - 3 * width), min(n, b + 3 * width + 1)
+        signal[lo:hi] += 1.5 * qrs[lo - b + 3 * width:hi - b + 3 * width]
+    return signal.astype(np.float32)
+
+
+def write_ecg(path, signal, fs=250):
+    # .csv con columna ECG (como los ficheros de los sensores) o .ecg binario
+    from ecg_store import ECG_EXT, write_recording
+    if str(path).endswith(ECG_EXT): write_recording(path, signal, fs=fs)
+    else: np.savetxt(path, signal, fmt="%.5f", header="ECG", comments="")
+    return path
+
+
+def populate(path, coaches=5, athletes=200, years=2, train_ratio=0.6, seed=0, today=None):
+    # Crea usuarios (entrenadores y corredores), pacientes repartidos entre entrenadores
+    # y una sesión (cuestionario + entrenamiento) el train_ratio de los días de cada
+    # atleta. Las tablas materializadas se reconstruyen en la misma transacción.
+    import athlete_stats
+    import team_stats
+    import workload
+    from db_pool import transaction
+    from migrations import migrate
+
+    migrate(path)
+    rng = np.random.default_rng(seed)
+    today = today or datetime.date.today()
+    days = int(years * 365)
+    start = today - datetime.timedelta(days=days)
+    dates = [(start + datetime.timedelta(days=d)).isoformat() for d in range(days)]
+
+    users = [(coach_name(i), PASSWORD, "entrenador") for i in range(coaches)]
+    users += [(athlete_name(i), PASSWORD, "paciente") for i in range(athletes)]
+    pacientes = [(athlete_name(i), athlete_name(i), f"Atleta {i:05d}", coach_name(i % coaches), TEAMS[i % len(TEAMS)],
+                  SPORTS[i % len(SPORTS)], int(rng.integers(45, 75)), float(rng.normal(50, 6))) for i in range(athletes)]
+    cuestionarios, entrenamientos = [], []
+    for i in range(athletes):
+        name = athlete_name(i)
+        for d in np.flatnonzero(rng.random(days) < train_ratio):
+            fecha = f"{dates[d]} 18:00:00"
+            fatiga, suenio, rpe = (int(v) for v in rng.integers(1, 11, 3))
+            minutos = float(rng.integers(20, 120))
+            cuestionarios.append((name, name, fecha, fatiga, suenio, rpe, minutos))
+            entrenamientos.append((name, minutos, fatiga, rpe, int(rng.integers(110, 175)), fecha, fecha))
+    with transaction(path) as c:
+        c.executemany("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", users)
+        c.executemany("INSERT INTO pacientes (username, nombre_paciente, full_name, entrenador_asociado, equipo, deporte, fcr, vo2) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", pacientes)
+        c.executemany("INSERT INTO cuestionarios (paciente, username, fecha, fatiga, suenio, rpe, tiempo_entrenamiento) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      cuestionarios)
+        c.executemany("INSERT INTO entrenamientos (paciente, duracion, fatiga, rpe, bpm, fecha_inicio, fecha_fin, validacion_especialista) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, 'Pendiente')", entrenamientos)
+        athlete_stats.rebuild(c)
+        workload.rebuild(c)
+        team_stats.refresh(c)
+    return {"coaches": coaches, "athletes": athletes, "years": years,
+            "cuestionarios": len(cuestionarios), "entrenamientos": len(entrenamientos)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos para benchmarks")
+    parser.add_argument("db", nargs="?")
+    parser.add_argument("--coaches", type=int, default=5)
+    parser.add_argument("--athletes", type=int, default=200)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ecg", help="escribe una señal sintética (.csv o .ecg) en esta ruta")
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--fs", type=int, default=250)
+    parser.add_argument("--bpm", type=float, default=70)
+    parser.add_argument("--noise", type=float, default=0.05)
+    args = parser.parse_args()
+    if args.db:
+        t0 = time.perf_counter()
+        counts = populate(args.db, args.coaches, args.athletes, args.years, seed=args.seed)
+        print(f"✅ {counts} en {time.perf_counter() - t0:.1f} s")
+    if args.ecg:
+        write_ecg(args.ecg, synthetic_ecg(args.minutes * 60, args.fs, args.bpm, args.noise, seed=args.seed), args.fs)
+        print(f"✅ {args.ecg}: {args.minutes} min a {args.fs} Hz, ruido {args.noise}")
@@ -0,0 +1,266 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import pandas as pd
+from db_pool import iter_batches, transaction
+import athlete_stats
+import shards
+import workload
+from figure_cache import bump_version, ALL
+from db import UNASSIGNED_COACH
+
+# Importación y exportación masiva de cuestionarios/entrenamientos (altas de un club
+# con histórico, sincronizar una semana de ficheros de un reloj...). Cada bloque de
+# BATCH_ROWS filas entra con un executemany a una tabla temporal y una sola
+# transacción: deduplicación por (paciente, fecha), altas de atletas nuevos, agregados
+# materializados y versiones de caché, en vez de un commit por fila. Con shards las altas
+# van a la central y cada bloque se reparte en una transacción por shard de entrenador.
+#
+#   python bulk.py import sesiones.csv [--table sesiones] [--coach entrenador1]
+#   python bulk.py export cuestionarios --out cuestionarios.parquet
+BATCH_ROWS = 100_000
+FORMATS = ("csv", "jsonl", "json", "parquet")
+
+# Columnas de cada tabla tal como se exportan e importan; "fecha" es la clave de
+# deduplicación junto con paciente
+TABLES = {
+    "cuestionarios": {"fecha": "fecha", "numeric": ["fatiga", "suenio", "rpe", "tiempo_entrenamiento"],
+                      "cols": ["paciente", "username", "fecha", "fatiga", "suenio", "rpe", "tiempo_entrenamiento"]},
+    "entrenamientos": {"fecha": "fecha_inicio", "numeric": ["duracion", "fatiga", "rpe", "bpm"],
+                       "cols": ["paciente", "duracion", "fatiga", "rpe", "bpm", "fecha_inicio", "fecha_fin",
+                                "validacion_especialista", "comentarios_especialista"]},
+}
+
+
+def detect_format(path, fmt=None):
+    if fmt: return fmt
+    ext = os.path.splitext(str(path))[1].lower().lstrip(".")
+    ext = {"ndjson": "jsonl", "pq": "parquet"}.get(ext, ext)
+    if ext not in FORMATS: raise ValueError(f"Formato desconocido para {path}: usar --format {'/'.join(FORMATS)}")
+    return ext
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError as e:
+        raise ImportError("Parquet necesita pyarrow: pip install pyarrow") from e
+
+
+def read_chunks(path, fmt=None, size=BATCH_ROWS):
+    # DataFrames de como mucho size filas; CSV, JSON Lines y Parquet sin cargar el fichero entero
+    fmt = detect_format(path, fmt)
+    src = sys.stdin if path == "-" else path
+    if fmt == "csv": yield from pd.read_csv(src, chunksize=size)
+    elif fmt == "jsonl": yield from pd.read_json(src, lines=True, chunksize=size, dtype=False)
+    elif fmt == "json":
+        # Un array JSON no se puede leer por partes: se carga y se trocea
+        df = pd.read_json(src, dtype=False)
+        for i in range(0, len(df), size): yield df.iloc[i:i + size]
+    else:
+        for batch in _pyarrow().parquet.ParquetFile(path).iter_batches(batch_size=size): yield batch.to_pandas()
+
+
+def normalize(df, table):
+    # DataFrame de entrada -> (filas listas para INSERT, rechazadas, repetidas en el bloque). Fechas a
+    # "YYYY-MM-DD HH:MM:SS" como las escribe la app; sin paciente o fecha se descarta.
+    spec = TABLES[table]
+    key = spec["fecha"]
+    if "paciente" not in df.columns or key not in df.columns:
+        raise ValueError(f"{table}: faltan columnas obligatorias (paciente, {key}); hay {list(df.columns)}")
+    df = df.copy()
+    # Identificadores numéricos en JSON/Parquet: se guardan como texto igual que en la app
+    paciente = df["paciente"].astype("string").str.strip()
+    df["paciente"] = paciente.mask(paciente == "")
+    df[key] = pd.to_datetime(df[key], errors="coerce", format="ISO8601").dt.strftime("%Y-%m-%d %H:%M:%S")
+    for col in spec["numeric"]:
+        if col in df.columns: df[col] = pd.to_numeric(df[col], errors="coerce")
+    if table == "cuestionarios":
+        if "username" not in df.columns: df["username"] = df["paciente"]
+    else:
+        df["fecha_fin"] = pd.to_datetime(df["fecha_fin"], errors="coerce", format="ISO8601").dt.strftime("%Y-%m-%d %H:%M:%S") \
+            if "fecha_fin" in df.columns else df[key]
+        # bpm 0 = sin pulso, como guarda la app hasta que termina el análisis del ECG
+        df["bpm"] = df["bpm"].fillna(0) if "bpm" in df.columns else 0
+        # Los mismos valores por defecto que la tabla; en CSV una celda vacía llega como NaN
+        df["validacion_especialista"] = df["validacion_especialista"].fillna("Pendiente") if "validacion_especialista" in df.columns else "Pendiente"
+        df["comentarios_especialista"] = df["comentarios_especialista"].fillna("") if "comentarios_especialista" in df.columns else ""
+    for col in spec["cols"]:
+        if col not in df.columns: df[col] = None
+    ok = df["paciente"].notna() & df[key].notna()
+    # Duplicados dentro del propio bloque: se queda la primera aparición. Ordenado por
+    # (paciente, fecha) las inserciones en los índices van casi siempre al final.
+    out = df.loc[ok, spec["cols"]].drop_duplicates(["paciente", key]).sort_values(["paciente", key], kind="stable").astype(object)
+    out = out.where(out.notna(), None)
+    return list(out.itertuples(index=False, name=None)), int((~ok).sum()), int(ok.sum()) - len(out)
+
+
+def sessions_to_tables(df):
+    # Una sesión exportada (cuestionario + pulso del reloj) son dos filas, como las que
+    # guarda runner_submit_data
+    tr = pd.DataFrame({"paciente": df.get("paciente"), "fecha_inicio": df.get("fecha"),
+                       "duracion": df.get("duracion", df.get("tiempo_entrenamiento")),
+                       "fatiga": df.get("fatiga"), "rpe": df.get("rpe"), "bpm": df.get("bpm", 0)})
+    return {"cuestionarios": df, "entrenamientos": tr}
+
+
+def _register(c, athletes, coach):
+    # Atletas que no existían: alta mínima con el entrenador indicado
+    c.executemany("INSERT OR IGNORE INTO pacientes (username, nombre_paciente, entrenador_asociado, full_name) VALUES (?, ?, ?, ?)",
+                  [(p, p, coach, p) for p in athletes])
+    new_athletes = max(c.rowcount, 0)
+    if new_athletes: bump_version(c, ALL)
+    return new_athletes
+
+
+def _flush(c, table, rows, coach=None):
+    # Todo dentro de la transacción del bloque: si algo falla no queda nada a medias.
+    # coach=None: las altas ya se hicieron en la central (con shards)
+    spec = TABLES[table]
+    cols, key = spec["cols"], spec["fecha"]
+    staging = f"temp.bulk_{table}"
+    c.execute(f"CREATE TEMP TABLE IF NOT EXISTS bulk_{table} AS SELECT {', '.join(cols)} FROM {table} WHERE 0")
+    c.execute(f"DELETE FROM {staging}")
+    c.executemany(f"INSERT INTO {staging} VALUES ({', '.join('?' for _ in cols)})", rows)
+    new_athletes = 0
+    if coach is not None:
+        c.execute(f"INSERT OR IGNORE INTO pacientes (username, nombre_paciente, entrenador_asociado, full_name) "
+                  f"SELECT DISTINCT paciente, paciente, ?, paciente FROM {staging} WHERE paciente NOT IN (SELECT nombre_paciente FROM pacientes)", (coach,))
+        new_athletes = c.rowcount
+    last_id = c.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+    # El bloque ya viene sin repetidos (normalize); aquí se descarta lo que ya esté en la tabla
+    c.execute(f"""
+        INSERT INTO {table} ({', '.join(cols)})
+        SELECT {', '.join('s.' + col for col in cols)} FROM {staging} s
+        WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE t.paciente = s.paciente AND t.{key} = s.{key})
+    """)
+    inserted = c.rowcount
+    if inserted:
+        # Las filas nuevas ocupan el rango de id siguiente (AUTOINCREMENT)
+        first_id, last_id = last_id + 1, c.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0]
+        athlete_stats.apply_range(c, table, first_id, last_id)
+        if table == "cuestionarios": workload.apply_range(c, first_id, last_id)
+        bump_version(c, *[r[0] for r in c.execute(f"SELECT DISTINCT paciente FROM {table} WHERE id BETWEEN ? AND ?", (first_id, last_id)).fetchall()])
+    if new_athletes: bump_version(c, ALL)
+    c.execute(f"DELETE FROM {staging}")
+    return inserted, new_athletes
+
+
+def ingest(path, chunks, table="sesiones", coach=UNASSIGNED_COACH, progress=None, shards_dir=None):
+    # chunks: iterable de DataFrames (read_chunks). Devuelve contadores por tabla.
+    targets = ["cuestionarios", "entrenamientos"] if table == "sesiones" else [table]
+    stats = {t: {"leidas": 0, "insertadas": 0, "duplicadas": 0, "rechazadas": 0} for t in targets}
+    stats["atletas_nuevos"] = 0
+    for df in chunks:
+        frames = sessions_to_tables(df) if table == "sesiones" else {table: df}
+        batch = {t: normalize(frames[t], t) for t in targets}
+        inserted = dict.fromkeys(targets, 0)
+        if shards.enabled(shards_dir):
+            # Altas primero: el entrenador de cada atleta decide su shard
+            with transaction(path) as c:
+                stats["atletas_nuevos"] += _register(c, {r[0] for rows, _, _ in batch.values() for r in rows}, coach)
+            parts = {}
+            routes = {p: shard for shard, athletes in shards.group_by_shard(path, [r[0] for rows, _, _ in batch.values() for r in rows], shards_dir).items() for p in athletes}
+            for t, (rows, _, _) in batch.items():
+                for r in rows: parts.setdefault(routes[r[0]], {}).setdefault(t, []).append(r)
+            for shard, tables in parts.items():
+                with transaction(shard) as c:
+                    for t, rows in tables.items(): inserted[t] += _flush(c, t, rows)[0]
+        else:
+            with transaction(path) as c:
+                for t, (rows, _, _) in batch.items():
+                    n, new_athletes = _flush(c, t, rows, coach) if rows else (0, 0)
+                    inserted[t] += n
+                    stats["atletas_nuevos"] += new_athletes
+        for t, (rows, rejected, repeated) in batch.items():
+            s = stats[t]
+            s["leidas"] += len(rows) + rejected + repeated
+            s["rechazadas"] += rejected
+            s["insertadas"] += inserted[t]
+            s["duplicadas"] += len(rows) + repeated - inserted[t]
+        if progress: progress(stats)
+    return stats
+
+
+def export(path, table, out, fmt=None, paciente=None, size=BATCH_ROWS, shards_dir=None):
+    # Volcado por bloques (iter_batches): la memoria no depende del tamaño de la tabla
+    fmt = detect_format(out, fmt) if out != "-" else (fmt or "csv")
+    cols = TABLES[table]["cols"]
+    sql = f"SELECT {', '.join(cols)} FROM {table}" + (" WHERE paciente = ?" if paciente else "") + " ORDER BY id"
+    if not shards.enabled(shards_dir): sources = [path]
+    elif paciente: sources = [shards.path_for(path, paciente, shards_dir)]
+    else: sources = [shards.ensure(shards.shard_path(coach, shards_dir)) for coach in shards.all_coaches(path, shards_dir)]
+    # Con shards, un shard detrás de otro (cada uno en orden de id)
+    batches = (rows for src in sources for rows in iter_batches(src, sql, (paciente,) if paciente else (), size))
+    n = 0
+    if fmt == "parquet":
+        pa = _pyarrow()
+        writer = None
+        try:
+            for rows in batches:
+                part = pa.Table.from_pandas(pd.DataFrame(rows, columns=cols), preserve_index=False)
+                if writer is None: writer = pa.parquet.ParquetWriter(out, part.schema)
+                writer.write_table(part.cast(writer.schema))
+                n += len(rows)
+        finally:
+            if writer: writer.close()
+        return n
+    if fmt == "json": raise ValueError("Para exportar por bloques usar jsonl (un objeto por línea) en lugar de json")
+    f = sys.stdout if out == "-" else open(out, "w", newline="", encoding="utf-8")
+    try:
+        if fmt == "csv":
+            w = csv.writer(f)
+            w.writerow(cols)
+            for rows in batches:
+                w.writerows(rows)
+                n += len(rows)
+        else:
+            for rows in batches:
+                f.writelines(json.dumps(dict(zip(cols, r)), ensure_ascii=False) + "\n" for r in rows)
+                n += len(rows)
+    finally:
+        if f is not sys.stdout: f.close()
+    return n
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importación/exportación masiva de sesiones")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import")
+    imp.add_argument("files", nargs="+", help="ficheros CSV/JSON Lines/JSON/Parquet ('-' = stdin)")
+    imp.add_argument("--table", choices=["sesiones", *TABLES], default="sesiones")
+    imp.add_argument("--coach", default=UNASSIGNED_COACH, help="entrenador de los atletas que no existan")
+    exp = sub.add_parser("export")
+    exp.add_argument("table", choices=list(TABLES))
+    exp.add_argument("--out", default="-")
+    exp.add_argument("--paciente")
+    for p in (imp, exp):
+        p.add_argument("--db", default="database.db")
+        p.add_argument("--format", choices=FORMATS)
+        p.add_argument("--batch", type=int, default=BATCH_ROWS)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.cmd == "import":
+        from migrations import migrate
+        migrate(args.db)
+        total = {}
+        for path in args.files:
+            stats = ingest(args.db, read_chunks(path, args.format, args.batch), args.table, args.coach)
+            for t, s in stats.items():
+                if t == "atletas_nuevos": total[t] = total.get(t, 0) + s
+                else: total[t] = {k: total.get(t, {}).get(k, 0) + v for k, v in s.items()}
+        wall = time.perf_counter() - t0
+        read = sum(s["leidas"] for t, s in total.items() if t != "atletas_nuevos")
+        for t, s in total.items():
+            if t != "atletas_nuevos": print(f"{t}: {s}")
+        print(f"✅ {read} filas en {wall:.2f} s ({read / wall:,.0f} filas/s), {total.get('atletas_nuevos', 0)} atletas nuevos")
+    else:
+        n = export(args.db, args.table, args.out, args.format, args.paciente, args.batch)
+        wall = time.perf_counter() - t0
+        print(f"✅ {n} filas de {args.table} en {wall:.2f} s ({n / max(wall, 1e-9):,.0f} filas/s)", file=sys.stderr)
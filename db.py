@@ -1,182 +1,279 @@
-import sqlite3
-import datetime
-
-DB_PATH = "database.db"
-
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password TEXT, role TEXT DEFAULT 'entrenador')")
-    c.execute("CREATE TABLE IF NOT EXISTS pacientes (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT, nombre_paciente TEXT UNIQUE, full_name TEXT, edad INTEGER, peso REAL, altura REAL, entrenador_asociado TEXT, equipo TEXT DEFAULT 'Sin asignar', deporte TEXT DEFAULT 'Running', posicion TEXT, nacionalidad TEXT DEFAULT 'Desconocida', fcr INTEGER DEFAULT 60, vo2 REAL DEFAULT 45.0)")
-    c.execute("CREATE TABLE IF NOT EXISTS cuestionarios (id INTEGER PRIMARY KEY AUTOINCREMENT, paciente TEXT, username TEXT, fecha TEXT, fatiga INTEGER, suenio INTEGER, rpe INTEGER, tiempo_entrenamiento REAL)")
-    c.execute("CREATE TABLE IF NOT EXISTS entrenamientos (id INTEGER PRIMARY KEY AUTOINCREMENT, paciente TEXT, duracion REAL, fatiga INTEGER, rpe INTEGER, bpm INTEGER DEFAULT 0, fecha_inicio TEXT, fecha_fin TEXT, validacion_especialista TEXT DEFAULT 'Pendiente', comentarios_especialista TEXT DEFAULT '')")
-    conn.commit()
-    conn.close()
-
-def add_user(username, password, role="entrenador"):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    try:
-        c.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", (username, password, role))
-        if role == 'paciente':
-            c.execute("SELECT id FROM pacientes WHERE username = ?", (username,))
-            if not c.fetchone():
-                 # Creamos el paciente asegurando que el nombre es el username para evitar confusiones
-                 c.execute("INSERT INTO pacientes (username, nombre_paciente, entrenador_asociado, full_name, equipo, deporte, fcr, vo2) VALUES (?, ?, 'Auto', ?, 'Club', 'Running', 60, 45)", (username, username, username))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError: return False
-    finally: conn.close()
-
-def user_exists(username):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE username = ?", (username,))
-    res = c.fetchone()
-    conn.close()
-    return res is not None
-
-def authenticate_user(username, password):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT role FROM users WHERE username = ? AND password = ?", (username, password))
-    row = c.fetchone()
-    conn.close()
-    return row[0] if row else None
-
-def get_patients_by_user(username, role):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    # TRUCO: El entrenador ve a TODOS para que no salga la lista vacía
-    c.execute("SELECT nombre_paciente, equipo, full_name, nacionalidad FROM pacientes")
-    patients = [{"label": f"{r[2] if r[2] else r[0]} ({r[1]})", "value": r[0]} for r in c.fetchall()]
-    conn.close()
-    return patients
-
-def create_patient(entrenador_username):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT count(*) FROM pacientes WHERE entrenador_asociado = ?", (entrenador_username,))
-    count = c.fetchone()[0] + 1
-    nombre_paciente = f"Atleta_{count}_{entrenador_username}"
-    while True:
-        c.execute("SELECT id FROM pacientes WHERE nombre_paciente = ?", (nombre_paciente,))
-        if not c.fetchone(): break
-        nombre_paciente += "_X"
-    c.execute("INSERT INTO pacientes (username, nombre_paciente, entrenador_asociado, full_name, edad, peso, altura, equipo, deporte, fcr, vo2) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 60, 45)", (nombre_paciente, nombre_paciente, entrenador_username, "Nuevo Atleta", 0, 0, 0, "Sin Equipo", "General"))
-    conn.commit()
-    conn.close()
-    return nombre_paciente
-
-def get_patient_info(paciente):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT full_name, edad, peso, altura, equipo, deporte, posicion, nacionalidad, fcr, vo2 FROM pacientes WHERE nombre_paciente = ?", (paciente,))
-    row = c.fetchone()
-    conn.close()
-    if row: return {"full_name": row[0], "edad": row[1], "peso": row[2], "altura": row[3], "equipo": row[4], "deporte": row[5], "posicion": row[6], "nacionalidad": row[7], "fcr": row[8], "vo2": row[9]}
-    return {}
-
-def save_patient_info(nombre_paciente, full_name, edad, peso, altura, equipo, deporte, posicion, nacionalidad, fcr, vo2):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("UPDATE pacientes SET full_name=?, edad=?, peso=?, altura=?, equipo=?, deporte=?, posicion=?, nacionalidad=?, fcr=?, vo2=? WHERE nombre_paciente=?", (full_name, edad, peso, altura, equipo, deporte, posicion, nacionalidad, fcr, vo2, nombre_paciente))
-    conn.commit()
-    conn.close()
-    print(f"--- DB: Perfil actualizado para {nombre_paciente} ---")
-
-def get_metrics_for_comparison(selected_patients=None):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    query = "SELECT nombre_paciente, full_name, vo2, fcr FROM pacientes"
-    if selected_patients:
-        placeholders = ','.join('?' for _ in selected_patients)
-        query += f" WHERE nombre_paciente IN ({placeholders})"
-        c.execute(query, tuple(selected_patients))
-    else: c.execute(query)
-    clean_data = []
-    for row in c.fetchall():
-        try: vo2 = float(row[2])
-        except: vo2 = 0.0
-        try: fcr = int(row[3])
-        except: fcr = 0
-        clean_data.append({"name": row[1] if row[1] else row[0], "vo2": vo2, "fcr": fcr})
-    conn.close()
-    return clean_data
-
-def get_training_data_for_patient(paciente):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    if not paciente:
-        conn.close()
-        return []
-    
-    # Obtenemos fecha y calculamos carga. Forzamos conversión a número para evitar errores.
-    c.execute("""
-        SELECT fecha, 
-               CAST(rpe AS FLOAT) * CAST(tiempo_entrenamiento AS FLOAT) as carga 
-        FROM cuestionarios 
-        WHERE paciente = ? 
-        ORDER BY fecha ASC
-    """, (paciente,))
-    
-    data = c.fetchall()
-    conn.close()
-    print(f"--- DB: Consultando datos para {paciente}. Encontrados: {len(data)} registros ---")
-    return data
-
-def guardar_entrenamiento(paciente, duracion, fatiga, rpe, bpm=0):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    fecha = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.execute("""
-        INSERT INTO entrenamientos (paciente, duracion, fatiga, rpe, bpm, fecha_inicio, fecha_fin, validacion_especialista) 
-        VALUES (?, ?, ?, ?, ?, ?, ?, 'Pendiente')
-    """, (paciente, duracion, fatiga, rpe, bpm, fecha, fecha))
-    conn.commit()
-    conn.close()
-
-def save_questionnaire_for_patient(username, paciente, fatiga, suenio, rpe, tiempo_entrenamiento):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    fecha = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    c.execute("""
-        INSERT INTO cuestionarios (paciente, username, fecha, fatiga, suenio, rpe, tiempo_entrenamiento) 
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (paciente, username, fecha, fatiga, suenio, rpe, tiempo_entrenamiento))
-    conn.commit()
-    conn.close()
-    print(f"--- DB: GUARDADO Cuestionario para {paciente} (RPE:{rpe}, Tiempo:{tiempo_entrenamiento}) ---")
-
-def get_nombre_paciente_from_username(username):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT nombre_paciente FROM pacientes WHERE username = ?", (username,))
-    row = c.fetchone()
-    conn.close()
-    # Si no encuentra un nombre oficial, devuelve el username para que no falle
-    return row[0] if row else username 
-
-def get_patient_averages(paciente):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    if not paciente: return {"fatiga": 0, "rpe": 0, "suenio": 0, "carga": 0, "bpm": 0}
-    
-    c.execute("""
-        SELECT AVG(fatiga), AVG(rpe), AVG(suenio), AVG(rpe * tiempo_entrenamiento)
-        FROM cuestionarios WHERE paciente = ?
-    """, (paciente,))
-    row_quest = c.fetchone()
-    
-    c.execute("SELECT AVG(bpm) FROM entrenamientos WHERE paciente = ? AND bpm > 0", (paciente,))
-    row_bpm = c.fetchone()
-    
-    conn.close()
-    
-    fatiga = round(row_quest[0], 1) if row_quest and row_quest[0] else 0
-    rpe = round(row_quest[1], 1) if row_quest and row_quest[1] else 0
-    suenio = round(row_quest[2], 1) if row_quest and row_quest[2] else 0
-    carga = int(row_quest[3]) if row_quest and row_quest[3] else 0
-    bpm = int(row_bpm[0]) if row_bpm and row_bpm[0] else 0
-
-    return {"fatiga": fatiga, "rpe": rpe, "suenio": suenio, "carga": carga, "bpm": bpm}
\ No newline at end of file
+import sqlite3
+import sys
+import datetime
+import json
+from db_pool import fetch_one, fetch_all, transaction
+from migrations import migrate
+import athlete_stats
+import shards
+import workload
+from figure_cache import bump_version, ALL
+from hrv import HRV_COLUMNS
+from metrics import instrument_module
+
+DB_PATH = "database.db"
+# Los corredores que se registran solos quedan con entrenador 'Auto': todos los
+# entrenadores los ven además de los suyos, para que no salga la lista vacía
+UNASSIGNED_COACH = shards.DEFAULT_COACH
+PATIENT_PAGE = 20
+
+def init_db():
+    # El esquema vive en migrations.py; aquí solo se aplican los pasos pendientes
+    migrate(DB_PATH)
+
+def athlete_db(paciente):
+    # Fichero con la actividad del atleta: el shard de su entrenador, o la central sin shards
+    return shards.path_for(DB_PATH, paciente)
+
+def by_shard(athletes):
+    # {ruta: [atletas]} para repartir una consulta por lista de atletas entre shards
+    return shards.group_by_shard(DB_PATH, athletes)
+
+def add_user(username, password, role="entrenador"):
+    try:
+        with transaction(DB_PATH) as c:
+            c.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", (username, password, role))
+            if role == 'paciente':
+                c.execute("SELECT id FROM pacientes WHERE username = ?", (username,))
+                if not c.fetchone():
+                     # Creamos el paciente asegurando que el nombre es el username para evitar confusiones
+                     c.execute("INSERT INTO pacientes (username, nombre_paciente, entrenador_asociado, full_name, equipo, deporte, fcr, vo2) VALUES (?, ?, ?, ?, 'Club', 'Running', 60, 45)", (username, username, UNASSIGNED_COACH, username))
+                     bump_version(c, ALL)
+        return True
+    except sqlite3.IntegrityError: return False
+
+def user_exists(username):
+    res = fetch_one(DB_PATH, "SELECT 1 FROM users WHERE username = ?", (username,))
+    return res is not None
+
+def authenticate_user(username, password):
+    row = fetch_one(DB_PATH, "SELECT role FROM users WHERE username = ? AND password = ?", (username, password))
+    return row[0] if row else None
+
+# Todo lo que necesita un panel al entrar, en una sola consulta: rol, ficha del corredor y,
+# para un entrenador, el tamaño de su plantilla y la primera página del desplegable. SQLite
+# solo evalúa la rama del CASE que toca, así que un corredor no paga las subconsultas. La
+# primera página sale de leer en orden idx_pacientes_entrenador_orden por cada entrenador
+# asociado y mezclar como mucho dos páginas, no de ordenar la plantilla entera.
+BOOTSTRAP_SQL = """
+    SELECT u.role, p.nombre_paciente, p.full_name, p.nacionalidad, p.fcr, p.vo2,
+           CASE WHEN u.role = 'entrenador' THEN
+               (SELECT COUNT(*) FROM pacientes WHERE entrenador_asociado IN (?, ?)) END,
+           CASE WHEN u.role = 'entrenador' THEN
+               (SELECT json_group_array(json_array(nombre_paciente, equipo, full_name)) FROM
+                   (SELECT * FROM (SELECT nombre_paciente, equipo, full_name FROM pacientes WHERE entrenador_asociado = ? ORDER BY full_name, nombre_paciente LIMIT ?)
+                    UNION
+                    SELECT * FROM (SELECT nombre_paciente, equipo, full_name FROM pacientes WHERE entrenador_asociado = ? ORDER BY full_name, nombre_paciente LIMIT ?)
+                    ORDER BY 3, 1 LIMIT ?)) END
+    FROM users u LEFT JOIN pacientes p ON p.username = u.username
+    WHERE u.username = ? AND u.password = ?
+    LIMIT 1
+"""
+
+def bootstrap_session(username, password):
+    # Contenido del Store "session" tras el login, o None si las credenciales no valen
+    row = fetch_one(DB_PATH, BOOTSTRAP_SQL, (username, UNASSIGNED_COACH, username, PATIENT_PAGE, UNASSIGNED_COACH, PATIENT_PAGE, PATIENT_PAGE, username, password))
+    if not row: return None
+    session = {"user": username, "role": row[0]}
+    if row[0] == "paciente":
+        # Mismo criterio que get_nombre_paciente_from_username / get_patient_info
+        session["paciente"] = row[1] or username
+        session["perfil"] = {"full_name": row[2], "nacionalidad": row[3], "fcr": row[4], "vo2": row[5]} if row[1] else {}
+    elif row[6] is not None:
+        session["plantilla"] = {"atletas": row[6], "opciones": [_patient_option(r) for r in json.loads(row[7])]}
+    return session
+
+def coach_scope(username, role):
+    # Entrenadores asociados visibles para el usuario; None = sin filtro
+    return [username, UNASSIGNED_COACH] if role == "entrenador" else None
+
+def get_patients_by_user(username, role, search="", limit=PATIENT_PAGE, offset=0):
+    # Búsqueda por prefijo (nombre completo o identificador) sobre índices de expresión;
+    # el desplegable solo recibe una página de resultados
+    scope = coach_scope(username, role)
+    # lower() de SQLite solo pasa a minúsculas ASCII: se hace lo mismo aquí
+    prefix = "".join(ch.lower() if ch.isascii() else ch for ch in (search or "").strip())
+    branches, params = [], []
+    # Sin texto basta con una rama; con texto, una por columna indexada
+    for col in (("full_name", "nombre_paciente") if prefix else (None,)):
+        cond = [f"entrenador_asociado IN ({', '.join('?' for _ in scope)})"] if scope else []
+        params += scope or []
+        if col:
+            cond += [f"lower({col}) >= ?", f"lower({col}) < ?"]
+            params += [prefix, prefix + "\U0010ffff"]
+        branches.append(f"SELECT nombre_paciente, equipo, full_name FROM pacientes {'WHERE ' + ' AND '.join(cond) if cond else ''}")
+    rows = fetch_all(DB_PATH, f"{' UNION '.join(branches)} ORDER BY 3, 1 LIMIT ? OFFSET ?", (*params, limit, offset))
+    return [_patient_option(r) for r in rows]
+
+def _patient_option(r):
+    # "search" es el texto que el desplegable usa para filtrar en el cliente: incluye el identificador
+    return {"label": f"{r[2] if r[2] else r[0]} ({r[1]})", "value": r[0], "search": f"{r[2] or ''} {r[0]}"}
+
+def get_roster(username, role):
+    # Nombres de todos los atletas visibles (para cálculos de plantilla, no para el desplegable)
+    scope = coach_scope(username, role)
+    if not scope: return [r[0] for r in fetch_all(DB_PATH, "SELECT nombre_paciente FROM pacientes")]
+    return [r[0] for r in fetch_all(DB_PATH, f"SELECT nombre_paciente FROM pacientes WHERE entrenador_asociado IN ({', '.join('?' for _ in scope)})", scope)]
+
+def create_patient(entrenador_username):
+    with transaction(DB_PATH) as c:
+        c.execute("SELECT count(*) FROM pacientes WHERE entrenador_asociado = ?", (entrenador_username,))
+        count = c.fetchone()[0] + 1
+        nombre_paciente = f"Atleta_{count}_{entrenador_username}"
+        while True:
+            c.execute("SELECT id FROM pacientes WHERE nombre_paciente = ?", (nombre_paciente,))
+            if not c.fetchone(): break
+            nombre_paciente += "_X"
+        c.execute("INSERT INTO pacientes (username, nombre_paciente, entrenador_asociado, full_name, edad, peso, altura, equipo, deporte, fcr, vo2) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 60, 45)", (nombre_paciente, nombre_paciente, entrenador_username, "Nuevo Atleta", 0, 0, 0, "Sin Equipo", "General"))
+        bump_version(c, ALL)
+    return nombre_paciente
+
+def ensure_patient(username):
+    # Alta mínima del paciente cuando un corredor guarda el perfil sin ficha previa
+    with transaction(DB_PATH) as c:
+        c.execute("INSERT INTO pacientes (username, nombre_paciente, entrenador_asociado, full_name, equipo, deporte, fcr, vo2) VALUES (?, ?, ?, ?, 'Club', 'Running', 60, 45)", (username, username, UNASSIGNED_COACH, username))
+        bump_version(c, ALL)
+    return username
+
+def get_patient_info(paciente):
+    row = fetch_one(DB_PATH, "SELECT full_name, edad, peso, altura, equipo, deporte, posicion, nacionalidad, fcr, vo2 FROM pacientes WHERE nombre_paciente = ?", (paciente,))
+    if row: return {"full_name": row[0], "edad": row[1], "peso": row[2], "altura": row[3], "equipo": row[4], "deporte": row[5], "posicion": row[6], "nacionalidad": row[7], "fcr": row[8], "vo2": row[9]}
+    return {}
+
+def save_patient_info(nombre_paciente, full_name, edad, peso, altura, equipo, deporte, posicion, nacionalidad, fcr, vo2):
+    with transaction(DB_PATH) as c:
+        c.execute("UPDATE pacientes SET full_name=?, edad=?, peso=?, altura=?, equipo=?, deporte=?, posicion=?, nacionalidad=?, fcr=?, vo2=? WHERE nombre_paciente=?", (full_name, edad, peso, altura, equipo, deporte, posicion, nacionalidad, fcr, vo2, nombre_paciente))
+        bump_version(c, nombre_paciente, ALL)
+    if shards.enabled():
+        # Las figuras del atleta miran la versión de su shard (comparativa con su equipo)
+        with transaction(athlete_db(nombre_paciente)) as c: bump_version(c, nombre_paciente)
+    print(f"--- DB: Perfil actualizado para {nombre_paciente} ---")
+
+def get_metrics_for_comparison(selected_patients=None):
+    query = "SELECT nombre_paciente, full_name, vo2, fcr FROM pacientes"
+    if selected_patients:
+        placeholders = ','.join('?' for _ in selected_patients)
+        query += f" WHERE nombre_paciente IN ({placeholders})"
+        rows = fetch_all(DB_PATH, query, tuple(selected_patients))
+    else: rows = fetch_all(DB_PATH, query)
+    clean_data = []
+    for row in rows:
+        try: vo2 = float(row[2])
+        except: vo2 = 0.0
+        try: fcr = int(row[3])
+        except: fcr = 0
+        clean_data.append({"name": row[1] if row[1] else row[0], "vo2": vo2, "fcr": fcr})
+    return clean_data
+
+def get_training_data_for_patient(paciente):
+    if not paciente:
+        return []
+
+    # Obtenemos fecha y calculamos carga. Forzamos conversión a número para evitar errores.
+    data = fetch_all(athlete_db(paciente), """
+        SELECT fecha,
+               CAST(rpe AS FLOAT) * CAST(tiempo_entrenamiento AS FLOAT) as carga
+        FROM cuestionarios
+        WHERE paciente = ?
+        ORDER BY fecha ASC
+    """, (paciente,))
+
+    print(f"--- DB: Consultando datos para {paciente}. Encontrados: {len(data)} registros ---")
+    return data
+
+# Serie de carga por rango de fechas, agrupada en SQL sobre carga_diaria (ya sumada
+# por día) para que el número de puntos no dependa de cuánto histórico haya
+LOAD_MAX_POINTS = 180
+LOAD_BUCKETS = {
+    "dia": "dia",
+    "semana": "date(dia, 'weekday 0', '-6 days')",   # lunes de la semana
+    "mes": "substr(dia, 1, 7) || '-01'",
+}
+
+def load_bucket_for(start, end):
+    days = (datetime.date.fromisoformat(end) - datetime.date.fromisoformat(start)).days + 1
+    if days <= LOAD_MAX_POINTS: return "dia"
+    return "semana" if days / 7 <= LOAD_MAX_POINTS else "mes"
+
+def get_training_load(paciente, start=None, end=None, bucket=None):
+    # (agrupación, [(inicio del tramo, carga total, sesiones)]); sin fechas = todo el histórico
+    if not paciente: return "dia", []
+    if start is None or end is None:
+        first, last = fetch_one(athlete_db(paciente), "SELECT MIN(dia), MAX(dia) FROM carga_diaria WHERE paciente = ?", (paciente,))
+        if first is None: return "dia", []
+        start, end = start or first, end or max(last, datetime.date.today().isoformat())
+    bucket = bucket or load_bucket_for(start, end)
+    key = LOAD_BUCKETS[bucket]
+    rows = fetch_all(athlete_db(paciente), f"""
+        SELECT {key} AS tramo, TOTAL(carga), SUM(sesiones)
+        FROM carga_diaria WHERE paciente = ? AND dia BETWEEN ? AND ?
+        GROUP BY tramo ORDER BY tramo
+    """, (paciente, start, end))
+    return bucket, rows
+
+def count_sessions(paciente):
+    row = fetch_one(athlete_db(paciente), "SELECT COUNT(*) FROM cuestionarios WHERE paciente = ?", (paciente,))
+    return row[0] if row else 0
+
+def guardar_entrenamiento(paciente, duracion, fatiga, rpe, bpm=0):
+    fecha = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with transaction(athlete_db(paciente)) as c:
+        c.execute("""
+            INSERT INTO entrenamientos (paciente, duracion, fatiga, rpe, bpm, fecha_inicio, fecha_fin, validacion_especialista)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'Pendiente')
+        """, (paciente, duracion, fatiga, rpe, bpm, fecha, fecha))
+        entrenamiento_id = c.lastrowid
+        athlete_stats.apply_training(c, entrenamiento_id)
+        bump_version(c, paciente)
+    return entrenamiento_id
+
+def get_training_hrv(entrenamiento_id, paciente=None):
+    # Con shards los id de entrenamiento son por entrenador: hace falta saber de quién es
+    row = fetch_one(athlete_db(paciente) if paciente else DB_PATH, f"SELECT {', '.join(HRV_COLUMNS)} FROM hrv_metricas WHERE entrenamiento_id = ?", (entrenamiento_id,))
+    return dict(zip(HRV_COLUMNS, row)) if row else {}
+
+def set_training_bpm(c, entrenamiento_id, bpm):
+    # Para rellenar el bpm cuando termina el análisis en segundo plano (dentro de su transacción):
+    # se descuenta la fila de athlete_stats, se actualiza y se vuelve a sumar
+    athlete_stats.apply_training(c, entrenamiento_id, "-")
+    c.execute("UPDATE entrenamientos SET bpm = ? WHERE id = ?", (bpm, entrenamiento_id))
+    athlete_stats.apply_training(c, entrenamiento_id)
+    row = c.execute("SELECT paciente FROM entrenamientos WHERE id = ?", (entrenamiento_id,)).fetchone()
+    if row: bump_version(c, row[0])
+
+def save_questionnaire_for_patient(username, paciente, fatiga, suenio, rpe, tiempo_entrenamiento):
+    fecha = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with transaction(athlete_db(paciente)) as c:
+        c.execute("""
+            INSERT INTO cuestionarios (paciente, username, fecha, fatiga, suenio, rpe, tiempo_entrenamiento)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (paciente, username, fecha, fatiga, suenio, rpe, tiempo_entrenamiento))
+        athlete_stats.apply_questionnaire(c, c.lastrowid)
+        workload.apply_questionnaire(c, c.lastrowid)
+        bump_version(c, paciente)
+    print(f"--- DB: GUARDADO Cuestionario para {paciente} (RPE:{rpe}, Tiempo:{tiempo_entrenamiento}) ---")
+
+def get_nombre_paciente_from_username(username):
+    row = fetch_one(DB_PATH, "SELECT nombre_paciente FROM pacientes WHERE username = ?", (username,))
+    # Si no encuentra un nombre oficial, devuelve el username para que no falle
+    return row[0] if row else username
+
+def get_patient_averages(paciente):
+    if not paciente: return {"fatiga": 0, "rpe": 0, "suenio": 0, "carga": 0, "bpm": 0}
+
+    # Lectura O(1) de la tabla materializada en lugar de AVG sobre todo el histórico
+    st = athlete_stats.get_stats(athlete_db(paciente), paciente)
+    if not st: return {"fatiga": 0, "rpe": 0, "suenio": 0, "carga": 0, "bpm": 0}
+    avg = lambda col: st[f"sum_{col}"] / st[f"n_{col}"] if st[f"n_{col}"] else None
+
+    fatiga = round(avg("fatiga"), 1) if avg("fatiga") else 0
+    rpe = round(avg("rpe"), 1) if avg("rpe") else 0
+    suenio = round(avg("suenio"), 1) if avg("suenio") else 0
+    carga = int(avg("carga")) if avg("carga") else 0
+    bpm = int(avg("bpm")) if avg("bpm") else 0
+
+    return {"fatiga": fatiga, "rpe": rpe, "suenio": suenio, "carga": carga, "bpm": bpm}
+
+
+# Latencia y filas de cada función pública de este módulo en /metrics
+instrument_module(sys.modules[__name__], "db", skip=("coach_scope", "load_bucket_for", "athlete_db", "by_shard"))
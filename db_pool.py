@@ -0,0 +1,147 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Ajustes de conexión compartidos por todas las funciones de db.py
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 8))
+BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+# Cada conexión guarda sus sentencias preparadas (clave = texto SQL), así que al
+# reutilizar conexiones también reutilizamos los statements ya compilados.
+STATEMENT_CACHE = 256
+
+
+def _configure(conn):
+    conn.execute("PRAGMA journal_mode=WAL")
+    # En WAL, NORMAL es seguro ante caídas de la app (solo se pierde lo último si cae el SO)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-8000")
+
+
+class ConnectionPool:
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _connect(self):
+        # isolation_level=None: autocommit; las escrituras abren BEGIN IMMEDIATE explícito
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                               check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        _configure(conn)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get(timeout=BUSY_TIMEOUT_MS / 1000)
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path):
+    # Un pool por fichero y por proceso: los workers de gunicorn hacen fork y no
+    # pueden heredar conexiones SQLite abiertas del proceso padre.
+    pid = os.getpid()
+    pool = _pools.get(path)
+    if pool is not None and pool._pid == pid:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None or pool._pid != pid:
+            pool = ConnectionPool(path)
+            _pools[path] = pool
+        return pool
+
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            if pool._pid == os.getpid():
+                pool.close()
+        _pools.clear()
+
+
+def fetch_one(path, sql, params=()):
+    with get_pool(path).connection() as conn:
+        return conn.execute(sql, params).fetchone()
+
+
+def fetch_all(path, sql, params=()):
+    with get_pool(path).connection() as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def iter_batches(path, sql, params=(), size=10000):
+    # Lectura por bloques para volcados grandes: una sola transacción de lectura
+    # (instantánea coherente en WAL) sin cargar el resultado entero en memoria
+    with get_pool(path).connection() as conn:
+        conn.execute("BEGIN")
+        try:
+            cur = conn.execute(sql, params)
+            while True:
+                rows = cur.fetchmany(size)
+                if not rows: break
+                yield rows
+        finally:
+            conn.rollback()
+
+
+@contextmanager
+def transaction(path):
+    # BEGIN IMMEDIATE toma el lock de escritura al principio: así busy_timeout
+    # actúa y evitamos el "database is locked" al promocionar un lock de lectura.
+    with get_pool(path).connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn.cursor()
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def execute(path, sql, params=()):
+    with transaction(path) as c:
+        c.execute(sql, params)
+        return c.rowcount
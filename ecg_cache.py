@@ -0,0 +1,131 @@
+import hashlib
+import os
+import threading
+import time
+import numpy as np
+from db_pool import fetch_one, transaction
+from ecg_downsample import DEFAULT_MAX_POINTS
+import sensors
+
+# Caché en disco de análisis de ECG direccionada por contenido: la clave es el hash
+# del fichero más los parámetros del detector, así que reenviar la misma grabación no
+# vuelve a detectar picos ni a diezmar la traza. Es un SQLite aparte en WAL, compartido
+# sin más coordinación por los workers de gunicorn y los procesos del pool de trabajos.
+CACHE_PATH = os.environ.get("ECG_CACHE_PATH", os.path.join("data", "ecg_cache.db"))
+MAX_BYTES = int(float(os.environ.get("ECG_CACHE_MB", 64)) * 2**20)
+# Subirla invalida todo lo guardado (cambio de formato o del algoritmo de detección)
+VERSION = 1
+HASH_BLOCK = 2**20
+# Un acierto solo reescribe la fecha de uso si es más vieja que esto: leer no toma el lock de escritura
+TOUCH_SECONDS = 60
+
+CREATE_SQL = [
+    "CREATE TABLE IF NOT EXISTS resultados (clave TEXT PRIMARY KEY NOT NULL, fs REAL, bpm REAL, "
+    "picos BLOB, t BLOB, y BLOB, bytes INTEGER, usado REAL)",
+    "CREATE INDEX IF NOT EXISTS idx_resultados_usado ON resultados (usado)",
+    # Hash ya calculado por fichero: el contenido solo se relee si cambian tamaño o mtime
+    "CREATE TABLE IF NOT EXISTS huellas (ruta TEXT PRIMARY KEY NOT NULL, tamano INTEGER, mtime_ns INTEGER, hash TEXT)",
+]
+
+_ready = set()
+_lock = threading.Lock()
+_counts = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _db():
+    path = CACHE_PATH
+    if (path, os.getpid()) not in _ready:
+        with _lock:
+            if (path, os.getpid()) not in _ready:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                with transaction(path) as c:
+                    for sql in CREATE_SQL: c.execute(sql)
+                _ready.add((path, os.getpid()))
+    return path
+
+
+def file_hash(path):
+    st = os.stat(path)
+    ruta = os.path.abspath(path)
+    row = fetch_one(_db(), "SELECT hash FROM huellas WHERE ruta = ? AND tamano = ? AND mtime_ns = ?", (ruta, st.st_size, st.st_mtime_ns))
+    if row: return row[0]
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""): h.update(block)
+    digest = h.hexdigest()
+    with transaction(_db()) as c:
+        c.execute("INSERT INTO huellas (ruta, tamano, mtime_ns, hash) VALUES (?, ?, ?, ?) ON CONFLICT(ruta) DO UPDATE SET "
+                  "tamano = excluded.tamano, mtime_ns = excluded.mtime_ns, hash = excluded.hash", (ruta, st.st_size, st.st_mtime_ns, digest))
+    return digest
+
+
+def key_for(path, fs=None, distance_s=None, k=None, max_points=DEFAULT_MAX_POINTS, window_s=None, overlap_s=None, chunk_s=None):
+    # En un .ecg la fs ya va en la cabecera (y por tanto en el hash); se añade igualmente.
+    # Ventana, solape y trozo del detector por bloques también cambian los picos.
+    p = sensors.detector_params(distance_s, k, window_s, overlap_s, chunk_s)
+    return f"{file_hash(path)}:v{VERSION}:fs{fs}:d{p['distance_s']}:k{p['k']}:p{max_points}:w{p['window_s']}:o{p['overlap_s']}:c{p['chunk_s']}"
+
+
+def get(key):
+    # {"fs", "bpm", "peaks", "t", "y"} o None
+    row = fetch_one(_db(), "SELECT fs, bpm, picos, t, y, usado FROM resultados WHERE clave = ?", (key,))
+    with _lock: _counts["hits" if row else "misses"] += 1
+    if row is None: return None
+    now = time.time()
+    if now - row[5] > TOUCH_SECONDS:
+        with transaction(_db()) as c: c.execute("UPDATE resultados SET usado = ? WHERE clave = ?", (now, key))
+    return {"fs": row[0], "bpm": row[1], "peaks": np.frombuffer(row[2], dtype=np.int64),
+            "t": np.frombuffer(row[3], dtype=np.float64), "y": np.frombuffer(row[4], dtype=np.float64)}
+
+
+def put(key, fs, bpm, peaks, t, y, max_bytes=None):
+    entry = {"fs": fs, "bpm": float(bpm), "peaks": np.asarray(peaks, dtype=np.int64),
+             "t": np.asarray(t, dtype=np.float64), "y": np.asarray(y, dtype=np.float64)}
+    blobs = [entry[name].tobytes() for name in ("peaks", "t", "y")]
+    size = sum(len(b) for b in blobs)
+    max_bytes = MAX_BYTES if max_bytes is None else max_bytes
+    if size > max_bytes: return entry
+    with transaction(_db()) as c:
+        c.execute("INSERT OR REPLACE INTO resultados (clave, fs, bpm, picos, t, y, bytes, usado) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                  (key, fs, entry["bpm"], *blobs, size, time.time()))
+        evicted = _evict(c, max_bytes)
+    with _lock: _counts["evictions"] += evicted
+    return entry
+
+
+def _evict(c, max_bytes):
+    # LRU aproximado por fecha de uso, dentro de la transacción que acaba de escribir:
+    # dos workers nunca desalojan a la vez ni dejan el total por encima del límite
+    total = c.execute("SELECT COALESCE(SUM(bytes), 0) FROM resultados").fetchone()[0]
+    if total <= max_bytes: return 0
+    victims = []
+    for clave, size in c.execute("SELECT clave, bytes FROM resultados ORDER BY usado").fetchall():
+        if total <= max_bytes: break
+        victims.append((clave,))
+        total -= size
+    c.executemany("DELETE FROM resultados WHERE clave = ?", victims)
+    return len(victims)
+
+
+def cached_analysis(path, fs, analyze, **params):
+    # analyze() -> (peaks, bpm, t, y); solo se llama si la grabación no está en caché
+    key = key_for(path, fs, **params)
+    entry = get(key)
+    if entry is None:
+        peaks, bpm, t, y = analyze()
+        entry = put(key, fs, bpm, peaks, t, y)
+    return entry
+
+
+def clear():
+    with transaction(_db()) as c:
+        c.execute("DELETE FROM resultados")
+        c.execute("DELETE FROM huellas")
+
+
+def stats():
+    row = fetch_one(_db(), "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM resultados")
+    with _lock: counts = dict(_counts)
+    total = counts["hits"] + counts["misses"]
+    return {"size": row[0], "bytes": row[1], "max_bytes": MAX_BYTES, **counts,
+            "hit_ratio": round(counts["hits"] / total, 3) if total else 0.0}
@@ -0,0 +1,95 @@
+import os
+import numpy as np
+from ecg_store import open_recording, read_header
+
+# Pirámide de envolventes min/max por grabación .ecg. El nivel k agrupa BASE**k
+# muestras por cubo y guarda su mínimo y máximo, así los picos R nunca se pierden
+# al diezmar. Se calcula una vez por grabación y se guarda junto al .ecg, un .npy
+# por nivel con filas (mínimo, máximo): al hacer zoom se abre con mmap y solo se leen
+# los cubos del tramo pedido, así la latencia no crece con la duración de la grabación.
+PYRAMID_SUFFIX = ".pyr{level}.npy"
+BASE = 4
+MIN_BUCKETS = 500
+DEFAULT_MAX_POINTS = 3000
+MAX_LEVEL = 10
+BLOCK = BASE ** MAX_LEVEL  # muestras por bloque al construir (múltiplo de todos los tamaños de cubo)
+
+
+def pyramid_path(ecg_path, level):
+    return ecg_path + PYRAMID_SUFFIX.format(level=level)
+
+
+def _n_levels(n_samples):
+    # Niveles hasta que el más alto tenga como mucho MIN_BUCKETS cubos: la grabación
+    # entera cabe en 2 * MIN_BUCKETS puntos, dentro de cualquier presupuesto razonable
+    levels = 0
+    while levels < MAX_LEVEL and n_samples // (BASE ** levels) > MIN_BUCKETS:
+        levels += 1
+    return levels
+
+
+def build_pyramid(ecg_path):
+    # Recorre el memmap por bloques: memoria acotada aunque la grabación sea enorme
+    meta, data = open_recording(ecg_path)
+    n = len(data)
+    levels = _n_levels(n)
+    mins = {k: [] for k in range(1, levels + 1)}
+    maxs = {k: [] for k in range(1, levels + 1)}
+    for i in range(0, n, BLOCK):
+        block = np.asarray(data[i:i + BLOCK], dtype=np.float32) * np.float32(meta["scale"])
+        lo = hi = block
+        for k in range(1, levels + 1):
+            # Cada nivel sale del anterior: min de mins y max de maxs en grupos de BASE
+            m = len(lo) // BASE * BASE
+            tail_lo, tail_hi = lo[m:], hi[m:]
+            lo = lo[:m].reshape(-1, BASE).min(axis=1)
+            hi = hi[:m].reshape(-1, BASE).max(axis=1)
+            if len(tail_lo):  # último cubo incompleto (solo en el bloque final)
+                lo = np.append(lo, tail_lo.min())
+                hi = np.append(hi, tail_hi.max())
+            mins[k].append(lo)
+            maxs[k].append(hi)
+    # El nivel más alto se escribe el último: si existe y es reciente, la pirámide está completa
+    for k in range(1, levels + 1):
+        tmp_path = pyramid_path(ecg_path, k) + ".tmp.npy"
+        np.save(tmp_path, np.column_stack([np.concatenate(mins[k]), np.concatenate(maxs[k])]))
+        os.replace(tmp_path, pyramid_path(ecg_path, k))
+    return levels
+
+
+def ensure_pyramid(ecg_path):
+    # Número de niveles (depende solo de la longitud); los construye si faltan o son viejos
+    levels = _n_levels(read_header(ecg_path)["n_samples"])
+    if levels:
+        path = pyramid_path(ecg_path, levels)
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(ecg_path):
+            build_pyramid(ecg_path)
+    return levels
+
+
+def get_trace(ecg_path, t_start=None, t_end=None, max_points=DEFAULT_MAX_POINTS):
+    # Devuelve (t, y) del tramo pedido con como mucho ~max_points puntos, usando
+    # el nivel más fino de la pirámide que cabe en el presupuesto
+    meta = read_header(ecg_path)
+    fs, n = meta["fs"], meta["n_samples"]
+    i0 = 0 if t_start is None else min(n, max(0, int(t_start * fs)))
+    i1 = n if t_end is None else min(n, max(i0, int(np.ceil(t_end * fs))))
+    levels = ensure_pyramid(ecg_path) if i1 - i0 > max_points else 0
+    if levels == 0:
+        _, data = open_recording(ecg_path)
+        step = max(1, -(-(i1 - i0) // max_points))
+        return np.arange(i0, i1, step) / fs, np.asarray(data[i0:i1:step], dtype=float) * meta["scale"]
+
+    level = levels
+    for k in range(1, levels + 1):
+        if 2 * (i1 - i0) / BASE ** k <= max_points:
+            level = k
+            break
+    size = BASE ** level
+    b0, b1 = i0 // size, -(-i1 // size)
+    buckets = np.load(pyramid_path(ecg_path, level), mmap_mode="r")[b0:b1]
+    # Cada cubo se dibuja como dos puntos (mínimo y máximo) dentro de su intervalo
+    t = (np.arange(b0, b0 + len(buckets)) * size) / fs
+    t = np.column_stack([t, t + size / (2 * fs)]).ravel()
+    y = np.asarray(buckets, dtype=float).ravel()
+    return t, y
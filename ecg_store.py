@@ -0,0 +1,120 @@
+import datetime
+import json
+import os
+import sys
+import numpy as np
+
+# Formato binario .ecg: cabecera fija de 512 bytes (magic + JSON con metadatos,
+# rellenado con espacios) seguida de las muestras como array tipado little-endian.
+# Con cabecera fija los datos empiezan siempre en el mismo offset y se pueden
+# abrir con numpy.memmap sin leer el fichero entero.
+ECG_EXT = ".ecg"
+MAGIC = b"ECGB"
+HEADER_SIZE = 512
+FORMAT_VERSION = 1
+DTYPES = {"float32": "<f4", "int16": "<i2"}
+
+
+def _write_header(f, meta):
+    body = json.dumps(meta).encode()
+    if len(MAGIC) + len(body) > HEADER_SIZE:
+        raise ValueError("Metadatos demasiado largos para la cabecera")
+    f.seek(0)
+    f.write(MAGIC + body.ljust(HEADER_SIZE - len(MAGIC), b" "))
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if raw[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} no es un fichero {ECG_EXT}")
+    return json.loads(raw[len(MAGIC):].decode())
+
+
+def _new_meta(fs, athlete, start_time, dtype, scale):
+    if dtype not in DTYPES:
+        raise ValueError(f"dtype no soportado: {dtype}")
+    if isinstance(start_time, datetime.datetime):
+        start_time = start_time.isoformat(timespec="seconds")
+    return {"version": FORMAT_VERSION, "dtype": dtype, "fs": fs, "n_samples": 0, "scale": scale,
+            "athlete": athlete, "start_time": start_time}
+
+
+def write_recording(out_path, samples, fs=250, athlete=None, start_time=None, dtype="float32"):
+    # Para capturas en vivo que ya están en memoria
+    samples = np.asarray(samples, dtype=float)
+    scale = 1.0
+    if dtype == "int16":
+        peak = float(np.max(np.abs(samples))) if len(samples) else 0.0
+        scale = peak / 32767 if peak > 0 else 1.0
+        samples = np.round(samples / scale)
+    meta = _new_meta(fs, athlete, start_time, dtype, scale)
+    meta["n_samples"] = len(samples)
+    with open(out_path, "wb") as f:
+        _write_header(f, meta)
+        f.write(samples.astype(DTYPES[dtype]).tobytes())
+    return meta
+
+
+def convert_csv(csv_path, out_path=None, fs=250, athlete=None, start_time=None, dtype="float32", chunk_seconds=60):
+    # Conversión por bloques: la memoria no depende de la longitud del CSV.
+    # En int16 hace una primera pasada para fijar la escala (máximo absoluto).
+    from sensors import read_ecg_chunks
+    out_path = out_path or os.path.splitext(csv_path)[0] + ECG_EXT
+    chunk = int(chunk_seconds * fs)
+    scale = 1.0
+    if dtype == "int16":
+        peak = max((float(np.max(np.abs(c))) for c in read_ecg_chunks(csv_path, chunk) if len(c)), default=0.0)
+        scale = peak / 32767 if peak > 0 else 1.0
+    if start_time is None:
+        start_time = datetime.datetime.fromtimestamp(os.path.getmtime(csv_path))
+    meta = _new_meta(fs, athlete, start_time, dtype, scale)
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        _write_header(f, meta)
+        for c in read_ecg_chunks(csv_path, chunk):
+            if dtype == "int16": c = np.round(c / scale)
+            f.write(c.astype(DTYPES[dtype]).tobytes())
+            meta["n_samples"] += len(c)
+        _write_header(f, meta)
+    # Renombrado atómico: otro worker nunca ve un .ecg a medio escribir
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def ensure_binary(csv_path, **kwargs):
+    # Devuelve la ruta .ecg, convirtiendo solo si falta o el CSV es más nuevo
+    out_path = os.path.splitext(csv_path)[0] + ECG_EXT
+    if not os.path.exists(out_path) or os.path.getmtime(out_path) < os.path.getmtime(csv_path):
+        convert_csv(csv_path, out_path, **kwargs)
+    return out_path
+
+
+def open_recording(path):
+    # (metadatos, memmap de solo lectura). Las muestras int16 se deben multiplicar por meta["scale"].
+    meta = read_header(path)
+    if meta["n_samples"] == 0:
+        return meta, np.empty(0, dtype=DTYPES[meta["dtype"]])
+    data = np.memmap(path, dtype=DTYPES[meta["dtype"]], mode="r", offset=HEADER_SIZE, shape=(meta["n_samples"],))
+    return meta, data
+
+
+def read_window(path, t_start=0.0, t_end=None):
+    # Solo se leen del disco las páginas del tramo pedido
+    meta, data = open_recording(path)
+    fs = meta["fs"]
+    i0 = max(0, int(t_start * fs))
+    i1 = len(data) if t_end is None else min(len(data), int(t_end * fs))
+    window = np.asarray(data[i0:i1], dtype=float)
+    if meta["dtype"] == "int16": window *= meta["scale"]
+    return np.arange(i0, i0 + len(window)) / fs, window
+
+
+if __name__ == "__main__":
+    # python ecg_store.py data/*.csv [--int16]
+    dtype = "int16" if "--int16" in sys.argv else "float32"
+    for csv_path in [a for a in sys.argv[1:] if not a.startswith("--")]:
+        out = convert_csv(csv_path, dtype=dtype)
+        meta = read_header(out)
+        print(f"✅ {csv_path} -> {out} ({meta['n_samples']} muestras, {os.path.getsize(out)} bytes)")
@@ -0,0 +1,63 @@
+import base64
+import json
+import numpy as np
+import plotly.io as pio
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Serialización compacta de figuras para las respuestas de Dash: los arrays numéricos de
+# las trazas viajan como binario base64 ({"dtype", "bdata"}, que Plotly.js decodifica a
+# TypedArray) en lugar de listas de floats, y el JSON lo escribe orjson si está instalado.
+# Las figuras se devuelven como dict: un go.Figure dentro de la respuesta obliga a
+# to_json_plotly a recorrer todo el árbol con su limpieza genérica, mucho más lenta.
+MIN_TYPED = 16   # por debajo, la lista de texto ocupa lo mismo o menos que el base64
+_INT_DTYPES = [np.int8, np.uint8, np.int16, np.uint16, np.int32, np.uint32]
+
+
+def configure():
+    # Dash serializa todas sus respuestas con plotly.io.json.to_json_plotly: su motor es este
+    pio.json.config.default_engine = "orjson" if orjson else "json"
+
+
+def dumps(obj):
+    return pio.json.to_json_plotly(obj)
+
+
+def loads(text):
+    return orjson.loads(text) if orjson else json.loads(text)
+
+
+def typed_array(values):
+    arr = np.asarray(values)
+    if arr.dtype.kind in "iu":
+        # Plotly.js no admite enteros de 64 bits: el tipo más pequeño en el que cabe
+        lo, hi = (arr.min(), arr.max()) if arr.size else (0, 0)
+        arr = arr.astype(next((t for t in _INT_DTYPES if np.iinfo(t).min <= lo and hi <= np.iinfo(t).max), np.float64))
+    elif arr.dtype != np.float32:
+        arr = arr.astype(np.float64)
+    arr = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<"))
+    return {"dtype": arr.dtype.str[1:], "bdata": base64.b64encode(arr.tobytes()).decode()}
+
+
+def _is_numeric(values):
+    return len(values) >= MIN_TYPED and all(type(v) in (int, float) for v in values)
+
+
+def _compact(value):
+    if isinstance(value, dict): return {k: _compact(v) for k, v in value.items()}
+    if isinstance(value, np.ndarray):
+        # Fechas/textos quedan como array de objetos, que orjson no serializa sin la limpieza lenta
+        return typed_array(value) if value.dtype.kind in "iuf" and value.ndim == 1 else value.tolist()
+    if isinstance(value, (list, tuple)) and _is_numeric(value): return typed_array(value)
+    return value
+
+
+def figure_dict(fig):
+    # go.Figure -> dict listo para dcc.Graph. Solo se tocan las trazas: en el layout hay
+    # atributos (rangos, colorscales) que Plotly.js no acepta como array tipado.
+    d = fig.to_plotly_json()
+    d["data"] = [_compact(trace) for trace in d["data"]]
+    return d
@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import OrderedDict
+from db_pool import fetch_all
+from fig_json import dumps, figure_dict, loads
+from metrics import timed
+
+# Caché LRU de figuras serializadas (JSON de Plotly) por atleta o grupo de atletas.
+MAX_ENTRIES = int(os.environ.get("FIGURE_CACHE_SIZE", 256))
+# Pseudo-atleta que representa "toda la plantilla" (altas nuevas, comparativas sin filtro)
+ALL = "*"
+
+# Cada escritura sube la versión del atleta en la BD dentro de su transacción. La versión
+# forma parte de la clave, así que los demás workers de gunicorn dejan de ver la entrada
+# vieja aunque su invalidación local no les llegue.
+CREATE_SQL = "CREATE TABLE IF NOT EXISTS cache_versions (paciente TEXT PRIMARY KEY NOT NULL, version INTEGER DEFAULT 0)"
+
+
+def bump_version(c, *athletes):
+    for paciente in athletes:
+        c.execute("INSERT INTO cache_versions (paciente, version) VALUES (?, 1) ON CONFLICT(paciente) DO UPDATE SET version = version + 1", (paciente,))
+    for paciente in athletes:
+        _cache.invalidate(paciente)
+
+
+class FigureCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._by_athlete = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value[0]
+
+    def put(self, key, athletes, fig_json):
+        with self._lock:
+            self._entries[key] = (fig_json, athletes)
+            self._entries.move_to_end(key)
+            for paciente in athletes:
+                self._by_athlete.setdefault(paciente, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._forget(old_key)
+                self.evictions += 1
+
+    def _forget(self, key):
+        for paciente in key[1]:
+            keys = self._by_athlete.get(paciente[0])
+            if keys is not None:
+                keys.discard(key)
+                if not keys: del self._by_athlete[paciente[0]]
+
+    def invalidate(self, paciente):
+        with self._lock:
+            for key in list(self._by_athlete.get(paciente, ())):
+                if self._entries.pop(key, None) is not None:
+                    self._forget(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_athlete.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"size": len(self._entries), "max_entries": self.max_entries,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "invalidations": self.invalidations, "hit_ratio": round(self.hits / total, 3) if total else 0.0}
+
+
+_cache = FigureCache()
+
+
+def _versions(path, athletes):
+    placeholders = ",".join("?" for _ in athletes)
+    found = dict(fetch_all(path, f"SELECT paciente, version FROM cache_versions WHERE paciente IN ({placeholders})", tuple(athletes)))
+    return tuple((p, found.get(p, 0)) for p in athletes)
+
+
+def cached_figure(path, kind, athletes, build):
+    # Devuelve el dict de la figura; build() solo se llama si falta en caché
+    athletes = tuple(sorted(set(athletes)))
+    key = (kind, _versions(path, athletes))
+    fig_json = _cache.get(key)
+    if fig_json is None:
+        # Etapas separadas en /metrics: Plotly construyendo la figura y su serialización
+        stage = kind.split(":")[0]
+        with timed("figure", f"build:{stage}"): fig = build()
+        with timed("figure", f"json:{stage}"): fig_json = dumps(figure_dict(fig))
+        _cache.put(key, athletes, fig_json)
+    # Copia nueva en cada llamada para que nadie modifique la entrada cacheada
+    return loads(fig_json)
+
+
+def cache_stats():
+    return _cache.stats()
@@ -0,0 +1,76 @@
+import numpy as np
+
+# Analítica de variabilidad (HRV) y zonas de frecuencia cardiaca a partir de los
+# picos R de sensors.detect_peaks. Todo vectorizado con NumPy: una sola pasada por
+# la sesión, sin bucles de Python sobre los latidos.
+
+# Zonas de Karvonen como % de la reserva cardiaca (FCmax - FCR)
+ZONES = [(1, 0.50, 0.60), (2, 0.60, 0.70), (3, 0.70, 0.80), (4, 0.80, 0.90), (5, 0.90, 1.00)]
+DEFAULT_HR_MAX = 190
+# RR fuera de [0.25 s, 2.0 s] (240-30 lpm) se consideran artefactos y se descartan
+RR_MIN, RR_MAX = 0.25, 2.0
+
+
+def hr_max_for_age(edad):
+    # Fórmula clásica 220 - edad; sin edad conocida usamos un valor por defecto
+    try: edad = int(edad)
+    except (TypeError, ValueError): edad = 0
+    return 220 - edad if 0 < edad < 120 else DEFAULT_HR_MAX
+
+
+def karvonen_bounds(fcr, hr_max):
+    # Límites en lpm de las zonas: FCR + pct * (FCmax - FCR)
+    reserve = hr_max - fcr
+    return np.array([fcr + lo * reserve for _, lo, _ in ZONES] + [fcr + ZONES[-1][2] * reserve])
+
+
+def compute_hrv(peaks, fs, fcr=60, hr_max=DEFAULT_HR_MAX):
+    # peaks: índices de muestra de los picos R (ordenados)
+    peaks = np.asarray(peaks, dtype=np.int64)
+    rr = np.diff(peaks) / fs
+    rr = rr[(rr >= RR_MIN) & (rr <= RR_MAX)]
+    empty = {"n_latidos": int(len(peaks)), "rmssd": 0.0, "sdnn": 0.0, "pnn50": 0.0,
+             "hr_media": 0.0, "hr_min": 0.0, "hr_max": 0.0,
+             **{f"zona{z}_s": 0.0 for z, _, _ in ZONES}, "bajo_zonas_s": 0.0}
+    if len(rr) < 2: return empty
+
+    drr = np.diff(rr)
+    hr = 60.0 / rr  # FC instantánea de cada intervalo
+    # Tiempo en zona: cada RR aporta su duración a la zona de su FC instantánea
+    bounds = karvonen_bounds(fcr, hr_max)
+    zone_idx = np.clip(np.digitize(hr, bounds), 0, len(ZONES))  # 0 = por debajo de la zona 1
+    time_in = np.bincount(zone_idx, weights=rr, minlength=len(ZONES) + 1)
+
+    return {
+        "n_latidos": int(len(peaks)),
+        "rmssd": float(np.sqrt(np.mean(drr ** 2)) * 1000),   # ms
+        "sdnn": float(np.std(rr, ddof=1) * 1000),             # ms
+        "pnn50": float(np.mean(np.abs(drr) > 0.05) * 100),     # %
+        "hr_media": float(60.0 / np.mean(rr)),
+        "hr_min": float(hr.min()),
+        "hr_max": float(hr.max()),
+        **{f"zona{z}_s": float(time_in[z]) for z, _, _ in ZONES},
+        "bajo_zonas_s": float(time_in[0]),
+    }
+
+
+def instantaneous_hr(peaks, fs):
+    # (tiempos en s, FC instantánea en lpm) para graficar
+    peaks = np.asarray(peaks, dtype=np.int64)
+    if len(peaks) < 2: return np.empty(0), np.empty(0)
+    return peaks[1:] / fs, 60.0 * fs / np.diff(peaks)
+
+
+HRV_COLUMNS = ["n_latidos", "rmssd", "sdnn", "pnn50", "hr_media", "hr_min", "hr_max",
+               "zona1_s", "zona2_s", "zona3_s", "zona4_s", "zona5_s", "bajo_zonas_s"]
+
+CREATE_SQL = "CREATE TABLE IF NOT EXISTS hrv_metricas (entrenamiento_id INTEGER PRIMARY KEY, " + \
+    ", ".join(f"{col} {'INTEGER' if col == 'n_latidos' else 'REAL'}" for col in HRV_COLUMNS) + ")"
+
+
+def save_hrv(c, entrenamiento_id, metrics):
+    # Dentro de la transacción del llamador; una fila por entrenamiento
+    cols = ", ".join(HRV_COLUMNS)
+    marks = ", ".join("?" for _ in HRV_COLUMNS)
+    c.execute(f"INSERT OR REPLACE INTO hrv_metricas (entrenamiento_id, {cols}) VALUES (?, {marks})",
+              (entrenamiento_id, *[metrics[col] for col in HRV_COLUMNS]))
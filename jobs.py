@@ -0,0 +1,217 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import db
+import ecg_cache
+from db_pool import fetch_one, transaction, execute
+from ecg_store import read_header
+from ecg_downsample import ensure_pyramid, get_trace
+from sensors import iter_peak_blocks
+from hrv import compute_hrv, hr_max_for_age, save_hrv, DEFAULT_HR_MAX
+
+# Cola local de trabajos de ECG: la tabla ecg_jobs hace de broker (sin Redis ni
+# Celery) y un pool de procesos ejecuta el análisis fuera del worker web.
+MAX_WORKERS = int(os.environ.get("ECG_JOB_WORKERS", os.cpu_count() or 2))
+POLL_SECONDS = 0.2
+PROGRESS_SECONDS = 1.0
+# Cada trabajo en curso tiene un lease que su despachador renueva cada HEARTBEAT_SECONDS;
+# solo se reencola (worker caído) cuando el lease vence, por largo que sea el análisis
+LEASE_SECONDS = 60
+HEARTBEAT_SECONDS = LEASE_SECONDS / 3
+# Trabajos 'en_curso' sin lease (anteriores a la migración 14) más viejos que esto se consideran huérfanos
+STALE_SECONDS = 600
+_LEASE_SQL = f"strftime('%Y-%m-%d %H:%M:%f', 'now', '+{LEASE_SECONDS} seconds')"
+
+# La tabla ecg_jobs se crea en migrations.py (migración 5)
+
+# Reparto justo: primero el atleta con menos trabajos en curso y, a igualdad, el
+# que lleva más tiempo sin que se le atienda (round-robin entre atletas), de modo
+# que quien encola muchos trabajos de golpe no deja esperando a los demás.
+_CLAIM_SQL = f"""
+    UPDATE ecg_jobs SET estado = 'en_curso', iniciado = strftime('%Y-%m-%d %H:%M:%f', 'now'), lease_hasta = {_LEASE_SQL} WHERE id = (
+        SELECT j.id FROM ecg_jobs j WHERE j.estado = 'pendiente'
+        ORDER BY (SELECT COUNT(*) FROM ecg_jobs r WHERE r.estado = 'en_curso' AND r.paciente IS j.paciente),
+                 (SELECT MAX(s.iniciado) FROM ecg_jobs s WHERE s.paciente IS j.paciente) NULLS FIRST,
+                 j.id
+        LIMIT 1)
+    RETURNING id, ecg_path, paciente
+"""
+
+
+def _detect(ecg_path, fs, n, job_id=None, db_path=None):
+    # Lo que solo depende de la señal (y se cachea): latidos, bpm y traza diezmada para la UI
+    ensure_pyramid(ecg_path)
+    blocks = []
+    last_report = time.monotonic()
+    for peaks in iter_peak_blocks(ecg_path):
+        blocks.append(peaks)
+        if job_id and len(peaks) and time.monotonic() - last_report > PROGRESS_SECONDS:
+            execute(db_path, "UPDATE ecg_jobs SET progreso = ? WHERE id = ?", (float(peaks[-1]) / n, job_id))
+            last_report = time.monotonic()
+    peaks = np.concatenate(blocks) if blocks else np.empty(0, dtype=np.int64)
+    rr = np.diff(peaks) / fs
+    avg_rr = float(np.mean(rr)) if len(rr) else 0
+    t, y = get_trace(ecg_path)
+    return peaks, 60 / avg_rr if avg_rr > 0 else 0, t, y
+
+
+def ecg_result(entry, db_path=None, paciente=None):
+    # La HRV/zonas dependen de la FC de reposo y la edad del atleta: se calculan en cada envío
+    peaks, fs = entry["peaks"], entry["fs"]
+    fcr, hr_max = 60, DEFAULT_HR_MAX
+    if db_path and paciente:
+        row = fetch_one(db_path, "SELECT fcr, edad FROM pacientes WHERE nombre_paciente = ?", (paciente,))
+        if row:
+            fcr = row[0] or 60
+            hr_max = hr_max_for_age(row[1])
+    return {"bpm": entry["bpm"], "rr": np.round(np.diff(peaks) / fs, 4).tolist(),
+            "hrv": compute_hrv(peaks, fs, fcr=fcr, hr_max=hr_max),
+            "trace": {"t": entry["t"].tolist(), "y": entry["y"].tolist()}}
+
+
+def analyze_ecg(ecg_path, job_id=None, db_path=None, paciente=None):
+    # Se ejecuta en un proceso del pool; la misma grabación con los mismos parámetros sale de ecg_cache
+    meta = read_header(ecg_path)
+    fs, n = meta["fs"], meta["n_samples"] or 1
+    entry = ecg_cache.cached_analysis(ecg_path, fs, lambda: _detect(ecg_path, fs, n, job_id, db_path))
+    return ecg_result(entry, db_path, paciente)
+
+
+def submit_job(paciente, ecg_path, entrenamiento_id=None):
+    # Grabación ya analizada: el trabajo se crea terminado y no pasa por el pool
+    entry = ecg_cache.get(ecg_cache.key_for(ecg_path, read_header(ecg_path)["fs"]))
+    if entry is not None:
+        result = ecg_result(entry, db.DB_PATH, paciente)
+        _apply_result(paciente, entrenamiento_id, result)
+        with transaction(db.DB_PATH) as c:
+            c.execute("INSERT INTO ecg_jobs (paciente, entrenamiento_id, ecg_path, estado, progreso, resultado, iniciado, terminado) "
+                      "VALUES (?, ?, ?, 'hecho', 1, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'), strftime('%Y-%m-%d %H:%M:%f', 'now'))",
+                      (paciente, entrenamiento_id, ecg_path, json.dumps(result)))
+            return c.lastrowid
+    with transaction(db.DB_PATH) as c:
+        c.execute("INSERT INTO ecg_jobs (paciente, entrenamiento_id, ecg_path) VALUES (?, ?, ?)", (paciente, entrenamiento_id, ecg_path))
+        job_id = c.lastrowid
+    get_runner().wake()
+    return job_id
+
+
+def get_job(job_id):
+    row = fetch_one(db.DB_PATH, "SELECT id, paciente, entrenamiento_id, estado, progreso, resultado, error FROM ecg_jobs WHERE id = ?", (job_id,))
+    if not row: return None
+    return {"id": row[0], "paciente": row[1], "entrenamiento_id": row[2], "estado": row[3], "progreso": row[4],
+            "resultado": json.loads(row[5]) if row[5] else None, "error": row[6]}
+
+
+def _apply_result(paciente, entrenamiento_id, result):
+    # El bpm del entrenamiento va al fichero del atleta (su shard) antes de cerrar el
+    # trabajo en la central: si algo cae entre medias el trabajo se repite, y reaplicar
+    # el mismo resultado deja el entrenamiento igual
+    if entrenamiento_id:
+        with transaction(db.athlete_db(paciente)) as c:
+            db.set_training_bpm(c, entrenamiento_id, int(result["bpm"]))
+            save_hrv(c, entrenamiento_id, result["hrv"])
+
+
+def _complete(job_id, result):
+    row = fetch_one(db.DB_PATH, "SELECT paciente, entrenamiento_id FROM ecg_jobs WHERE id = ?", (job_id,))
+    if row: _apply_result(row[0], row[1], result)
+    execute(db.DB_PATH, "UPDATE ecg_jobs SET estado = 'hecho', progreso = 1, resultado = ?, terminado = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = ?", (json.dumps(result), job_id))
+
+
+def _fail(job_id, error):
+    execute(db.DB_PATH, "UPDATE ecg_jobs SET estado = 'error', error = ?, terminado = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = ?", (str(error), job_id))
+
+
+def requeue_stale(db_path, stale_seconds=STALE_SECONDS):
+    # Solo trabajos cuyo lease ha vencido: los que sigue ejecutando otro worker vivo se respetan
+    return execute(db_path, "UPDATE ecg_jobs SET estado = 'pendiente', progreso = 0, lease_hasta = NULL WHERE estado = 'en_curso' AND "
+                            "(lease_hasta < strftime('%Y-%m-%d %H:%M:%f', 'now') OR (lease_hasta IS NULL AND iniciado < datetime('now', ?)))",
+                   (f"-{int(stale_seconds)} seconds",))
+
+
+def renew_leases(db_path, job_ids):
+    if not job_ids: return 0
+    return execute(db_path, f"UPDATE ecg_jobs SET lease_hasta = {_LEASE_SQL} WHERE estado = 'en_curso' AND id IN ({', '.join('?' for _ in job_ids)})",
+                   tuple(job_ids))
+
+
+class JobRunner:
+    # Hilo despachador + pool de procesos. Cada worker de gunicorn tiene el suyo;
+    # el UPDATE ... RETURNING reclama cada trabajo de forma atómica entre todos.
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or MAX_WORKERS
+        self._running = set()
+        self._last_beat = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = False
+        self._executor = None
+        self._thread = None
+
+    def start(self):
+        # El primer latido del bucle ya reencola los trabajos con el lease vencido
+        # spawn: hacer fork de un proceso con hilos (Dash/Flask) no es seguro
+        self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        self._thread = threading.Thread(target=self._loop, name="ecg-jobs", daemon=True)
+        self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def _heartbeat(self):
+        # Renueva el lease de lo que ejecuta este proceso y recoge lo que dejaron otros caídos
+        with self._lock: running = list(self._running)
+        renew_leases(db.DB_PATH, running)
+        requeue_stale(db.DB_PATH)
+        self._last_beat = time.monotonic()
+
+    def _loop(self):
+        while not self._stop:
+            if time.monotonic() - self._last_beat > HEARTBEAT_SECONDS: self._heartbeat()
+            while len(self._running) < self.max_workers:
+                row = fetch_one(db.DB_PATH, "SELECT 1 FROM ecg_jobs WHERE estado = 'pendiente' LIMIT 1")
+                if not row: break
+                with transaction(db.DB_PATH) as c:
+                    job = c.execute(_CLAIM_SQL).fetchone()
+                if not job: break
+                with self._lock: self._running.add(job[0])
+                future = self._executor.submit(analyze_ecg, job[1], job[0], db.DB_PATH, job[2])
+                future.add_done_callback(lambda f, job_id=job[0]: self._done(job_id, f))
+            self._wake.wait(POLL_SECONDS)
+            self._wake.clear()
+
+    def _done(self, job_id, future):
+        try:
+            error = future.exception()
+            if error is None: _complete(job_id, future.result())
+            else: _fail(job_id, error)
+        except Exception as e:
+            _fail(job_id, e)
+        finally:
+            with self._lock: self._running.discard(job_id)
+            self.wake()
+
+    def stop(self):
+        self._stop = True
+        self.wake()
+        if self._thread: self._thread.join()
+        if self._executor: self._executor.shutdown()
+
+
+_runner = None
+_runner_pid = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    global _runner, _runner_pid
+    with _runner_lock:
+        if _runner is None or _runner_pid != os.getpid():
+            _runner = JobRunner().start()
+            _runner_pid = os.getpid()
+        return _runner
@@ -0,0 +1,155 @@
+import threading
+import numpy as np
+
+# Búfer circular de muestras preasignado: memoria fija por atleta, sin listas que crezcan.
+DEFAULT_SECONDS = 60
+# views() copia en vez de dar vistas si el tramo pedido empieza en el 1/VIEW_GUARD más antiguo
+VIEW_GUARD = 4
+
+
+class SampleRing:
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.data = np.zeros(self.capacity, dtype=dtype)
+        self.total = 0  # muestras escritas desde el inicio (índice absoluto de la siguiente)
+        self._lock = threading.Lock()
+
+    def append(self, samples):
+        samples = np.asarray(samples, dtype=self.data.dtype)
+        with self._lock:
+            # Bloque mayor que el búfer: solo cabe la cola, pero el índice absoluto avanza entero
+            if len(samples) > self.capacity:
+                self.total += len(samples) - self.capacity
+                samples = samples[-self.capacity:]
+            pos = self.total % self.capacity
+            first = min(len(samples), self.capacity - pos)
+            self.data[pos:pos + first] = samples[:first]
+            self.data[:len(samples) - first] = samples[first:]
+            self.total += len(samples)
+
+    def _read(self, index, copy):
+        start = max(index, self.total - self.capacity, 0)
+        n = self.total - start
+        if n <= 0: return self.total, [np.empty(0, dtype=self.data.dtype)]
+        pos = start % self.capacity
+        if pos + n <= self.capacity:
+            part = self.data[pos:pos + n]
+            return start, [part.copy() if copy else part]
+        if copy: return start, [np.concatenate([self.data[pos:], self.data[:pos + n - self.capacity]])]
+        return start, [self.data[pos:], self.data[:pos + n - self.capacity]]
+
+    def since(self, index):
+        # (índice absoluto de la primera muestra devuelta, copia de las muestras nuevas).
+        # Si el lector se quedó atrás más de capacity, se salta a lo más antiguo disponible.
+        with self._lock:
+            start, parts = self._read(index, copy=True)
+        return start, parts[0]
+
+    def views(self, index):
+        # Igual que since() pero sin copiar: hasta dos vistas de solo lectura sobre el
+        # búfer (el tramo puede dar la vuelta). Válidas mientras el productor no las
+        # sobrescriba, es decir, para leerlas justo después (tolist() en el callback).
+        # Si el tramo empieza en el 1/VIEW_GUARD más antiguo del búfer, la siguiente
+        # escritura lo pisaría mientras se lee: en ese caso se copia como en since().
+        with self._lock:
+            oldest = self.total - self.capacity
+            start, parts = self._read(index, copy=index < oldest + self.capacity // VIEW_GUARD)
+        for p in parts: p.flags.writeable = False
+        return start, parts
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+
+# Ventanas móviles sobre cubetas de 1 s en un anillo preasignado: añadir un latido o
+# un bloque de muestras toca solo la cubeta del segundo actual (O(1)); leer una
+# ventana reduce como mucho WINDOWS[-1] filas con NumPy. Memoria fija por atleta.
+WINDOWS = (10, 60, 300)
+_FIELDS = ["n", "sum_rr", "sum_rr2", "n_drr", "sum_drr2", "hr_min", "hr_max", "ecg_min", "ecg_max"]
+_F = {name: i for i, name in enumerate(_FIELDS)}
+_EMPTY_ROW = np.array([0, 0, 0, 0, 0, np.inf, -np.inf, np.inf, -np.inf])
+
+
+class RollingStats:
+    def __init__(self, fs, seconds=WINDOWS[-1]):
+        self.fs = fs
+        self.seconds = int(seconds)
+        self.buckets = np.tile(_EMPTY_ROW, (self.seconds, 1))
+        self.second = np.full(self.seconds, -1, dtype=np.int64)  # segundo absoluto de cada fila
+        self.now = 0           # último segundo de señal visto
+        self.last_peak = None
+        self.last_rr = None
+        self._lock = threading.Lock()
+
+    def _row(self, sec):
+        slot = sec % self.seconds
+        if self.second[slot] != sec:
+            self.buckets[slot] = _EMPTY_ROW
+            self.second[slot] = sec
+        return self.buckets[slot]
+
+    def add_samples(self, start_index, samples):
+        # Amplitud mín/máx del ECG por segundo (calidad de señal / electrodo suelto)
+        samples = np.asarray(samples)
+        if not len(samples): return
+        with self._lock:
+            first, last = start_index // self.fs, (start_index + len(samples) - 1) // self.fs
+            for sec in range(max(first, last - self.seconds + 1), last + 1):
+                lo = max(sec * self.fs - start_index, 0)
+                part = samples[lo:(sec + 1) * self.fs - start_index]
+                row = self._row(sec)
+                row[_F["ecg_min"]] = min(row[_F["ecg_min"]], part.min())
+                row[_F["ecg_max"]] = max(row[_F["ecg_max"]], part.max())
+            self.now = max(self.now, last)
+
+    def add_peaks(self, peaks):
+        # Índices absolutos de picos R, tal como los devuelven PeakDetector.feed / detect_peaks
+        from hrv import RR_MIN, RR_MAX
+        with self._lock:
+            for p in np.asarray(peaks, dtype=np.int64):
+                if self.last_peak is not None:
+                    rr = (p - self.last_peak) / self.fs
+                    if RR_MIN <= rr <= RR_MAX:
+                        row = self._row(int(p // self.fs))
+                        hr = 60.0 / rr
+                        row[_F["n"]] += 1
+                        row[_F["sum_rr"]] += rr
+                        row[_F["sum_rr2"]] += rr * rr
+                        if self.last_rr is not None:
+                            row[_F["n_drr"]] += 1
+                            row[_F["sum_drr2"]] += (rr - self.last_rr) ** 2
+                        row[_F["hr_min"]] = min(row[_F["hr_min"]], hr)
+                        row[_F["hr_max"]] = max(row[_F["hr_max"]], hr)
+                        self.last_rr = rr
+                    else:
+                        self.last_rr = None  # artefacto: no encadenar diferencias sucesivas
+                self.last_peak = p
+                self.now = max(self.now, int(p // self.fs))
+
+    def window(self, seconds):
+        with self._lock:
+            mask = self.second > self.now - seconds
+            rows = self.buckets[mask]
+        n, sum_rr, sum_rr2, n_drr, sum_drr2 = rows[:, :5].sum(axis=0) if len(rows) else np.zeros(5)
+        out = {"window_s": seconds, "beats": int(n), "hr_mean": 0.0, "hr_min": 0.0, "hr_max": 0.0,
+               "rr_mean": 0.0, "sdnn": 0.0, "rmssd": 0.0, "ecg_min": 0.0, "ecg_max": 0.0}
+        if len(rows) and np.isfinite(rows[:, _F["ecg_min"]]).any():
+            out["ecg_min"] = float(rows[:, _F["ecg_min"]].min())
+            out["ecg_max"] = float(rows[:, _F["ecg_max"]].max())
+        if n:
+            out["rr_mean"] = float(sum_rr / n)
+            out["hr_mean"] = 60.0 / out["rr_mean"]
+            out["hr_min"] = float(rows[:, _F["hr_min"]].min())
+            out["hr_max"] = float(rows[:, _F["hr_max"]].max())
+        if n > 1: out["sdnn"] = float(np.sqrt(max(0.0, (sum_rr2 - sum_rr ** 2 / n) / (n - 1))) * 1000)
+        if n_drr: out["rmssd"] = float(np.sqrt(sum_drr2 / n_drr) * 1000)
+        return out
+
+    def snapshot(self, windows=WINDOWS):
+        # Dict de floats planos, serializable tal cual en un dcc.Store
+        return {f"{w}s": self.window(w) for w in windows if w <= self.seconds}
+
+    @property
+    def nbytes(self):
+        return self.buckets.nbytes + self.second.nbytes
@@ -0,0 +1,166 @@
+import asyncio
+import itertools
+import os
+import struct
+import threading
+import time
+import numpy as np
+from live_buffer import SampleRing, RollingStats, DEFAULT_SECONDS
+from sensors import PeakDetector
+
+# Servicio de ingesta en vivo (BITalino u otros sensores). Protocolo TCP con
+# tramas delimitadas por longitud:
+#   u32 longitud | u8 len_nombre | nombre utf-8 | u16 fs | u32 secuencia | float32[] muestras
+# Todo little-endian. Cada atleta tiene un búfer circular y un detector de picos
+# incremental; el dashboard lee de LiveHub desde el mismo proceso.
+#
+# El servidor corre en un hilo del proceso de Dash: en modo en vivo lanzar con un
+# único worker (gunicorn -w 1 --threads 8) para que todos los callbacks vean el mismo hub.
+LIVE_PORT = int(os.environ.get("LIVE_INGEST_PORT", 0))
+# El protocolo no tiene autenticación: por defecto solo desde la propia máquina
+LIVE_HOST = "0.0.0.0" if os.environ.get("LIVE_INGEST_PUBLIC") == "1" else "127.0.0.1"
+MAX_FRAME = 1 << 20
+# Frecuencias de muestreo aceptadas (Hz): fuera de este rango la trama se descarta
+MIN_FS, MAX_FS = 50, 2000
+# Atletas en directo a la vez: al llegar uno nuevo con el hub lleno se descarta el
+# que lleva más tiempo sin enviar (memoria acotada aunque lleguen nombres al azar)
+MAX_STREAMS = int(os.environ.get("LIVE_MAX_STREAMS", 128))
+
+_HEADER = struct.Struct("<HI")
+# Identificador de cada AthleteStream creado: el dashboard detecta así que un atleta
+# cambió de stream (nueva fs o desalojo) y reinicia su cursor
+_STREAM_IDS = itertools.count(1)
+
+
+def pack_frame(athlete, fs, seq, samples):
+    name = athlete.encode()
+    payload = bytes([len(name)]) + name + _HEADER.pack(fs, seq) + np.asarray(samples, dtype="<f4").tobytes()
+    return struct.pack("<I", len(payload)) + payload
+
+
+def unpack_payload(payload):
+    # ValueError (o UnicodeDecodeError) si la trama está mal formada
+    if not payload: raise ValueError("trama vacía")
+    name_len = payload[0]
+    offset = 1 + name_len + _HEADER.size
+    if name_len == 0 or len(payload) < offset: raise ValueError(f"nombre de {name_len} bytes en una trama de {len(payload)}")
+    if (len(payload) - offset) % 4: raise ValueError(f"{len(payload) - offset} bytes de muestras, no múltiplo de 4")
+    athlete = payload[1:1 + name_len].decode()
+    fs, seq = _HEADER.unpack_from(payload, 1 + name_len)
+    if not MIN_FS <= fs <= MAX_FS: raise ValueError(f"fs={fs} fuera de [{MIN_FS}, {MAX_FS}]")
+    samples = np.frombuffer(payload, dtype="<f4", offset=offset)
+    return athlete, fs, seq, samples
+
+
+class AthleteStream:
+    def __init__(self, athlete, fs, seconds=DEFAULT_SECONDS):
+        self.id = next(_STREAM_IDS)
+        self.athlete = athlete
+        self.fs = fs
+        self.ring = SampleRing(fs * seconds)
+        self.detector = PeakDetector(fs, window_seconds=4, overlap_seconds=1)
+        self.stats = RollingStats(fs)
+        self.last_seq = None
+        self.dropped = 0
+        self.updated = time.time()
+
+    def ingest(self, seq, samples):
+        if self.last_seq is not None and seq != self.last_seq + 1: self.dropped += 1
+        self.last_seq = seq
+        self.stats.add_samples(self.ring.total, samples)
+        self.ring.append(samples)
+        # Detección incremental: solo se analizan ventanas nuevas
+        peaks = self.detector.feed(samples)
+        self.stats.add_peaks(peaks)
+        self.updated = time.time()
+        return peaks
+
+    def bpm(self):
+        return self.stats.window(10)["hr_mean"]
+
+    @property
+    def nbytes(self):
+        # Memoria fija por atleta: búfer crudo + cubetas de estadísticas
+        return self.ring.nbytes + self.stats.nbytes
+
+
+class LiveHub:
+    def __init__(self, max_streams=MAX_STREAMS):
+        self.max_streams = max_streams
+        self.streams = {}
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.samples = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def stream(self, athlete, fs):
+        st = self.streams.get(athlete)
+        if st is None or st.fs != fs:
+            with self._lock:
+                st = self.streams.get(athlete)
+                if st is None or st.fs != fs:
+                    if st is None and len(self.streams) >= self.max_streams:
+                        del self.streams[min(self.streams, key=lambda a: self.streams[a].updated)]
+                        self.evicted += 1
+                    st = self.streams[athlete] = AthleteStream(athlete, fs)
+        return st
+
+    def ingest(self, athlete, fs, seq, samples):
+        self.frames += 1
+        self.samples += len(samples)
+        return self.stream(athlete, fs).ingest(seq, samples)
+
+    def get(self, athlete):
+        return self.streams.get(athlete)
+
+
+hub = LiveHub()
+
+
+async def _handle(reader, writer, target):
+    peer = writer.get_extra_info("peername")
+    try:
+        while True:
+            length, = struct.unpack("<I", await reader.readexactly(4))
+            if length > MAX_FRAME: break
+            payload = await reader.readexactly(length)
+            # La longitud delimita la trama: una mala se descarta sin perder la sincronía
+            try:
+                frame = unpack_payload(payload)
+            except (ValueError, struct.error) as e:
+                target.rejected += 1
+                print(f"--- LIVE: trama descartada de {peer}: {e} ---")
+                continue
+            target.ingest(*frame)
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host=None, port=LIVE_PORT or 9100, target=None):
+    host = host or LIVE_HOST
+    target = target or hub
+    server = await asyncio.start_server(lambda r, w: _handle(r, w, target), host, port)
+    print(f"--- LIVE: escuchando sensores en {host}:{port} ---")
+    async with server:
+        await server.serve_forever()
+
+
+_thread = None
+
+
+def start_in_thread(host=None, port=None, target=None):
+    # Arranca el servidor asyncio en un hilo daemon (una vez por proceso)
+    global _thread
+    if _thread is None:
+        port = port or LIVE_PORT or 9100
+        _thread = threading.Thread(target=lambda: asyncio.run(serve(host, port, target)), name="live-ingest", daemon=True)
+        _thread.start()
+    return _thread
+
+
+if __name__ == "__main__":
+    # Servidor independiente (sin dashboard), útil para pruebas de carga
+    asyncio.run(serve())
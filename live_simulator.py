@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import time
+import numpy as np
+from live_ingest import pack_frame
+from sensors import read_ecg_chunks
+
+# Cliente simulador: reproduce ficheros CSV/.ecg como si fueran sensores en vivo,
+# un socket por atleta, enviando paquetes de packet_ms a ritmo real (o acelerado).
+#
+#   python live_simulator.py data/ecg_example.csv --athletes 20 --fs 250
+
+
+def load_signal(path, fs):
+    chunks = list(read_ecg_chunks(path, fs * 60))
+    signal = np.concatenate(chunks) if chunks else np.empty(0)
+    # Ficheros muy cortos (como ecg_example.csv) se repiten para tener algo que enviar
+    if 0 < len(signal) < fs: signal = np.tile(signal, fs // len(signal) + 1)
+    return signal.astype(np.float32)
+
+
+async def replay(athlete, signal, fs, host, port, seconds, packet_ms=40, speed=1.0, stats=None):
+    reader, writer = await asyncio.open_connection(host, port)
+    per_packet = max(1, int(fs * packet_ms / 1000))
+    n_packets = int(seconds * fs / per_packet)
+    t0 = time.perf_counter()
+    pos = 0
+    for seq in range(n_packets):
+        chunk = np.take(signal, np.arange(pos, pos + per_packet), mode="wrap")
+        pos = (pos + per_packet) % len(signal)
+        writer.write(pack_frame(athlete, fs, seq, chunk))
+        await writer.drain()
+        # Ritmo real: el paquete seq debe salir en t0 + seq * duración / speed
+        delay = t0 + (seq + 1) * per_packet / fs / speed - time.perf_counter()
+        if delay > 0: await asyncio.sleep(delay)
+        if stats is not None: stats["samples"] += len(chunk)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(paths, athletes, fs, host, port, seconds, packet_ms=40, speed=1.0):
+    signals = [load_signal(p, fs) for p in paths]
+    stats = {"samples": 0}
+    await asyncio.gather(*[
+        replay(f"Atleta_{i}", signals[i % len(signals)], fs, host, port, seconds, packet_ms, speed, stats)
+        for i in range(athletes)
+    ])
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reproduce ficheros ECG como sensores en vivo")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--athletes", type=int, default=1)
+    parser.add_argument("--fs", type=int, default=250)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--packet-ms", type=int, default=40)
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    stats = asyncio.run(run(args.files, args.athletes, args.fs, args.host, args.port, args.seconds, args.packet_ms, args.speed))
+    print(f"✅ {stats['samples']} muestras enviadas en {time.perf_counter() - t0:.1f} s")
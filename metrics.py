@@ -0,0 +1,204 @@
+import bisect
+import cProfile
+import functools
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Instrumentación del camino caliente: histogramas de latencia por callback de Dash,
+# función de db.py y etapa de figura (construcción Plotly / serialización), filas
+# devueltas y bytes de respuesta. Se exporta en formato de texto de Prometheus en
+# /metrics. Los contadores son por proceso: con varios workers de gunicorn cada
+# uno expone los suyos (scrapear cada worker o usar un único worker con hilos).
+#
+#   METRICS_ENABLED=0      no envuelve nada (coste cero)
+#   PROFILE_SAMPLE=0.01    perfila con cProfile ~1% de las llamadas instrumentadas
+ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+PROFILE_SAMPLE = float(os.environ.get("PROFILE_SAMPLE", 0))
+PREFIX = "biomonitor"
+
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+BYTES_BUCKETS = [1024 * 2 ** i for i in range(0, 14, 2)]  # 1 KB .. 4 MB
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        out, acc = [], 0
+        for le, n in zip([*self.buckets, "+Inf"], self.counts):
+            acc += n
+            out.append(f'{name}_bucket{{{labels},le="{le}"}} {acc}')
+        out.append(f"{name}_sum{{{labels}}} {self.sum:.6f}")
+        out.append(f"{name}_count{{{labels}}} {self.count}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}   # (kind, name) -> Histogram en segundos
+        self.errors = {}    # (kind, name) -> int
+        self.rows = {}      # (kind, name) -> filas devueltas en total
+        self.payload = {}   # (kind, name) -> Histogram en bytes
+
+    def observe(self, kind, name, seconds, rows=None, error=False):
+        key = (kind, name)
+        with self._lock:
+            hist = self.latency.get(key)
+            if hist is None: hist = self.latency[key] = Histogram(LATENCY_BUCKETS)
+            hist.observe(seconds)
+            if rows is not None: self.rows[key] = self.rows.get(key, 0) + rows
+            if error: self.errors[key] = self.errors.get(key, 0) + 1
+
+    def observe_bytes(self, kind, name, n):
+        key = (kind, name)
+        with self._lock:
+            hist = self.payload.get(key)
+            if hist is None: hist = self.payload[key] = Histogram(BYTES_BUCKETS)
+            hist.observe(n)
+
+    def render(self):
+        # Formato de exposición de texto 0.0.4 de Prometheus
+        label = lambda k: f'kind="{k[0]}",name="{k[1]}"'
+        with self._lock:
+            out = [f"# HELP {PREFIX}_latency_seconds Latencia por callback, función de BD o etapa",
+                   f"# TYPE {PREFIX}_latency_seconds histogram"]
+            for key in sorted(self.latency): out += self.latency[key].lines(f"{PREFIX}_latency_seconds", label(key))
+            out += [f"# HELP {PREFIX}_rows_total Filas devueltas", f"# TYPE {PREFIX}_rows_total counter"]
+            out += [f"{PREFIX}_rows_total{{{label(k)}}} {v}" for k, v in sorted(self.rows.items())]
+            out += [f"# HELP {PREFIX}_errors_total Llamadas que lanzaron excepción", f"# TYPE {PREFIX}_errors_total counter"]
+            out += [f"{PREFIX}_errors_total{{{label(k)}}} {v}" for k, v in sorted(self.errors.items())]
+            out += [f"# HELP {PREFIX}_response_bytes Tamaño de la respuesta", f"# TYPE {PREFIX}_response_bytes histogram"]
+            for key in sorted(self.payload): out += self.payload[key].lines(f"{PREFIX}_response_bytes", label(key))
+        return "\n".join(out) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.latency.clear(); self.errors.clear(); self.rows.clear(); self.payload.clear()
+
+
+registry = Registry()
+
+
+# --- Perfilado por muestreo: una llamada de cada 1/PROFILE_SAMPLE bajo cProfile ---
+_profile_lock = threading.Lock()
+_profile_stats = None
+
+
+def _profiled(fn, args, kwargs):
+    global _profile_stats
+    # Solo un perfilador activo a la vez en el proceso; si está ocupado, no se muestrea
+    if not _profile_lock.acquire(blocking=False): return fn(*args, **kwargs)
+    try:
+        prof = cProfile.Profile()
+        try: return prof.runcall(fn, *args, **kwargs)
+        finally:
+            if _profile_stats is None: _profile_stats = pstats.Stats(prof)
+            else: _profile_stats.add(prof)
+    finally:
+        _profile_lock.release()
+
+
+def profile_report(limit=40, sort="cumulative"):
+    if _profile_stats is None: return "Sin muestras (PROFILE_SAMPLE=0 o aún no hubo llamadas muestreadas)\n"
+    buf = io.StringIO()
+    with _profile_lock:
+        _profile_stats.stream = buf
+        _profile_stats.sort_stats(sort).print_stats(limit)
+    return buf.getvalue()
+
+
+def _count_rows(result):
+    # Solo listas (filas); las tuplas suelen ser varios valores de retorno
+    return len(result) if isinstance(result, list) else None
+
+
+def instrument(kind, name=None):
+    # Decorador: @instrument("db") o instrument("callback", "nombre")(fn)
+    def wrap(fn):
+        if not ENABLED: return fn
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            t0 = time.perf_counter()
+            error = False
+            try:
+                if PROFILE_SAMPLE and random.random() < PROFILE_SAMPLE: result = _profiled(fn, args, kwargs)
+                else: result = fn(*args, **kwargs)
+                return result
+            except BaseException:
+                error, result = True, None
+                raise
+            finally:
+                registry.observe(kind, label, time.perf_counter() - t0, _count_rows(result), error)
+        return inner
+    return wrap
+
+
+@contextmanager
+def timed(kind, name):
+    # Para tramos dentro de una función (p. ej. construir vs. serializar una figura)
+    if not ENABLED:
+        yield
+        return
+    t0 = time.perf_counter()
+    error = False
+    try: yield
+    except BaseException:
+        error = True
+        raise
+    finally: registry.observe(kind, name, time.perf_counter() - t0, error=error)
+
+
+def instrument_module(module, kind, skip=()):
+    # Envuelve las funciones públicas definidas en el módulo. Llamar al final del
+    # módulo, antes de que nadie haga "from modulo import funcion".
+    if not ENABLED: return
+    for attr, value in list(vars(module).items()):
+        if attr.startswith("_") or attr in skip or not callable(value) or isinstance(value, type): continue
+        if getattr(value, "__module__", None) != module.__name__: continue
+        setattr(module, attr, instrument(kind, attr)(value))
+
+
+def instrument_dash(app):
+    # Todas las funciones registradas después con app.callback quedan instrumentadas,
+    # y cada respuesta de callback anota sus bytes por id de salida
+    if not ENABLED: return
+    register = app.callback
+
+    def callback(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+        return lambda fn: decorator(instrument("callback", fn.__name__)(fn))
+    app.callback = callback
+
+    from flask import request
+
+    @app.server.after_request
+    def _record_payload(response):
+        if request.path.endswith("_dash-update-component"):
+            body = request.get_json(silent=True) or {}
+            output = str(body.get("output", "?"))
+            registry.observe_bytes("callback", output[:120], response.calculate_content_length() or 0)
+        return response
+
+
+def metrics_response(remote_addr):
+    # Texto para /metrics; por defecto solo desde la propia máquina
+    if os.environ.get("METRICS_PUBLIC") != "1" and remote_addr not in ("127.0.0.1", "::1"):
+        return None
+    return registry.render()
@@ -0,0 +1,197 @@
+import datetime
+import sys
+from db_pool import fetch_all, transaction
+
+# Migraciones ordenadas: (versión, descripción, lista de sentencias o función(c)).
+# Nunca editar una migración ya publicada: añadir otra con la versión siguiente.
+# Por eso cada paso lleva aquí su SQL y su lógica tal como se publicaron, sin llamar
+# a funciones de otros módulos que pueden cambiar después (athlete_stats.rebuild...).
+
+def _base_schema(c):
+    c.execute("CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password TEXT, role TEXT DEFAULT 'entrenador')")
+    c.execute("CREATE TABLE IF NOT EXISTS pacientes (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT, nombre_paciente TEXT UNIQUE, full_name TEXT, edad INTEGER, peso REAL, altura REAL, entrenador_asociado TEXT, equipo TEXT DEFAULT 'Sin asignar', deporte TEXT DEFAULT 'Running', posicion TEXT, nacionalidad TEXT DEFAULT 'Desconocida', fcr INTEGER DEFAULT 60, vo2 REAL DEFAULT 45.0)")
+    c.execute("CREATE TABLE IF NOT EXISTS cuestionarios (id INTEGER PRIMARY KEY AUTOINCREMENT, paciente TEXT, username TEXT, fecha TEXT, fatiga INTEGER, suenio INTEGER, rpe INTEGER, tiempo_entrenamiento REAL)")
+    c.execute("CREATE TABLE IF NOT EXISTS entrenamientos (id INTEGER PRIMARY KEY AUTOINCREMENT, paciente TEXT, duracion REAL, fatiga INTEGER, rpe INTEGER, bpm INTEGER DEFAULT 0, fecha_inicio TEXT, fecha_fin TEXT, validacion_especialista TEXT DEFAULT 'Pendiente', comentarios_especialista TEXT DEFAULT '')")
+
+
+def _athlete_stats(c):
+    # v3: athlete_stats rellenada desde el histórico (athlete_stats.py la mantiene después)
+    c.execute("CREATE TABLE IF NOT EXISTS athlete_stats (paciente TEXT PRIMARY KEY NOT NULL, n_fatiga INTEGER DEFAULT 0, sum_fatiga REAL DEFAULT 0, "
+              "n_rpe INTEGER DEFAULT 0, sum_rpe REAL DEFAULT 0, n_suenio INTEGER DEFAULT 0, sum_suenio REAL DEFAULT 0, "
+              "n_carga INTEGER DEFAULT 0, sum_carga REAL DEFAULT 0, n_bpm INTEGER DEFAULT 0, sum_bpm REAL DEFAULT 0)")
+    c.execute("DELETE FROM athlete_stats")
+    c.execute("INSERT INTO athlete_stats (paciente, n_fatiga, sum_fatiga, n_rpe, sum_rpe, n_suenio, sum_suenio, n_carga, sum_carga) "
+              "SELECT paciente, COUNT(fatiga), TOTAL(fatiga), COUNT(rpe), TOTAL(rpe), COUNT(suenio), TOTAL(suenio), "
+              "COUNT(rpe * tiempo_entrenamiento), TOTAL(rpe * tiempo_entrenamiento) FROM cuestionarios WHERE paciente IS NOT NULL GROUP BY paciente")
+    c.execute("INSERT INTO athlete_stats (paciente, n_bpm, sum_bpm) "
+              "SELECT paciente, COUNT(bpm), TOTAL(bpm) FROM entrenamientos WHERE paciente IS NOT NULL AND bpm > 0 GROUP BY paciente "
+              "ON CONFLICT(paciente) DO UPDATE SET n_bpm = excluded.n_bpm, sum_bpm = excluded.sum_bpm")
+
+
+def _carga(c):
+    # v8: carga diaria y estado EWMA (7 y 28 días) desde el histórico de cuestionarios
+    a_acute, a_chronic = 2 / 8, 2 / 29
+    c.execute("CREATE TABLE IF NOT EXISTS carga_diaria (paciente TEXT NOT NULL, dia TEXT NOT NULL, carga REAL DEFAULT 0, sesiones INTEGER DEFAULT 0, PRIMARY KEY (paciente, dia))")
+    c.execute("CREATE TABLE IF NOT EXISTS carga_ewma (paciente TEXT PRIMARY KEY NOT NULL, dia TEXT, aguda REAL DEFAULT 0, cronica REAL DEFAULT 0)")
+    c.execute("DELETE FROM carga_diaria")
+    c.execute("DELETE FROM carga_ewma")
+    c.execute("INSERT INTO carga_diaria (paciente, dia, carga, sesiones) "
+              "SELECT paciente, substr(fecha, 1, 10), TOTAL(CAST(rpe AS FLOAT) * CAST(tiempo_entrenamiento AS FLOAT)), COUNT(*) "
+              "FROM cuestionarios WHERE paciente IS NOT NULL AND fecha IS NOT NULL GROUP BY paciente, substr(fecha, 1, 10)")
+    state = {}
+    for paciente, dia, carga in c.execute("SELECT paciente, dia, carga FROM carga_diaria ORDER BY paciente, dia").fetchall():
+        prev, aguda, cronica = state.get(paciente, (dia, 0.0, 0.0))
+        # y[d] = a*x[d] + (1-a)^gap * y[anterior]: los días sin carga solo decaen
+        gap = (datetime.date.fromisoformat(dia) - datetime.date.fromisoformat(prev)).days
+        state[paciente] = (dia, a_acute * carga + (1 - a_acute) ** gap * aguda, a_chronic * carga + (1 - a_chronic) ** gap * cronica)
+    c.executemany("INSERT INTO carga_ewma (paciente, dia, aguda, cronica) VALUES (?, ?, ?, ?)", [(p, *st) for p, st in state.items()])
+
+
+def _ecg_jobs_lease(c):
+    # v14: plazo que renueva el despachador mientras el trabajo sigue en curso
+    add_column_if_missing(c, "ecg_jobs", "lease_hasta", "TEXT")
+
+
+MIGRATIONS = [
+    (1, "esquema base", _base_schema),
+    (2, "indices de consulta", [
+        # Cubre la serie de carga (ORDER BY fecha) y las medias del cuestionario sin tocar la tabla
+        "CREATE INDEX IF NOT EXISTS idx_cuestionarios_paciente_fecha ON cuestionarios (paciente, fecha, rpe, tiempo_entrenamiento, fatiga, suenio)",
+        "CREATE INDEX IF NOT EXISTS idx_entrenamientos_paciente_bpm ON entrenamientos (paciente, bpm)",
+        "CREATE INDEX IF NOT EXISTS idx_pacientes_username ON pacientes (username)",
+        "CREATE INDEX IF NOT EXISTS idx_pacientes_entrenador ON pacientes (entrenador_asociado)",
+    ]),
+    # Crea y rellena los agregados por atleta a partir del histórico existente
+    (3, "tabla athlete_stats", _athlete_stats),
+    (4, "versiones para la cache de figuras", [
+        "CREATE TABLE IF NOT EXISTS cache_versions (paciente TEXT PRIMARY KEY NOT NULL, version INTEGER DEFAULT 0)",
+    ]),
+    # Tabla que hace de broker para jobs.py
+    (5, "cola de trabajos de ECG", [
+        "CREATE TABLE IF NOT EXISTS ecg_jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, paciente TEXT, entrenamiento_id INTEGER, ecg_path TEXT, estado TEXT DEFAULT 'pendiente', progreso REAL DEFAULT 0, resultado TEXT, error TEXT, creado TEXT DEFAULT (datetime('now')), iniciado TEXT, terminado TEXT)",
+        "CREATE INDEX IF NOT EXISTS idx_ecg_jobs_estado ON ecg_jobs (estado, paciente, id)",
+        "CREATE INDEX IF NOT EXISTS idx_ecg_jobs_paciente ON ecg_jobs (paciente, iniciado)",
+    ]),
+    (6, "metricas HRV por entrenamiento", [
+        "CREATE TABLE IF NOT EXISTS hrv_metricas (entrenamiento_id INTEGER PRIMARY KEY, n_latidos INTEGER, rmssd REAL, sdnn REAL, pnn50 REAL, "
+        "hr_media REAL, hr_min REAL, hr_max REAL, zona1_s REAL, zona2_s REAL, zona3_s REAL, zona4_s REAL, zona5_s REAL, bajo_zonas_s REAL)",
+    ]),
+    # Progreso de reprocess.py para poder reanudar
+    (7, "checkpoint de reproceso de ECG", [
+        "CREATE TABLE IF NOT EXISTS reprocess_checkpoint (run_id TEXT NOT NULL, ruta TEXT NOT NULL, bpm INTEGER, hecho TEXT, PRIMARY KEY (run_id, ruta))",
+    ]),
+    # Carga diaria y estado EWMA para ACWR/monotonía, rellenados desde el histórico
+    (8, "carga diaria y ACWR", _carga),
+    # Ventana de los últimos días de toda la plantilla (squad.py) sin recorrer el histórico
+    (9, "indice de carga diaria por dia", [
+        "CREATE INDEX IF NOT EXISTS idx_carga_diaria_dia ON carga_diaria (dia, paciente, carga)",
+    ]),
+    # Búsqueda por prefijo del desplegable de atletas, acotada por entrenador
+    (10, "indices de busqueda de pacientes", [
+        "CREATE INDEX IF NOT EXISTS idx_pacientes_entrenador_nombre ON pacientes (entrenador_asociado, lower(full_name), nombre_paciente, equipo, full_name)",
+        "CREATE INDEX IF NOT EXISTS idx_pacientes_entrenador_id ON pacientes (entrenador_asociado, lower(nombre_paciente), nombre_paciente, equipo, full_name)",
+    ]),
+    # Percentiles por equipo/deporte para la comparativa: team_stats.ensure_fresh los
+    # calcula en el primer render y los refresca cada TEAM_STATS_MAX_AGE
+    (11, "percentiles por equipo", [
+        "CREATE TABLE IF NOT EXISTS team_stats (tipo TEXT NOT NULL, grupo TEXT NOT NULL, metrica TEXT NOT NULL, n INTEGER, media REAL, "
+        "p10 REAL, p25 REAL, p50 REAL, p75 REAL, p90 REAL, actualizado REAL, PRIMARY KEY (tipo, grupo, metrica))",
+    ]),
+    # Deduplicación de bulk.py por (paciente, fecha_inicio); cuestionarios ya tiene el suyo
+    (12, "indice de entrenamientos por fecha", [
+        "CREATE INDEX IF NOT EXISTS idx_entrenamientos_paciente_fecha ON entrenamientos (paciente, fecha_inicio)",
+    ]),
+    # Primera página del desplegable en el login (db.bootstrap_session) sin ordenar la plantilla
+    (13, "indice de pacientes por entrenador en orden", [
+        "CREATE INDEX IF NOT EXISTS idx_pacientes_entrenador_orden ON pacientes (entrenador_asociado, full_name, nombre_paciente, equipo)",
+    ]),
+    # Trabajos en curso con lease: solo se reencolan los que nadie renueva (jobs.requeue_stale)
+    (14, "lease de trabajos de ECG", _ecg_jobs_lease),
+]
+
+
+def add_column_if_missing(c, table, column, definition):
+    # ALTER TABLE ADD COLUMN no admite IF NOT EXISTS; comprobamos antes para que
+    # la migración sea repetible sobre bases de datos ya modificadas a mano.
+    cols = [r[1] for r in c.execute(f"PRAGMA table_info({table})").fetchall()]
+    if column not in cols:
+        c.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def current_version(path):
+    rows = fetch_all(path, "SELECT name FROM sqlite_master WHERE type='table' AND name='schema_version'")
+    if not rows: return 0
+    row = fetch_all(path, "SELECT MAX(version) FROM schema_version")[0]
+    return row[0] or 0
+
+
+def migrate(path):
+    with transaction(path) as c:
+        c.execute("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, descripcion TEXT, aplicada TEXT DEFAULT (datetime('now')))")
+    applied = []
+    for version, desc, step in MIGRATIONS:
+        # Cada paso en su propia transacción: si falla, la versión no se registra
+        with transaction(path) as c:
+            c.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,))
+            if c.fetchone(): continue
+            if callable(step): step(c)
+            else:
+                for sql in step: c.execute(sql)
+            c.execute("INSERT INTO schema_version (version, descripcion) VALUES (?, ?)", (version, desc))
+            applied.append(version)
+    if applied: print(f"--- DB: Migraciones aplicadas: {applied} ---")
+    return applied
+
+
+# Consultas calientes de db.py y el índice que deben usar según EXPLAIN QUERY PLAN
+QUERY_PLAN_EXPECTATIONS = [
+    ("SELECT fecha, CAST(rpe AS FLOAT) * CAST(tiempo_entrenamiento AS FLOAT) FROM cuestionarios WHERE paciente = ? ORDER BY fecha ASC",
+     "COVERING INDEX idx_cuestionarios_paciente_fecha"),
+    ("SELECT AVG(fatiga), AVG(rpe), AVG(suenio), AVG(rpe * tiempo_entrenamiento) FROM cuestionarios WHERE paciente = ?",
+     "COVERING INDEX idx_cuestionarios_paciente_fecha"),
+    ("SELECT AVG(bpm) FROM entrenamientos WHERE paciente = ? AND bpm > 0",
+     "COVERING INDEX idx_entrenamientos_paciente_bpm"),
+    ("SELECT nombre_paciente FROM pacientes WHERE username = ?",
+     "INDEX idx_pacientes_username"),
+    ("SELECT count(*) FROM pacientes WHERE entrenador_asociado = ?",
+     "INDEX idx_pacientes_entrenador"),
+    ("SELECT paciente, dia, carga FROM carga_diaria WHERE dia >= ?",
+     "COVERING INDEX idx_carga_diaria_dia"),
+    ("SELECT nombre_paciente, equipo, full_name FROM pacientes WHERE entrenador_asociado IN (?, ?) AND lower(full_name) >= ? AND lower(full_name) < ?",
+     "COVERING INDEX idx_pacientes_entrenador_nombre"),
+    ("SELECT nombre_paciente, equipo, full_name FROM pacientes WHERE entrenador_asociado IN (?, ?) AND lower(nombre_paciente) >= ? AND lower(nombre_paciente) < ?",
+     "COVERING INDEX idx_pacientes_entrenador_id"),
+    ("SELECT 1 FROM cuestionarios WHERE paciente = ? AND fecha = ?",
+     "COVERING INDEX idx_cuestionarios_paciente_fecha"),
+    ("SELECT 1 FROM entrenamientos WHERE paciente = ? AND fecha_inicio = ?",
+     "COVERING INDEX idx_entrenamientos_paciente_fecha"),
+    ("SELECT nombre_paciente, equipo, full_name FROM pacientes WHERE entrenador_asociado = ? ORDER BY full_name, nombre_paciente LIMIT ?",
+     "COVERING INDEX idx_pacientes_entrenador_orden"),
+    ("SELECT COUNT(*) FROM pacientes WHERE entrenador_asociado IN (?, ?)",
+     "COVERING INDEX idx_pacientes_entrenador"),
+]
+
+
+def check_query_plans(path, expectations=None):
+    # Devuelve la lista de consultas cuyo plan no usa el índice esperado
+    failures = []
+    for sql, expected in (expectations or QUERY_PLAN_EXPECTATIONS):
+        params = tuple(None for _ in range(sql.count("?")))
+        plan = " | ".join(r[3] for r in fetch_all(path, "EXPLAIN QUERY PLAN " + sql, params))
+        if expected not in plan or "USE TEMP B-TREE" in plan:
+            failures.append((sql, expected, plan))
+    return failures
+
+
+if __name__ == "__main__":
+    # python migrations.py [ruta.db] [--check]
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    path = args[0] if args else "database.db"
+    migrate(path)
+    print(f"Versión de esquema: {current_version(path)}")
+    if "--check" in sys.argv:
+        failures = check_query_plans(path)
+        for sql, expected, plan in failures:
+            print(f"❌ {sql}\n   esperado: {expected}\n   plan: {plan}")
+        if failures: sys.exit(1)
+        print("✅ Todos los planes usan sus índices")
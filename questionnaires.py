@@ -1,100 +1,194 @@
-import dash_bootstrap_components as dbc
-from dash import html, dcc
-import pandas as pd
-import plotly.graph_objs as go
-from db import get_training_data_for_patient, get_metrics_for_comparison
-
-CARD_STYLE = {
-    "backgroundColor": "#1E1E1E", "border": "1px solid #333",
-    "borderRadius": "12px", "marginBottom": "15px", "boxShadow": "0 4px 6px rgba(0,0,0,0.3)"
-}
-
-LABEL_STYLE = {"color": "#90CAF9", "fontWeight": "600", "marginBottom": "5px"}
-
-questionnaire_layout = html.Div([
-    html.H5("📝 Registro Diario", className="text-white mb-3"),
-    dbc.Row([
-        dbc.Col(dbc.Card(dbc.CardBody([
-            html.Label("⚡ Fatiga (1-10)", style=LABEL_STYLE),
-            dcc.Slider(id="fatiga", min=1, max=10, step=1, value=5, marks={i:str(i) for i in range(1,11)}),
-        ]), style=CARD_STYLE), width=6),
-        dbc.Col(dbc.Card(dbc.CardBody([
-            html.Label("💤 Sueño (1-10)", style=LABEL_STYLE),
-            dcc.Slider(id="suenio", min=1, max=10, step=1, value=7, marks={i:str(i) for i in range(1,11)}),
-        ]), style=CARD_STYLE), width=6),
-    ]),
-    dbc.Row([
-        dbc.Col(dbc.Card(dbc.CardBody([
-            html.Label("🔥 RPE (1-10)", style=LABEL_STYLE),
-            dcc.Slider(id="rpe", min=1, max=10, step=1, value=6, marks={i:str(i) for i in range(1,11)}),
-        ]), style=CARD_STYLE), width=6),
-        dbc.Col(dbc.Card(dbc.CardBody([
-            html.Label("⏱️ Minutos", style=LABEL_STYLE),
-            dbc.Input(id="tiempo_entrenamiento", type="number", value=60, className="text-center bg-dark text-white"),
-        ]), style=CARD_STYLE), width=6),
-    ]),
-    
-    # --- NUEVA SECCIÓN DE SENSOR ECG ---
-    dbc.Card(dbc.CardBody([
-        html.Label("🫀 Sensor de Frecuencia Cardíaca", style=LABEL_STYLE),
-        dcc.Dropdown(
-            id="sensor-file-dropdown",
-            options=[
-                {'label': '❌ Sin Sensor', 'value': 'none'},
-                {'label': '📂 Cargar Simulador (ecg_example.csv)', 'value': 'ecg_example.csv'}
-            ],
-            value='none',
-            placeholder="Seleccionar dispositivo...",
-            className="mb-2"
-        ),
-        # Aquí se mostrará la gráfica del ECG cuando se procese
-        html.Div(id="ecg-graph-container")
-    ]), style=CARD_STYLE),
-    
-    dbc.Button("✅ Registrar Sesión", id="submit-questionnaire", color="primary", className="w-100 rounded-pill")
-])
-
-def get_training_data(paciente):
-    data = get_training_data_for_patient(paciente)
-    layout_config = dict(
-        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
-        font=dict(color="#B0B0B0"), margin=dict(l=40, r=20, t=40, b=40),
-        xaxis=dict(showgrid=True, gridcolor='#333'), yaxis=dict(showgrid=True, gridcolor='#333')
-    )
-
-    if not data:
-        fig = go.Figure()
-        fig.update_layout(**layout_config, title="Registra una sesión para ver datos")
-        return fig
-
-    df = pd.DataFrame(data, columns=["fecha", "carga"])
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=df["fecha"], y=df["carga"], mode="lines+markers", name="Carga",
-        line=dict(color="#4285F4", width=3, shape='spline'), fill='tozeroy',
-        marker=dict(size=6, color="#1E1E1E", line=dict(width=2, color="#4285F4"))
-    ))
-    fig.update_layout(**layout_config, title="Evolución de Carga")
-    return fig
-
-def get_comparison_figure(target_patients=None):
-    data = get_metrics_for_comparison(target_patients)
-    
-    if not data:
-        return go.Figure(layout=dict(title="Sin datos", paper_bgcolor='rgba(0,0,0,0)', font=dict(color="white")))
-
-    names = [p['name'] for p in data]
-    vo2_values = [p['vo2'] for p in data]
-    fcr_values = [p['fcr'] for p in data]
-
-    fig = go.Figure()
-    fig.add_trace(go.Bar(x=names, y=vo2_values, name="VO2 Max", marker_color="#34A853"))
-    fig.add_trace(go.Bar(x=names, y=fcr_values, name="Frec. Reposo", marker_color="#EA4335"))
-
-    fig.update_layout(
-        title="Comparativa", barmode='group',
-        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
-        font=dict(color="white"), yaxis=dict(showgrid=True, gridcolor='#333'),
-        margin=dict(l=40, r=20, t=40, b=40), legend=dict(orientation="h", y=1.1)
-    )
-    return fig
\ No newline at end of file
+import datetime
+import dash_bootstrap_components as dbc
+from dash import html, dcc
+import pandas as pd
+import plotly.graph_objs as go
+from plotly.subplots import make_subplots
+import db
+from db import get_training_load, get_metrics_for_comparison
+from figure_cache import cached_figure, ALL
+from workload import workload_curves, ACWR_LOW, ACWR_OPTIMAL_HIGH
+import team_stats
+
+CARD_STYLE = {
+    "backgroundColor": "#1E1E1E", "border": "1px solid #333",
+    "borderRadius": "12px", "marginBottom": "15px", "boxShadow": "0 4px 6px rgba(0,0,0,0.3)"
+}
+
+LABEL_STYLE = {"color": "#90CAF9", "fontWeight": "600", "marginBottom": "5px"}
+
+questionnaire_layout = html.Div([
+    html.H5("📝 Registro Diario", className="text-white mb-3"),
+    dbc.Row([
+        dbc.Col(dbc.Card(dbc.CardBody([
+            html.Label("⚡ Fatiga (1-10)", style=LABEL_STYLE),
+            dcc.Slider(id="fatiga", min=1, max=10, step=1, value=5, marks={i:str(i) for i in range(1,11)}),
+        ]), style=CARD_STYLE), width=6),
+        dbc.Col(dbc.Card(dbc.CardBody([
+            html.Label("💤 Sueño (1-10)", style=LABEL_STYLE),
+            dcc.Slider(id="suenio", min=1, max=10, step=1, value=7, marks={i:str(i) for i in range(1,11)}),
+        ]), style=CARD_STYLE), width=6),
+    ]),
+    dbc.Row([
+        dbc.Col(dbc.Card(dbc.CardBody([
+            html.Label("🔥 RPE (1-10)", style=LABEL_STYLE),
+            dcc.Slider(id="rpe", min=1, max=10, step=1, value=6, marks={i:str(i) for i in range(1,11)}),
+        ]), style=CARD_STYLE), width=6),
+        dbc.Col(dbc.Card(dbc.CardBody([
+            html.Label("⏱️ Minutos", style=LABEL_STYLE),
+            dbc.Input(id="tiempo_entrenamiento", type="number", value=60, className="text-center bg-dark text-white"),
+        ]), style=CARD_STYLE), width=6),
+    ]),
+    
+    # --- NUEVA SECCIÓN DE SENSOR ECG ---
+    dbc.Card(dbc.CardBody([
+        html.Label("🫀 Sensor de Frecuencia Cardíaca", style=LABEL_STYLE),
+        dcc.Dropdown(
+            id="sensor-file-dropdown",
+            options=[
+                {'label': '❌ Sin Sensor', 'value': 'none'},
+                {'label': '📂 Cargar Simulador (ecg_example.csv)', 'value': 'ecg_example.csv'}
+            ],
+            value='none',
+            placeholder="Seleccionar dispositivo...",
+            className="mb-2"
+        ),
+        # Aquí se mostrará la gráfica del ECG cuando se procese
+        html.Div(id="ecg-graph-container"),
+        # Trabajo de ECG en segundo plano: se sondea hasta que termina
+        dcc.Store(id="ecg-job"), dcc.Interval(id="ecg-job-poll", interval=1000, disabled=True)
+    ]), style=CARD_STYLE),
+    
+    dbc.Button("✅ Registrar Sesión", id="submit-questionnaire", color="primary", className="w-100 rounded-pill")
+])
+
+def get_training_data(paciente, start=None, end=None):
+    # Figura cacheada por atleta y rango; las escrituras en db.py la invalidan. El día
+    # forma parte de la clave porque "sin fin" significa "hasta hoy".
+    kind = f"load:{start}:{end}:{datetime.date.today()}"
+    return cached_figure(db.athlete_db(paciente), kind, [paciente], lambda: _build_training_figure(paciente, start, end))
+
+LOAD_TITLES = {"dia": "diaria", "semana": "semanal", "mes": "mensual"}
+
+def _build_training_figure(paciente, start=None, end=None):
+    bucket, data = get_training_load(paciente, start, end)
+    layout_config = dict(
+        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color="#B0B0B0"), margin=dict(l=40, r=20, t=40, b=40),
+        xaxis=dict(showgrid=True, gridcolor='#333'), yaxis=dict(showgrid=True, gridcolor='#333')
+    )
+
+    if not data:
+        fig = go.Figure()
+        fig.update_layout(**layout_config, title="Registra una sesión para ver datos")
+        return fig
+
+    df = pd.DataFrame(data, columns=["fecha", "carga", "sesiones"])
+    fig = go.Figure()
+    if bucket == "dia":
+        fig.add_trace(go.Scatter(
+            x=df["fecha"], y=df["carga"], mode="lines+markers", name="Carga", customdata=df["sesiones"],
+            line=dict(color="#4285F4", width=3, shape='spline'), fill='tozeroy',
+            marker=dict(size=6, color="#1E1E1E", line=dict(width=2, color="#4285F4")),
+            hovertemplate="%{x}<br>Carga %{y:.0f} (%{customdata} sesiones)<extra></extra>"
+        ))
+    else:
+        # Semanas o meses: barras con la carga total del tramo
+        fig.add_trace(go.Bar(
+            x=df["fecha"], y=df["carga"], name="Carga", customdata=df["sesiones"], marker_color="#4285F4",
+            hovertemplate="%{x}<br>Carga %{y:.0f} (%{customdata} sesiones)<extra></extra>"
+        ))
+    fig.update_layout(**layout_config, title=f"Evolución de Carga ({LOAD_TITLES[bucket]})")
+    if start and end: fig.update_xaxes(range=[start, end])
+    return fig
+
+def get_comparison_figure(target_patients=None):
+    # Un atleta: contra la distribución precalculada de su equipo (team_stats)
+    if target_patients and len(target_patients) == 1:
+        team_stats.ensure_fresh(db.DB_PATH)
+        lookup = team_stats.athlete_vs_team(db.DB_PATH, target_patients[0])
+        if lookup:
+            kind = f"compare-team:{lookup[3]:.0f}"
+            return cached_figure(db.athlete_db(target_patients[0]), kind, target_patients, lambda: _build_team_figure(target_patients[0], *lookup[:3]))
+    athletes = target_patients if target_patients else [ALL]
+    return cached_figure(db.DB_PATH, "compare", athletes, lambda: _build_comparison_figure(target_patients))
+
+TEAM_METRICS = [("vo2", "VO2 Max", "#34A853"), ("fcr", "Frec. Reposo", "#EA4335"), ("carga", "Carga media", "#4285F4"), ("bpm", "BPM medio", "#FBBC05")]
+
+def _build_team_figure(paciente, values, team, labels):
+    # Caja p10-p25-p50-p75-p90 del grupo (ya calculada) y el atleta como un punto encima
+    fig = make_subplots(rows=1, cols=len(TEAM_METRICS), subplot_titles=[t for _, t, _ in TEAM_METRICS])
+    for i, (metrica, title, color) in enumerate(TEAM_METRICS, start=1):
+        st = team.get(metrica)
+        if st:
+            fig.add_trace(go.Box(
+                x=[f"{labels[metrica]} (n={st['n']})"], q1=[st["p25"]], median=[st["p50"]], q3=[st["p75"]],
+                lowerfence=[st["p10"]], upperfence=[st["p90"]], mean=[st["media"]],
+                name=title, marker_color=color, boxpoints=False, showlegend=False
+            ), row=1, col=i)
+        if values.get(metrica):
+            fig.add_trace(go.Scatter(
+                x=[f"{labels[metrica]} (n={st['n']})" if st else "Sin equipo"], y=[values[metrica]], mode="markers",
+                marker=dict(size=14, color="white", symbol="diamond", line=dict(width=2, color=color)),
+                name=paciente, showlegend=(i == 1), hovertemplate=f"{paciente}: %{{y:.1f}}<extra></extra>"
+            ), row=1, col=i)
+    fig.update_layout(
+        title="Comparativa con Equipo (p10-p90)",
+        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color="white"), margin=dict(l=40, r=20, t=60, b=40), legend=dict(orientation="h", y=1.15)
+    )
+    fig.update_yaxes(showgrid=True, gridcolor='#333')
+    return fig
+
+def _build_comparison_figure(target_patients=None):
+    data = get_metrics_for_comparison(target_patients)
+    
+    if not data:
+        return go.Figure(layout=dict(title="Sin datos", paper_bgcolor='rgba(0,0,0,0)', font=dict(color="white")))
+
+    names = [p['name'] for p in data]
+    vo2_values = [p['vo2'] for p in data]
+    fcr_values = [p['fcr'] for p in data]
+
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=names, y=vo2_values, name="VO2 Max", marker_color="#34A853"))
+    fig.add_trace(go.Bar(x=names, y=fcr_values, name="Frec. Reposo", marker_color="#EA4335"))
+
+    fig.update_layout(
+        title="Comparativa", barmode='group',
+        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color="white"), yaxis=dict(showgrid=True, gridcolor='#333'),
+        margin=dict(l=40, r=20, t=40, b=40), legend=dict(orientation="h", y=1.1)
+    )
+    return fig
+
+def get_workload_figure(paciente):
+    # La ventana de workload_curves acaba hoy (los días de descanso también mueven el
+    # EWMA): la fecha va en la clave, como en get_training_data
+    kind = f"acwr:{datetime.date.today()}"
+    return cached_figure(db.athlete_db(paciente), kind, [paciente], lambda: _build_workload_figure(paciente))
+
+def _build_workload_figure(paciente, days=90):
+    curves = workload_curves(db.athlete_db(paciente), [paciente], days=days)
+    layout_config = dict(
+        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color="#B0B0B0"), margin=dict(l=40, r=40, t=40, b=40),
+        xaxis=dict(showgrid=True, gridcolor='#333'), legend=dict(orientation="h", y=1.12)
+    )
+    if not curves["carga"].any():
+        fig = go.Figure()
+        fig.update_layout(**layout_config, title="Sin carga registrada en los últimos días")
+        return fig
+
+    x = curves["dias"]
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=x, y=curves["carga"][0], name="Carga diaria", marker_color="#333F55"))
+    fig.add_trace(go.Scatter(x=x, y=curves["aguda"][0], name="Aguda (7d)", line=dict(color="#FBBC05", width=2)))
+    fig.add_trace(go.Scatter(x=x, y=curves["cronica"][0], name="Crónica (28d)", line=dict(color="#4285F4", width=2)))
+    fig.add_trace(go.Scatter(x=x, y=curves["acwr"][0], name="ACWR", yaxis="y2", line=dict(color="#EA4335", width=2, dash="dot")))
+    # Zona óptima del ACWR sombreada sobre el eje derecho
+    fig.add_hrect(y0=ACWR_LOW, y1=ACWR_OPTIMAL_HIGH, yref="y2", fillcolor="#34A853", opacity=0.08, line_width=0)
+    fig.update_layout(**layout_config, title="Carga aguda:crónica (ACWR)",
+                      yaxis=dict(title="sRPE", showgrid=True, gridcolor='#333'),
+                      yaxis2=dict(title="ACWR", overlaying="y", side="right", range=[0, 2.5], showgrid=False))
+    return fig
@@ -0,0 +1,126 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import db
+import sensors
+from db_pool import fetch_all, transaction
+from ecg_store import ECG_EXT, ensure_binary, read_header
+from hrv import compute_hrv, hr_max_for_age, save_hrv
+
+# Recalcula el BPM (y la HRV) de todas las grabaciones históricas con los
+# parámetros actuales del detector, repartiendo las grabaciones entre todos los
+# núcleos. Reanudable: cada grabación terminada se anota en reprocess_checkpoint
+# bajo un run_id, y al relanzar con el mismo run_id se salta lo ya hecho.
+#
+#   python reprocess.py [--data-dir data] [--distance-s 0.4] [--k 1.0] [--run-id ID] [--workers N]
+
+BATCH_SIZE = 50
+
+
+def discover(data_dir):
+    # Una entrada por grabación: si existen .csv y .ecg con el mismo nombre, gana el .ecg
+    found = {}
+    for root, _, files in os.walk(data_dir):
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if ext not in (".csv", ECG_EXT): continue
+            key = os.path.join(root, stem)
+            if ext == ECG_EXT or key not in found:
+                found[key] = os.path.join(root, name)
+    return sorted(found.values())
+
+
+def _detect(path, params):
+    # En un proceso del pool: devuelve los picos para que el padre calcule bpm/HRV por atleta
+    ecg_path = path if path.endswith(ECG_EXT) else ensure_binary(path)
+    fs = read_header(ecg_path)["fs"]
+    peaks = sensors.detect_peaks(ecg_path, distance=fs * params["distance_s"], k=params["k"], window_seconds=params["window_s"],
+                                 overlap_seconds=params["overlap_s"], chunk_seconds=params["chunk_s"])
+    return path, os.path.abspath(ecg_path), fs, peaks
+
+
+def _sessions_by_recording():
+    # Las grabaciones se enlazan a entrenamientos a través de los trabajos de ECG (que
+    # guardan el atleta: con shards el id de entrenamiento solo vale dentro de su shard)
+    links = {}
+    rows = fetch_all(db.DB_PATH, """
+        SELECT j.ecg_path, j.paciente, j.entrenamiento_id, p.fcr, p.edad FROM ecg_jobs j
+        LEFT JOIN pacientes p ON p.nombre_paciente = j.paciente
+        WHERE j.entrenamiento_id IS NOT NULL
+    """)
+    for ecg_path, paciente, entrenamiento_id, fcr, edad in rows:
+        links.setdefault(os.path.abspath(ecg_path), {})[(paciente, entrenamiento_id)] = (fcr or 60, hr_max_for_age(edad))
+    return links
+
+
+def _flush(run_id, batch, links):
+    # Un lote = una transacción por fichero de atletas (la central o cada shard tocado) y
+    # otra para el checkpoint: pocas sincronizaciones a disco aunque haya miles de ficheros.
+    # El checkpoint va al final: si algo cae antes, el lote se repite sin cambiar el resultado.
+    updates, done = {}, []
+    for path, ecg_path, fs, peaks in batch:
+        rr = np.diff(peaks) / fs
+        bpm = int(60 / np.mean(rr)) if len(rr) and np.mean(rr) > 0 else 0
+        for (paciente, entrenamiento_id), (fcr, hr_max) in links.get(ecg_path, {}).items():
+            updates.setdefault(db.athlete_db(paciente), []).append((entrenamiento_id, bpm, compute_hrv(peaks, fs, fcr=fcr, hr_max=hr_max)))
+        done.append((run_id, os.path.splitext(path)[0], bpm))
+    for shard, rows in updates.items():
+        with transaction(shard) as c:
+            for entrenamiento_id, bpm, metrics in rows:
+                db.set_training_bpm(c, entrenamiento_id, bpm)
+                save_hrv(c, entrenamiento_id, metrics)
+    with transaction(db.DB_PATH) as c:
+        c.executemany("INSERT OR REPLACE INTO reprocess_checkpoint (run_id, ruta, bpm, hecho) VALUES (?, ?, ?, datetime('now'))", done)
+    return sum(len(rows) for rows in updates.values())
+
+
+def reprocess(data_dir="data", distance_s=None, k=None, run_id=None, workers=None):
+    # run_id por defecto: todos los parámetros del detector (los mismos que la clave de ecg_cache),
+    # así cambiar cualquiera de ellos da una ejecución nueva y no se salta nada
+    params = sensors.detector_params(distance_s, k)
+    run_id = run_id or ";".join(f"{name}={value}" for name, value in params.items())
+    workers = workers or os.cpu_count() or 1
+
+    paths = discover(data_dir)
+    done = {r[0] for r in fetch_all(db.DB_PATH, "SELECT ruta FROM reprocess_checkpoint WHERE run_id = ?", (run_id,))}
+    # El checkpoint guarda la ruta sin extensión: el .csv convertido a .ecg sigue contando como hecho
+    pending = [p for p in paths if os.path.splitext(p)[0] not in done]
+    links = _sessions_by_recording()
+    print(f"--- Reproceso '{run_id}': {len(paths)} grabaciones, {len(done)} ya hechas, {len(pending)} pendientes, {workers} procesos ---")
+
+    t0 = time.perf_counter()
+    batch, processed, updated, failed = [], 0, 0, 0
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(_detect, p, params) for p in pending]
+        for future in as_completed(futures):
+            try: batch.append(future.result())
+            except Exception as e:
+                failed += 1
+                print(f"⚠️ Error procesando grabación: {e}")
+                continue
+            processed += 1
+            if len(batch) >= BATCH_SIZE:
+                updated += _flush(run_id, batch, links)
+                batch = []
+    if batch: updated += _flush(run_id, batch, links)
+    wall = time.perf_counter() - t0
+
+    rate = processed / wall if wall > 0 else 0
+    print(f"✅ {processed} grabaciones en {wall:.2f} s ({rate:.1f} ficheros/s), {updated} entrenamientos actualizados, {failed} errores")
+    return {"processed": processed, "updated": updated, "failed": failed, "wall_s": wall, "files_per_s": rate}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recalcula el BPM de todas las grabaciones ECG")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--db", default=db.DB_PATH)
+    parser.add_argument("--distance-s", type=float, default=None, help=f"separación mínima entre picos en s (actual {sensors.PEAK_DISTANCE_S})")
+    parser.add_argument("--k", type=float, default=None, help=f"umbral en desviaciones típicas (actual {sensors.THRESHOLD_K})")
+    parser.add_argument("--run-id", default=None, help="mismo run-id = reanudar una ejecución anterior")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    db.DB_PATH = args.db
+    db.init_db()
+    reprocess(args.data_dir, args.distance_s, args.k, args.run_id, args.workers)
@@ -1,32 +1,198 @@
-import pandas as pd
-import numpy as np
-from scipy.signal import find_peaks, detrend
-
-def load_ecg_and_compute_bpm(filepath, fs=250):
-    try:
-        df = pd.read_csv(filepath)
-        if "ECG" in df.columns:
-            raw_signal = pd.to_numeric(df["ECG"], errors='coerce').fillna(0).values
-        else:
-            raw_signal = pd.to_numeric(df.iloc[:, 0], errors='coerce').fillna(0).values
-
-        if len(raw_signal) < fs:
-            return [], [], 0
-
-        t = np.arange(len(raw_signal)) / fs
-        ecg_clean = detrend(raw_signal)
-        # Umbral adaptativo robusto
-        height_threshold = np.mean(ecg_clean) + 1.0 * np.std(ecg_clean)
-        peaks, _ = find_peaks(ecg_clean, distance=fs/2.5, height=height_threshold)
-
-        if len(peaks) > 1:
-            rr_intervals = np.diff(peaks) / fs
-            avg_rr = np.mean(rr_intervals)
-            bpm = 60 / avg_rr if avg_rr > 0 else 0
-        else:
-            bpm = 0
-
-        return t, ecg_clean, bpm
-    except Exception as e:
-        # En caso de error devolvemos vacío pero no crash
-        return [], [], 0
+import pandas as pd
+import numpy as np
+from scipy.signal import find_peaks, detrend
+from ecg_store import ECG_EXT, open_recording, read_header
+
+# Parámetros del detector de picos R (reprocess.py permite recalcular el histórico al cambiarlos)
+PEAK_DISTANCE_S = 0.4   # separación mínima entre latidos (fs/2.5 -> máx. 150 lpm)
+THRESHOLD_K = 1.0       # umbral = media + k * std
+PEAK_WINDOW_S = 10      # ventana que se detrenda y umbraliza por separado
+PEAK_OVERLAP_S = 2      # solape a cada lado de la ventana
+PEAK_CHUNK_S = 60       # trozo de fichero leído de una vez (un solo trozo = análisis global)
+
+
+def detector_params(distance_s=None, k=None, window_s=None, overlap_s=None, chunk_s=None):
+    # Todo lo que cambia los picos detectados, con los valores actuales por defecto.
+    # ecg_cache.key_for y los run_id de reprocess.py salen de aquí.
+    return {"distance_s": PEAK_DISTANCE_S if distance_s is None else distance_s, "k": THRESHOLD_K if k is None else k,
+            "window_s": PEAK_WINDOW_S if window_s is None else window_s, "overlap_s": PEAK_OVERLAP_S if overlap_s is None else overlap_s,
+            "chunk_s": PEAK_CHUNK_S if chunk_s is None else chunk_s}
+
+
+def load_ecg_and_compute_bpm(filepath, fs=250):
+    try:
+        if str(filepath).endswith(ECG_EXT):
+            # Formato binario: sin parseo de texto, fs viene en la cabecera
+            meta, data = open_recording(filepath)
+            fs = meta["fs"]
+            raw_signal = np.asarray(data, dtype=float) * meta["scale"]
+        else:
+            df = pd.read_csv(filepath)
+            if "ECG" in df.columns:
+                raw_signal = pd.to_numeric(df["ECG"], errors='coerce').fillna(0).values
+            else:
+                raw_signal = pd.to_numeric(df.iloc[:, 0], errors='coerce').fillna(0).values
+
+        if len(raw_signal) < fs:
+            return [], [], 0
+
+        t = np.arange(len(raw_signal)) / fs
+        ecg_clean = detrend(raw_signal)
+        # Umbral adaptativo robusto
+        height_threshold = np.mean(ecg_clean) + THRESHOLD_K * np.std(ecg_clean)
+        peaks, _ = find_peaks(ecg_clean, distance=fs*PEAK_DISTANCE_S, height=height_threshold)
+
+        if len(peaks) > 1:
+            rr_intervals = np.diff(peaks) / fs
+            avg_rr = np.mean(rr_intervals)
+            bpm = 60 / avg_rr if avg_rr > 0 else 0
+        else:
+            bpm = 0
+
+        return t, ecg_clean, bpm
+    except Exception as e:
+        # En caso de error devolvemos vacío pero no crash
+        return [], [], 0
+
+
+# -------------------------------------------------------------------------
+# MODO STREAMING (grabaciones largas)
+# -------------------------------------------------------------------------
+def read_ecg_chunks(filepath, chunk_samples):
+    # Misma selección de columna que load_ecg_and_compute_bpm, pero por bloques
+    if str(filepath).endswith(ECG_EXT):
+        meta, data = open_recording(filepath)
+        for i in range(0, len(data), chunk_samples):
+            yield np.asarray(data[i:i + chunk_samples], dtype=float) * meta["scale"]
+        return
+    for df in pd.read_csv(filepath, chunksize=chunk_samples):
+        col = df["ECG"] if "ECG" in df.columns else df.iloc[:, 0]
+        yield pd.to_numeric(col, errors='coerce').fillna(0).to_numpy(dtype=float)
+
+
+class PeakDetector:
+    # Detector de picos R incremental: se le van dando muestras con feed() y
+    # devuelve los picos ya confirmados (índices absolutos desde la primera
+    # muestra). Analiza ventanas de window_seconds (+ solape a cada lado) que se
+    # detrendan y umbralizan por separado (media + k*std local), así la deriva
+    # de línea base no afecta. Los picos del último tramo de solape se posponen a
+    # la ventana siguiente, que los ve con contexto a ambos lados. La memoria
+    # queda acotada a una ventana más lo que llegue en cada feed(): el búfer está
+    # preasignado y feed() solo copia las muestras nuevas (con paquetes pequeños de
+    # live_ingest no se recopia la ventana entera en cada uno).
+    def __init__(self, fs=250, window_seconds=None, overlap_seconds=None, distance=None, k=None):
+        self.fs = fs
+        self.distance = distance or fs * PEAK_DISTANCE_S
+        self.k = THRESHOLD_K if k is None else k
+        self.window = int((PEAK_WINDOW_S if window_seconds is None else window_seconds) * fs)
+        self.overlap = int((PEAK_OVERLAP_S if overlap_seconds is None else overlap_seconds) * fs)
+        self._store = np.empty(self.window + 2 * self.overlap)
+        self._n = 0
+        self.start = 0
+        self.emit_from = 0
+        self.last_peak = None
+
+    @property
+    def buf(self):
+        # Muestras pendientes (vista sobre el búfer preasignado)
+        return self._store[:self._n]
+
+    @buf.setter
+    def buf(self, samples):
+        self._store = np.array(samples, dtype=float)
+        self._n = len(self._store)
+
+    @property
+    def n_samples(self):
+        return self.start + self._n
+
+    def _process(self, seg_end, last):
+        clean = detrend(self.buf[:seg_end])
+        height_threshold = np.mean(clean) + self.k * np.std(clean)
+        peaks, _ = find_peaks(clean, distance=self.distance, height=height_threshold)
+        peaks = peaks + self.start
+        limit = self.start + seg_end if last else self.start + seg_end - self.overlap
+        peaks = peaks[(peaks >= self.emit_from) & (peaks < limit)]
+        # find_peaks ya separa los picos de la ventana; solo el primero puede
+        # quedar demasiado cerca del último pico emitido en la ventana anterior
+        if len(peaks) and self.last_peak is not None and peaks[0] - self.last_peak < self.distance:
+            peaks = peaks[1:]
+        if len(peaks): self.last_peak = peaks[-1]
+        self.emit_from = limit
+        consumed = max(0, seg_end - 2 * self.overlap)
+        # Se mueve al principio solo lo que queda (una vez por ventana, no por feed)
+        rest = self._n - consumed
+        self._store[:rest] = self._store[consumed:self._n]
+        self._n, self.start = rest, self.start + consumed
+        return peaks
+
+    def feed(self, samples):
+        samples = np.asarray(samples, dtype=float)
+        if self._n + len(samples) > len(self._store):
+            grown = np.empty(max(2 * len(self._store), self._n + len(samples)))
+            grown[:self._n] = self._store[:self._n]
+            self._store = grown
+        self._store[self._n:self._n + len(samples)] = samples
+        self._n += len(samples)
+        found = []
+        while self._n >= self.window + 2 * self.overlap:
+            found.append(self._process(self.window + 2 * self.overlap, last=False))
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def finish(self):
+        # Fin de la señal: analiza lo que queda en el búfer sin esperar más contexto
+        if self._n == 0: return np.empty(0, dtype=np.int64)
+        return self._process(self._n, last=True)
+
+
+def iter_peak_blocks(filepath, fs=250, chunk_seconds=None, window_seconds=None, overlap_seconds=None, distance=None, k=None):
+    # Genera arrays de índices de picos R confirmados, bloque a bloque, leyendo el
+    # fichero en trozos de chunk_seconds (memoria acotada, ver PeakDetector)
+    if str(filepath).endswith(ECG_EXT): fs = read_header(filepath)["fs"]
+    detector = PeakDetector(fs, window_seconds, overlap_seconds, distance, k)
+    chunks = read_ecg_chunks(filepath, int((PEAK_CHUNK_S if chunk_seconds is None else chunk_seconds) * fs))
+    nxt = next(chunks, None)
+    blocks = 0
+    while nxt is not None:
+        cur, nxt = nxt, next(chunks, None)
+        blocks += 1
+        if nxt is None:
+            if detector.n_samples + len(cur) < fs: return
+            if blocks == 1:
+                # Fichero corto: un único análisis global, idéntico a load_ecg_and_compute_bpm
+                detector.buf = np.asarray(cur, dtype=float)
+                yield detector.finish()
+                return
+        peaks = detector.feed(cur)
+        if len(peaks): yield peaks
+    yield detector.finish()
+
+
+def iter_beats(filepath, fs=250, **kwargs):
+    # Genera (indice_muestra, rr_segundos) latido a latido; rr es None en el primero
+    if str(filepath).endswith(ECG_EXT): fs = read_header(filepath)["fs"]
+    last_peak = None
+    for peaks in iter_peak_blocks(filepath, fs=fs, **kwargs):
+        for p in peaks:
+            yield int(p), ((p - last_peak) / fs if last_peak is not None else None)
+            last_peak = p
+
+
+def detect_peaks(filepath, fs=250, **kwargs):
+    # Todos los picos R de la grabación como un único array (para análisis vectorizado)
+    blocks = list(iter_peak_blocks(filepath, fs=fs, **kwargs))
+    return np.concatenate(blocks).astype(np.int64) if blocks else np.empty(0, dtype=np.int64)
+
+
+def stream_ecg_bpm(filepath, fs=250, **kwargs):
+    # BPM medio sin cargar el fichero entero: 60 / media(RR)
+    try:
+        n_rr, sum_rr = 0, 0.0
+        for _, rr in iter_beats(filepath, fs=fs, **kwargs):
+            if rr is None: continue
+            n_rr += 1
+            sum_rr += rr
+        avg_rr = sum_rr / n_rr if n_rr else 0
+        return 60 / avg_rr if avg_rr > 0 else 0
+    except Exception as e:
+        return 0
@@ -0,0 +1,236 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote, unquote
+import pandas as pd
+from db_pool import fetch_one, fetch_all, get_pool, transaction
+from figure_cache import ALL
+
+# Reparto de los datos de actividad por entrenador: cada entrenador (entrenador_asociado)
+# tiene su propio SQLite con los cuestionarios, entrenamientos y agregados de sus atletas,
+# así que las escrituras de plantillas distintas no hacen cola tras el mismo lock de
+# escritura. La base central (db.DB_PATH) sigue guardando usuarios, el directorio de
+# pacientes (que dice a qué shard va cada atleta), los trabajos de ECG y team_stats.
+# Sin DB_SHARDS_DIR no hay shards y todo va a la base central, como siempre.
+#
+#   python shards.py split [--db database.db] [--dir data/shards] [--legacy entrenadores.db] [--keep]
+SHARDS_DIR = os.environ.get("DB_SHARDS_DIR") or None
+# Entrenador de los corredores sin asignar (db.UNASSIGNED_COACH): su shard recibe
+# también a cualquier atleta que no esté en pacientes
+DEFAULT_COACH = "Auto"
+# Tablas que viven en los shards; cache_versions se queda además en la central (ALL, perfiles)
+SHARDED_TABLES = ["cuestionarios", "entrenamientos", "hrv_metricas", "athlete_stats", "carga_diaria", "carga_ewma", "cache_versions"]
+# Límite de bases adjuntas por conexión de SQLite (SQLITE_MAX_ATTACHED por defecto)
+MAX_ATTACHED = 10
+
+_ready = set()
+_lock = threading.Lock()
+
+
+# shards_dir=None en todas las funciones: el directorio configurado (DB_SHARDS_DIR).
+# split() y las herramientas pasan el suyo sin tocar la configuración del proceso.
+def _dir(shards_dir):
+    return SHARDS_DIR if shards_dir is None else shards_dir
+
+
+def enabled(shards_dir=None):
+    return _dir(shards_dir) is not None
+
+
+def shard_path(coach, shards_dir=None):
+    # El nombre del fichero es el del entrenador escapado: reversible y sin separadores
+    return os.path.join(_dir(shards_dir), quote(coach or DEFAULT_COACH, safe="") + ".db")
+
+
+def ensure(path):
+    # Mismo esquema que la central (migrations.py), creado la primera vez que se usa
+    if (path, os.getpid()) not in _ready:
+        with _lock:
+            if (path, os.getpid()) not in _ready:
+                # Aquí y no arriba: migrations importa módulos que importan este
+                from migrations import migrate
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                migrate(path)
+                _ready.add((path, os.getpid()))
+    return path
+
+
+def coach_of(central, paciente):
+    # Se lee cada vez (búsqueda por clave única): sin caché no hay que invalidar nada
+    # cuando otro proceso da de alta o reasigna al atleta. Sin alta: los no asignados.
+    row = fetch_one(central, "SELECT entrenador_asociado FROM pacientes WHERE nombre_paciente = ?", (paciente,))
+    return row[0] if row and row[0] else DEFAULT_COACH
+
+
+def path_for(central, paciente, shards_dir=None):
+    if not enabled(shards_dir): return central
+    return ensure(shard_path(coach_of(central, paciente), shards_dir))
+
+
+def group_by_shard(central, athletes, shards_dir=None):
+    # {ruta: [atletas]} conservando el orden de llegada; una consulta por bloque de atletas
+    athletes = list(dict.fromkeys(athletes))
+    if not enabled(shards_dir): return {central: athletes} if athletes else {}
+    coaches = {}
+    for i in range(0, len(athletes), 500):
+        part = athletes[i:i + 500]
+        coaches.update(fetch_all(central, f"SELECT nombre_paciente, entrenador_asociado FROM pacientes WHERE nombre_paciente IN ({', '.join('?' for _ in part)})", part))
+    groups = {}
+    for paciente in athletes:
+        groups.setdefault(ensure(shard_path(coaches.get(paciente) or DEFAULT_COACH, shards_dir)), []).append(paciente)
+    return groups
+
+
+def all_coaches(central, shards_dir=None):
+    # Entrenadores con atletas y shards ya creados (puede haber datos de atletas sin alta)
+    coaches = {r[0] or DEFAULT_COACH for r in fetch_all(central, "SELECT DISTINCT entrenador_asociado FROM pacientes")}
+    shards_dir = _dir(shards_dir)
+    if shards_dir and os.path.isdir(shards_dir):
+        coaches |= {unquote(name[:-3]) for name in os.listdir(shards_dir) if name.endswith(".db")}
+    return sorted(coaches)
+
+
+@contextmanager
+def attached(central, paths):
+    # Conexión del pool de la central con los shards adjuntos como s0, s1...; fuera de
+    # transacción (ATTACH no se admite dentro) y desadjuntados al devolverla al pool
+    with get_pool(central).connection() as conn:
+        aliases = []
+        try:
+            for path in paths:
+                alias = f"s{len(aliases)}"
+                conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+                aliases.append(alias)
+            yield conn, aliases
+        finally:
+            for alias in aliases: conn.execute(f"DETACH DATABASE {alias}")
+
+
+def union(aliases, table, index=None):
+    # La tabla de todos los shards adjuntos como una sola (UNION ALL); el INDEXED BY va en cada rama
+    hint = f" INDEXED BY {index}" if index else ""
+    return "(" + " UNION ALL ".join(f"SELECT * FROM {alias}.{table}{hint}" for alias in aliases) + ")"
+
+
+def fetch_across(central, coaches, build, shards_dir=None):
+    # Consulta que cruza entrenadores. build(tabla, entrenadores) -> (sql, params), donde
+    # tabla(nombre, índice=None) da el texto a poner en el FROM y entrenadores es el grupo
+    # cuyos atletas debe devolver esa consulta (None = todos, solo sin shards). Con shards
+    # se lanza una consulta por grupo de hasta MAX_ATTACHED shards adjuntos.
+    if not enabled(shards_dir):
+        return fetch_all(central, *build(lambda name, index=None: f"{name} INDEXED BY {index}" if index else name, coaches))
+    coaches = all_coaches(central, shards_dir) if coaches is None else list(dict.fromkeys(c or DEFAULT_COACH for c in coaches))
+    rows = []
+    for i in range(0, len(coaches), MAX_ATTACHED):
+        group = coaches[i:i + MAX_ATTACHED]
+        with attached(central, [ensure(shard_path(c, shards_dir)) for c in group]) as (conn, aliases):
+            rows += conn.execute(*build(lambda name, index=None: union(aliases, name, index), group)).fetchall()
+    return rows
+
+
+def import_legacy(central, legacy, shards_dir=None):
+    # entrenadores.db (esquema antiguo: users, patients, patient_info, entrenamientos)
+    # -> tablas de la central. Lo que ya exista (usuario, paciente) no se toca.
+    src = sqlite3.connect(f"file:{legacy}?mode=ro", uri=True)
+    try:
+        users = src.execute("SELECT username, password FROM users").fetchall()
+        patients = src.execute("SELECT p.name, p.trainer, i.full_name, i.edad, i.peso, i.altura FROM patients p "
+                               "LEFT JOIN patient_info i ON i.patient = p.name").fetchall()
+        trainings = src.execute("SELECT patient, fecha, duracion, fatiga, rpe, notas FROM entrenamientos").fetchall()
+    finally:
+        src.close()
+    with transaction(central) as c:
+        # En el esquema antiguo los usuarios son los entrenadores
+        c.executemany("INSERT OR IGNORE INTO users (username, password, role) VALUES (?, ?, 'entrenador')", users)
+        new_users = c.rowcount
+        c.executemany("INSERT OR IGNORE INTO pacientes (username, nombre_paciente, entrenador_asociado, full_name, edad, peso, altura, equipo, deporte, fcr, vo2) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, 'Sin Equipo', 'General', 60, 45)",
+                      [(name, name, trainer or DEFAULT_COACH, full_name or name, edad or 0, peso or 0, altura or 0)
+                       for name, trainer, full_name, edad, peso, altura in patients])
+        new_patients = c.rowcount
+    # Los entrenamientos entran por bulk.ingest: deduplicación por (paciente, fecha) y agregados
+    import bulk
+    df = pd.DataFrame(trainings, columns=["paciente", "fecha_inicio", "duracion", "fatiga", "rpe", "comentarios_especialista"])
+    stats = bulk.ingest(central, [df], "entrenamientos", shards_dir=shards_dir) if trainings else {"entrenamientos": {"insertadas": 0}}
+    return {"usuarios": new_users, "pacientes": new_patients, "entrenamientos": stats["entrenamientos"]["insertadas"]}
+
+
+def _copy_shard(central, coach, shards_dir, keep=False):
+    # Filas de los atletas del entrenador: central -> su shard, con los mismos id (ecg_jobs
+    # sigue apuntando a su entrenamiento). Repetible: lo ya copiado se ignora.
+    path = ensure(shard_path(coach, shards_dir))
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    moved = {}
+    try:
+        conn.execute("ATTACH DATABASE ? AS central", (central,))
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("CREATE TEMP TABLE atletas AS SELECT DISTINCT paciente FROM (SELECT paciente FROM central.cuestionarios UNION "
+                     "SELECT paciente FROM central.entrenamientos UNION SELECT paciente FROM central.cache_versions UNION "
+                     "SELECT nombre_paciente FROM central.pacientes) "
+                     "WHERE paciente IS NOT ? AND COALESCE((SELECT NULLIF(entrenador_asociado, '') FROM central.pacientes WHERE nombre_paciente = paciente), ?) = ?",
+                     (ALL, DEFAULT_COACH, coach))
+        for table in SHARDED_TABLES:
+            where = ("entrenamiento_id IN (SELECT id FROM central.entrenamientos WHERE paciente IN temp.atletas)" if table == "hrv_metricas"
+                     else "paciente IN temp.atletas")
+            moved[table] = conn.execute(f"INSERT OR IGNORE INTO main.{table} SELECT * FROM central.{table} WHERE {where}").rowcount
+        conn.execute("COMMIT")
+        if not keep:
+            # Solo tras confirmar la copia; hrv antes que entrenamientos (se localiza por su id).
+            # cache_versions se queda también en la central: ahí suben los cambios de perfil.
+            conn.execute("BEGIN IMMEDIATE")
+            for table in ["hrv_metricas", *[t for t in SHARDED_TABLES if t not in ("hrv_metricas", "cache_versions")]]:
+                where = ("entrenamiento_id IN (SELECT id FROM central.entrenamientos WHERE paciente IN temp.atletas)" if table == "hrv_metricas"
+                         else "paciente IN temp.atletas")
+                conn.execute(f"DELETE FROM central.{table} WHERE {where}")
+            conn.execute("COMMIT")
+        conn.execute("DROP TABLE temp.atletas")
+        conn.execute("DETACH DATABASE central")
+    finally:
+        conn.close()
+    return path, moved
+
+
+def split(central, shards_dir, legacy=None, keep=False):
+    # Reparte la central existente en un shard por entrenador y después importa el legado
+    # directamente a los shards (así, al repetirlo, se deduplica contra lo ya repartido)
+    from migrations import migrate
+    import team_stats
+    migrate(central)
+    # Pacientes sin entrenador: al shard de los no asignados, igual que los enruta coach_of
+    with transaction(central) as c:
+        c.execute("UPDATE pacientes SET entrenador_asociado = ? WHERE entrenador_asociado IS NULL OR entrenador_asociado = ''", (DEFAULT_COACH,))
+    report = {"shards": {}}
+    for coach in all_coaches(central, shards_dir) or [DEFAULT_COACH]:
+        report["shards"][coach] = _copy_shard(central, coach, shards_dir, keep)
+    # Filas que no han ido a ningún shard (p. ej. cuestionarios sin paciente)
+    tables = [t for t in SHARDED_TABLES if t != "cache_versions"]
+    counts = {} if keep else {t: fetch_one(central, f"SELECT COUNT(*) FROM {t}")[0] for t in tables}
+    report["pendientes"] = {t: n for t, n in counts.items() if n}
+    report["legado"] = import_legacy(central, legacy, shards_dir) if legacy and os.path.exists(legacy) else None
+    team_stats.refresh_db(central, shards_dir)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reparte la base de datos en un shard por entrenador")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sp = sub.add_parser("split")
+    sp.add_argument("--db", default="database.db")
+    sp.add_argument("--dir", default=os.path.join("data", "shards"))
+    sp.add_argument("--legacy", default="entrenadores.db", help="base antigua a importar a los shards (si existe)")
+    sp.add_argument("--keep", action="store_true", help="no borrar de la central las filas ya copiadas")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    report = split(args.db, args.dir, args.legacy, args.keep)
+    if report["legado"]: print(f"Legado {args.legacy}: {report['legado']}")
+    for coach, (path, moved) in report["shards"].items():
+        print(f"{coach:<20} {path}  {', '.join(f'{t}={n}' for t, n in moved.items() if n)}")
+    for table, n in report["pendientes"].items():
+        print(f"⚠️ {table}: {n} filas siguen en la central")
+    print(f"✅ {len(report['shards'])} shards en {time.perf_counter() - t0:.2f} s. Para usarlos: DB_SHARDS_DIR={args.dir}")
+    sys.exit(1 if report["pendientes"] else 0)
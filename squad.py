@@ -0,0 +1,76 @@
+import datetime
+import numpy as np
+from shards import fetch_across
+from workload import A_ACUTE, A_CHRONIC, ACUTE_DAYS, daily_matrix, weekly_monotony, risk_flag
+
+# Vista de plantilla: los KPIs de todos los atletas salen de una única consulta sobre
+# las tablas materializadas (athlete_stats, carga_ewma, carga_diaria). El coste no
+# depende del histórico de cada atleta, solo del número de atletas. Sin estadísticas el
+# planificador prefiere recorrer carga_diaria por la PK para el GROUP BY; INDEXED BY
+# fuerza el índice por día, que solo lee las últimas SPARK_DAYS filas de cada atleta.
+# Las tablas de actividad van entre llaves: con shards son la unión de los adjuntos.
+SPARK_DAYS = 28
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+_OVERVIEW_SQL = """
+    SELECT p.nombre_paciente, p.full_name, p.equipo,
+           s.sum_fatiga / NULLIF(s.n_fatiga, 0), s.sum_rpe / NULLIF(s.n_rpe, 0),
+           s.sum_suenio / NULLIF(s.n_suenio, 0), s.sum_bpm / NULLIF(s.n_bpm, 0), s.n_carga,
+           w.dia, w.aguda, w.cronica, d.serie
+    FROM pacientes p
+    LEFT JOIN {athlete_stats} s ON s.paciente = p.nombre_paciente
+    LEFT JOIN {carga_ewma} w ON w.paciente = p.nombre_paciente
+    LEFT JOIN (SELECT paciente, group_concat(dia || '=' || carga, ';') AS serie
+               FROM {carga_diaria} WHERE dia >= ? GROUP BY paciente) d ON d.paciente = p.nombre_paciente
+    {where}
+    ORDER BY p.nombre_paciente
+"""
+
+
+def sparklines(m):
+    # Una cadena de bloques por fila, escalada al máximo de cada fila
+    top = m.max(axis=1, keepdims=True) if m.size else np.zeros((len(m), 1))
+    idx = np.divide(m, top, out=np.zeros_like(m), where=top > 0) * (len(SPARK_CHARS) - 1)
+    chars = np.array(list(SPARK_CHARS))[idx.round().astype(int)]
+    return ["".join(row) for row in chars]
+
+
+def squad_overview(path, coaches=None, today=None):
+    # Una fila por atleta lista para dash_table; coaches = entrenadores asociados
+    # visibles (db.coach_scope), None = todos los pacientes
+    today = today or datetime.date.today()
+    since = (today - datetime.timedelta(days=SPARK_DAYS - 1)).isoformat()
+
+
+    def build(table, coaches):
+        tables = dict(athlete_stats=table("athlete_stats"), carga_ewma=table("carga_ewma"),
+                      carga_diaria=table("carga_diaria", "idx_carga_diaria_dia"))
+        if coaches is None: return _OVERVIEW_SQL.format(where="", **tables), (since,)
+        marks = ", ".join("?" for _ in coaches)
+        return _OVERVIEW_SQL.format(where=f"WHERE p.entrenador_asociado IN ({marks})", **tables), (since, *coaches)
+
+    # Con shards llega una tanda de filas por grupo de entrenadores: se reordena aquí
+    rows = sorted(fetch_across(path, coaches, build), key=lambda r: r[0])
+    if not rows: return []
+
+    names = [r[0] for r in rows]
+    # Serie diaria de los últimos SPARK_DAYS días de todos los atletas como una matriz
+    series = [(r[0], dia, float(carga)) for r in rows if r[11] for dia, carga in (x.split("=") for x in r[11].split(";"))]
+    m = daily_matrix(series, names, today, SPARK_DAYS)[0]
+    monotony, _ = weekly_monotony(m)
+    last_day = [r[8] for r in rows]
+    gap = np.array([max(0, (today - datetime.date.fromisoformat(d)).days) if d else 0 for d in last_day])
+    aguda = np.array([r[9] or 0.0 for r in rows]) * (1 - A_ACUTE) ** gap
+    cronica = np.array([r[10] or 0.0 for r in rows]) * (1 - A_CHRONIC) ** gap
+    acwr = np.divide(aguda, cronica, out=np.zeros_like(aguda), where=cronica > 0)
+    week = m[:, -ACUTE_DAYS:].sum(axis=1)
+    trend = sparklines(m)
+
+    r1 = lambda v: round(v, 1) if v is not None else None
+    return [{
+        "id": r[0], "atleta": r[1] or r[0], "equipo": r[2] or "",
+        "fatiga": r1(r[3]), "rpe": r1(r[4]), "suenio": r1(r[5]), "bpm": int(r[6]) if r[6] else None,
+        "sesiones": r[7] or 0, "ultima": last_day[i] or "",
+        "carga_7d": int(week[i]), "acwr": round(float(acwr[i]), 2), "monotonia": round(float(monotony[i]), 2),
+        "riesgo": risk_flag(acwr[i], monotony[i], cronica[i]), "tendencia": trend[i],
+    } for i, r in enumerate(rows)]
@@ -0,0 +1,134 @@
+import os
+import sys
+import threading
+import time
+import pandas as pd
+from db_pool import fetch_one, fetch_all, transaction
+import shards
+
+# Percentiles y medias por equipo y por deporte de VO2, FCR, carga media y BPM medio.
+# Se recalcula de vez en cuando (no en cada escritura) con una sola pasada por
+# pacientes + athlete_stats; la comparativa de un atleta lee solo las filas de su
+# grupo, así que el coste por render no depende del tamaño de la plantilla. Con shards,
+# athlete_stats es la unión de los shards adjuntos a la central (shards.fetch_across).
+METRICS = ["vo2", "fcr", "carga", "bpm"]
+PERCENTILES = [10, 25, 50, 75, 90]
+# Grupos con menos atletas no son representativos: se cae al deporte y luego a todos
+MIN_GROUP = 3
+ALL_GROUP = "*"
+MAX_AGE_S = int(os.environ.get("TEAM_STATS_MAX_AGE", 900))
+
+_PCT_COLS = [f"p{p}" for p in PERCENTILES]
+CREATE_SQL = "CREATE TABLE IF NOT EXISTS team_stats (tipo TEXT NOT NULL, grupo TEXT NOT NULL, metrica TEXT NOT NULL, n INTEGER, media REAL, " + \
+    ", ".join(f"{col} REAL" for col in _PCT_COLS) + ", actualizado REAL, PRIMARY KEY (tipo, grupo, metrica))"
+
+_SOURCE_SQL = """
+    SELECT p.equipo, p.deporte, CAST(p.vo2 AS REAL), CAST(p.fcr AS REAL),
+           s.sum_carga / NULLIF(s.n_carga, 0), s.sum_bpm / NULLIF(s.n_bpm, 0)
+    FROM pacientes p LEFT JOIN {athlete_stats} s ON s.paciente = p.nombre_paciente
+"""
+
+
+def compute(rows):
+    # Filas de _SOURCE_SQL -> filas de team_stats, agrupando con pandas en bloque
+    df = pd.DataFrame(rows, columns=["equipo", "deporte", *METRICS])
+    df[METRICS] = df[METRICS].apply(pd.to_numeric, errors="coerce")
+    df["todos"] = ALL_GROUP
+    long = df.melt(id_vars=["equipo", "deporte", "todos"], value_vars=METRICS, var_name="metrica", value_name="valor")
+    # 0 en vo2/fcr es "sin rellenar" (altas por defecto), no un valor real
+    long = long[long["valor"].notna() & (long["valor"] > 0)]
+    out = []
+    for tipo in ("equipo", "deporte", "todos"):
+        part = long[long[tipo].notna()]
+        if part.empty: continue
+        g = part.groupby([tipo, "metrica"])["valor"]
+        agg = g.agg(["count", "mean"]).join(g.quantile([p / 100 for p in PERCENTILES]).unstack())
+        for (grupo, metrica), r in agg.iterrows():
+            out.append((tipo, str(grupo), metrica, int(r["count"]), float(r["mean"]), *[float(r[p / 100]) for p in PERCENTILES]))
+    return out
+
+
+def _source_rows(path, where="", params=(), coaches=None, shards_dir=None):
+    # Filas de _SOURCE_SQL leyendo athlete_stats de donde esté (central o shards)
+    def build(table, group):
+        cond = [where] if where else []
+        if group is not None: cond.append(f"p.entrenador_asociado IN ({', '.join('?' for _ in group)})")
+        sql = _SOURCE_SQL.format(athlete_stats=table("athlete_stats")) + (" WHERE " + " AND ".join(cond) if cond else "")
+        return sql, (*params, *(group or ()))
+    return shards.fetch_across(path, coaches, build, shards_dir)
+
+
+def refresh(c, rows=None):
+    # Dentro de una transacción (migración o refresh_db); rows = filas ya leídas de los shards
+    c.execute(CREATE_SQL)
+    if rows is None: rows = c.execute(_SOURCE_SQL.format(athlete_stats="athlete_stats")).fetchall()
+    rows = compute(rows)
+    c.execute("DELETE FROM team_stats")
+    marks = ", ".join("?" for _ in range(5 + len(PERCENTILES)))
+    c.executemany(f"INSERT INTO team_stats (tipo, grupo, metrica, n, media, {', '.join(_PCT_COLS)}, actualizado) VALUES ({marks}, ?)",
+                  [(*r, time.time()) for r in rows])
+    return len(rows)
+
+
+_refresh_lock = threading.Lock()
+# Último refresco hecho por este proceso, por ruta: con team_stats vacía (sin atletas,
+# shard nuevo) la tabla no dice cuándo se recalculó y cada render volvería a hacerlo
+_refreshed = {}
+
+
+def refresh_db(path, shards_dir=None):
+    # ATTACH no se puede dentro de una transacción: con shards se lee antes de abrirla
+    rows = _source_rows(path, shards_dir=shards_dir) if shards.enabled(shards_dir) else None
+    with transaction(path) as c: n = refresh(c, rows)
+    _refreshed[path] = time.time()
+    return n
+
+
+def ensure_fresh(path, max_age=None):
+    # Recalcula si la tabla es más vieja que max_age; un solo hilo lo hace, el resto
+    # sigue leyendo los percentiles anteriores mientras tanto
+    max_age = MAX_AGE_S if max_age is None else max_age
+    last = _refreshed.get(path)
+    if last is None:
+        # Recién arrancado: vale el refresco de otro worker o del cron si lo hubo
+        row = fetch_one(path, "SELECT MIN(actualizado) FROM team_stats")
+        last = row[0] if row and row[0] else 0
+    if time.time() - last < max_age: return False
+    if not _refresh_lock.acquire(blocking=False): return False
+    try: refresh_db(path)
+    finally: _refresh_lock.release()
+    return True
+
+
+def athlete_vs_team(path, paciente):
+    # (valores del atleta, {metrica: fila de percentiles}, nombre del grupo, actualizado).
+    # Dos búsquedas por clave: el atleta y las filas de sus grupos.
+    coaches = [shards.coach_of(path, paciente)] if shards.enabled() else None
+    me = next(iter(_source_rows(path, "p.nombre_paciente = ?", (paciente,), coaches)), None)
+    if not me: return None
+    equipo, deporte, values = me[0], me[1], dict(zip(METRICS, me[2:]))
+    rows = fetch_all(path, f"SELECT tipo, grupo, metrica, n, media, {', '.join(_PCT_COLS)}, actualizado FROM team_stats "
+                           "WHERE (tipo = 'equipo' AND grupo = ?) OR (tipo = 'deporte' AND grupo = ?) OR tipo = 'todos'",
+                     (str(equipo), str(deporte)))
+    groups = {}
+    for r in rows:
+        groups.setdefault((r[0], r[1]), {})[r[2]] = dict(zip(["n", "media", *_PCT_COLS], r[3:-1]))
+    # Por métrica, el grupo más concreto que tenga suficientes atletas
+    team, labels = {}, {}
+    for metrica in METRICS:
+        for key, label in ((("equipo", str(equipo)), equipo), (("deporte", str(deporte)), deporte), (("todos", ALL_GROUP), "Todos")):
+            stats = groups.get(key, {}).get(metrica)
+            if stats and stats["n"] >= MIN_GROUP:
+                team[metrica], labels[metrica] = stats, label
+                break
+    updated = max((r[-1] for r in rows), default=0)
+    return values, team, labels, updated
+
+
+if __name__ == "__main__":
+    # python team_stats.py [ruta.db]   (para cron: recalcula ya)
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    path = args[0] if args else "database.db"
+    t0 = time.perf_counter()
+    n = refresh_db(path)
+    print(f"✅ team_stats: {n} filas en {(time.perf_counter() - t0) * 1000:.0f} ms")
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from db_pool import close_pools
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    # Base vacía con todas las migraciones aplicadas
+    import migrations
+    path = str(tmp_path / "test.db")
+    migrations.migrate(path)
+    yield path
+    close_pools()
+
+
+@pytest.fixture
+def app_db(db_path, monkeypatch):
+    # db.py apuntando a la base de prueba, sin shards ni figuras de otros tests
+    import db
+    import figure_cache
+    import shards
+    monkeypatch.setattr(db, "DB_PATH", db_path)
+    monkeypatch.setattr(shards, "SHARDS_DIR", None)
+    figure_cache._cache.clear()
+    return db_path
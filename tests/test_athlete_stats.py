@@ -0,0 +1,41 @@
+import athlete_stats
+import db
+from db_pool import fetch_one, transaction
+
+
+def _averages(path, paciente):
+    return fetch_one(path, "SELECT AVG(fatiga), AVG(rpe), AVG(suenio), AVG(rpe * tiempo_entrenamiento) FROM cuestionarios WHERE paciente = ?", (paciente,))
+
+
+def test_no_drift_after_save_edit_and_delete(app_db):
+    db.save_questionnaire_for_patient("a", "a", 5, 7, 6, 60)
+    db.save_questionnaire_for_patient("a", "a", 3, None, 8, 45)
+    db.save_questionnaire_for_patient("b", "b", 9, 4, 2, 30)
+    ids = [db.guardar_entrenamiento("a", 60, 5, 7, bpm) for bpm in (0, 150, 130)]
+    assert athlete_stats.verify(app_db) == []
+    stats = athlete_stats.get_stats(app_db, "a")
+    assert (stats["sum_fatiga"] / stats["n_fatiga"], stats["sum_suenio"] / stats["n_suenio"]) == _averages(app_db, "a")[::2]
+    assert stats["n_bpm"] == 2
+
+    # Edición: el bpm que llega del análisis de ECG, en los dos sentidos
+    with transaction(app_db) as c:
+        db.set_training_bpm(c, ids[0], 140)
+        db.set_training_bpm(c, ids[1], 0)
+    assert athlete_stats.verify(app_db) == []
+    assert athlete_stats.get_stats(app_db, "a")["sum_bpm"] == 270
+
+    # Borrado: se descuenta la fila antes de quitarla
+    with transaction(app_db) as c:
+        row_id = c.execute("SELECT MIN(id) FROM cuestionarios WHERE paciente = 'a'").fetchone()[0]
+        athlete_stats.apply_questionnaire(c, row_id, "-")
+        c.execute("DELETE FROM cuestionarios WHERE id = ?", (row_id,))
+        athlete_stats.apply_training(c, ids[2], "-")
+        c.execute("DELETE FROM entrenamientos WHERE id = ?", (ids[2],))
+    assert athlete_stats.verify(app_db) == []
+    assert db.get_patient_averages("a")["fatiga"] == 3
+
+
+def test_verify_reports_drift(app_db):
+    db.save_questionnaire_for_patient("a", "a", 5, 7, 6, 60)
+    with transaction(app_db) as c: c.execute("UPDATE athlete_stats SET sum_rpe = sum_rpe + 1")
+    assert [d[:2] for d in athlete_stats.verify(app_db)] == [("a", "sum_rpe")]
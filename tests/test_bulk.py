@@ -0,0 +1,101 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import athlete_stats
+import bulk
+import workload
+from db_pool import fetch_all, fetch_one, transaction
+
+
+def _sessions(n=60, athletes=("a", "b", "c"), seed=0):
+    rng = np.random.default_rng(seed)
+    t0 = datetime.datetime(2026, 1, 1, 8)
+    return pd.DataFrame([{"paciente": p, "fecha": (t0 + datetime.timedelta(days=int(d), hours=int(h))).isoformat(),
+                          "fatiga": int(rng.integers(1, 11)), "suenio": int(rng.integers(1, 11)),
+                          "rpe": int(rng.integers(1, 11)), "tiempo_entrenamiento": int(rng.integers(20, 120)), "bpm": 140}
+                         for p in athletes for d, h in zip(rng.choice(90, n, replace=False), rng.integers(0, 12, n))])
+
+
+def _count(path, table):
+    return fetch_one(path, f"SELECT COUNT(*) FROM {table}")[0]
+
+
+def _ingest(path, df, size=25):
+    return bulk.ingest(path, (df.iloc[i:i + size] for i in range(0, len(df), size)), "sesiones", coach="coach1")
+
+
+def test_dedup_on_athlete_and_date(db_path):
+    df = _sessions(20)
+    # Repetida en otro bloque, repetida en el mismo bloque y la misma fecha escrita de otra forma
+    dup = pd.concat([df, df.iloc[:5], df.iloc[[0]].assign(fecha=lambda d: d["fecha"].str.replace("T", " "))], ignore_index=True)
+    stats = _ingest(db_path, dup, size=1000)
+    assert stats["cuestionarios"] == {"leidas": len(dup), "insertadas": len(df), "duplicadas": 6, "rechazadas": 0}
+    assert _count(db_path, "cuestionarios") == _count(db_path, "entrenamientos") == len(df)
+    assert stats["atletas_nuevos"] == 3
+    # Las que ya estaban en la tabla también se descartan (bloques pequeños)
+    stats = _ingest(db_path, dup, size=7)
+    assert stats["cuestionarios"]["insertadas"] == 0 and stats["atletas_nuevos"] == 0
+    assert fetch_all(db_path, "SELECT paciente, fecha, COUNT(*) FROM cuestionarios GROUP BY 1, 2 HAVING COUNT(*) > 1") == []
+
+
+def test_reimport_same_file(db_path, tmp_path):
+    path = tmp_path / "sesiones.csv"
+    _sessions(40).to_csv(path, index=False)
+    first = bulk.ingest(db_path, bulk.read_chunks(path, size=30), "sesiones", coach="coach1")
+    before = fetch_all(db_path, "SELECT * FROM athlete_stats ORDER BY paciente"), fetch_all(db_path, "SELECT * FROM carga_ewma ORDER BY paciente")
+    again = bulk.ingest(db_path, bulk.read_chunks(path, size=30), "sesiones", coach="coach1")
+    assert first["cuestionarios"]["insertadas"] == 120
+    assert again["cuestionarios"] == {"leidas": 120, "insertadas": 0, "duplicadas": 120, "rechazadas": 0}
+    assert again["entrenamientos"]["insertadas"] == 0
+    assert (fetch_all(db_path, "SELECT * FROM athlete_stats ORDER BY paciente"), fetch_all(db_path, "SELECT * FROM carga_ewma ORDER BY paciente")) == before
+
+
+def test_no_drift_after_bulk_import(db_path):
+    # Con cuestionarios ya guardados uno a uno y un segundo lote con fechas atrasadas
+    with transaction(db_path) as c:
+        c.execute("INSERT INTO cuestionarios (paciente, username, fecha, fatiga, suenio, rpe, tiempo_entrenamiento) VALUES ('a', 'a', '2026-05-01 08:00:00', 5, 5, 7, 60)")
+        athlete_stats.apply_questionnaire(c, c.lastrowid)
+        workload.apply_questionnaire(c, c.lastrowid)
+    _ingest(db_path, _sessions(50, seed=1))
+    _ingest(db_path, _sessions(50, seed=2))
+    assert athlete_stats.verify(db_path) == []
+    assert workload.verify(db_path) == []
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_export_import_roundtrip(db_path, tmp_path, fmt):
+    _ingest(db_path, _sessions(30))
+    copy = str(tmp_path / "copia.db")
+    import migrations
+    migrations.migrate(copy)
+    for table in bulk.TABLES:
+        out = tmp_path / f"{table}.{fmt}"
+        assert bulk.export(db_path, table, str(out)) == 90
+        stats = bulk.ingest(copy, bulk.read_chunks(out), table, coach="coach1")
+        assert stats[table]["insertadas"] == 90
+        # normalize ordena cada bloque por (paciente, fecha): los id no se conservan
+        sql = f"SELECT {', '.join(bulk.TABLES[table]['cols'])} FROM {table} ORDER BY paciente, {bulk.TABLES[table]['fecha']}"
+        assert fetch_all(copy, sql) == fetch_all(db_path, sql)
+    assert athlete_stats.verify(copy) == [] and workload.verify(copy) == []
+
+
+def test_ewma_closed_form_matches_daily_loop(db_path):
+    _ingest(db_path, _sessions(40))
+    with transaction(db_path) as c:
+        for paciente in ("a", "b", "c"):
+            rows = c.execute("SELECT dia, carga FROM carga_diaria WHERE paciente = ? ORDER BY dia", (paciente,)).fetchall()
+            # Recursión día a día, incluidos los días sin carga
+            carga = dict(rows)
+            day, last = datetime.date.fromisoformat(rows[0][0]), datetime.date.fromisoformat(rows[-1][0])
+            aguda = cronica = 0.0
+            while day <= last:
+                x = carga.get(day.isoformat(), 0.0)
+                aguda = workload.A_ACUTE * x + (1 - workload.A_ACUTE) * aguda
+                cronica = workload.A_CHRONIC * x + (1 - workload.A_CHRONIC) * cronica
+                day += datetime.timedelta(days=1)
+            dia, a, cr = workload._ewma_state(c, paciente)
+            assert dia == rows[-1][0]
+            assert (a, cr) == pytest.approx((aguda, cronica), rel=1e-9)
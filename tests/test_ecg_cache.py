@@ -0,0 +1,20 @@
+import pytest
+
+import ecg_cache
+import sensors
+import synthetic
+from db_pool import close_pools
+
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    monkeypatch.setattr(ecg_cache, "CACHE_PATH", str(tmp_path / "ecg_cache.db"))
+    yield synthetic.write_ecg(str(tmp_path / "r.ecg"), synthetic.synthetic_ecg(30), 250)
+    close_pools()
+
+
+@pytest.mark.parametrize("name", ["PEAK_DISTANCE_S", "THRESHOLD_K", "PEAK_WINDOW_S", "PEAK_OVERLAP_S", "PEAK_CHUNK_S"])
+def test_key_changes_with_detector_defaults(recording, monkeypatch, name):
+    before = ecg_cache.key_for(recording, 250)
+    monkeypatch.setattr(sensors, name, getattr(sensors, name) * 2)
+    assert ecg_cache.key_for(recording, 250) != before
@@ -0,0 +1,48 @@
+import os
+
+import numpy as np
+import pytest
+
+import ecg_downsample
+import synthetic
+from ecg_store import open_recording
+
+FS = 250
+
+
+@pytest.fixture(scope="module")
+def recording(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("ecg") / "r.ecg")
+    synthetic.write_ecg(path, synthetic.synthetic_ecg(1800, FS, noise=0.2), FS)
+    meta, data = open_recording(path)
+    return path, np.asarray(data, dtype=np.float32) * np.float32(meta["scale"])
+
+
+@pytest.mark.parametrize("t_start, t_end, max_points", [(None, None, 3000), (100, 400, 2000), (1234.5, 1300.2, 500), (10, 12, 3000)])
+def test_trace_is_min_max_envelope_of_raw(recording, t_start, t_end, max_points):
+    path, raw = recording
+    t, y = ecg_downsample.get_trace(path, t_start, t_end, max_points)
+    assert len(y) <= max_points + 4
+    i0 = 0 if t_start is None else int(t_start * FS)
+    i1 = len(raw) if t_end is None else int(np.ceil(t_end * FS))
+    if i1 - i0 <= max_points:
+        # Tramo pequeño: muestras crudas
+        assert np.allclose(y, raw[i0:i1])
+        return
+    # Pares (mínimo, máximo) por cubo, con el tamaño de cubo que se deduce del eje de tiempos
+    size = int(round((t[2] - t[0]) * FS))
+    starts = np.round(t[::2] * FS).astype(int)
+    lo, hi = y[::2], y[1::2]
+    assert np.array_equal(lo, [raw[s:s + size].min() for s in starts])
+    assert np.array_equal(hi, [raw[s:s + size].max() for s in starts])
+    # El tramo pedido queda cubierto y los picos R no se pierden
+    assert starts[0] <= i0 and starts[-1] + size >= i1
+    assert hi.max() == raw[starts[0]:starts[-1] + size].max()
+
+
+def test_zoom_does_not_leak_file_handles(recording):
+    path, _ = recording
+    ecg_downsample.get_trace(path, 0, 600)
+    before = len(os.listdir("/proc/self/fd"))
+    for i in range(50): ecg_downsample.get_trace(path, i, 600 + i)
+    assert len(os.listdir("/proc/self/fd")) == before
@@ -0,0 +1,49 @@
+import plotly.graph_objs as go
+import pytest
+
+import db
+import figure_cache
+from db_pool import fetch_all, transaction
+
+
+def _versions(path):
+    return dict(fetch_all(path, "SELECT paciente, version FROM cache_versions"))
+
+
+@pytest.mark.parametrize("write, bumped", [
+    (lambda: db.save_questionnaire_for_patient("a", "a", 5, 7, 6, 60), {"a"}),
+    (lambda: db.guardar_entrenamiento("a", 60, 5, 7, 140), {"a"}),
+    (lambda: db.save_patient_info("a", "Ana", 30, 60, 170, "Club", "Running", "x", "ES", 55, 50), {"a", figure_cache.ALL}),
+    (lambda: db.create_patient("coach"), {figure_cache.ALL}),
+])
+def test_writes_bump_cache_versions(app_db, write, bumped):
+    with transaction(app_db) as c: c.execute("INSERT INTO pacientes (nombre_paciente, entrenador_asociado) VALUES ('a', 'coach')")
+    before = _versions(app_db)
+    write()
+    after = _versions(app_db)
+    assert {p for p in after if after[p] != before.get(p)} == bumped
+
+
+def test_set_training_bpm_bumps_version(app_db):
+    training = db.guardar_entrenamiento("a", 60, 5, 7)
+    before = _versions(app_db)["a"]
+    with transaction(app_db) as c: db.set_training_bpm(c, training, 150)
+    assert _versions(app_db)["a"] == before + 1
+
+
+def test_stale_figure_not_served(app_db):
+    builds = []
+
+    def build():
+        builds.append(db.count_sessions("a"))
+        return go.Figure(go.Bar(y=[builds[-1]]))
+
+    get = lambda: figure_cache.cached_figure(app_db, "test", ["a"], build)
+    db.save_questionnaire_for_patient("a", "a", 5, 7, 6, 60)
+    assert get() == get() and builds == [1]
+    db.save_questionnaire_for_patient("a", "a", 5, 7, 6, 60)
+    assert get()["data"][0]["y"] == [2] and builds == [1, 2]
+    # Escritura de otro worker: no invalida la caché local, pero la versión en la BD cambia la clave
+    with transaction(app_db) as c: c.execute("UPDATE cache_versions SET version = version + 1 WHERE paciente = 'a'")
+    get()
+    assert builds == [1, 2, 2]
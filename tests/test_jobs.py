@@ -0,0 +1,68 @@
+import time
+
+import db
+import jobs
+from db_pool import transaction
+
+
+def _enqueue(path, pacientes, ecg_path="no_existe.ecg"):
+    with transaction(path) as c:
+        for p in pacientes:
+            c.execute("INSERT INTO ecg_jobs (paciente, ecg_path) VALUES (?, ?)", (p, ecg_path))
+
+
+def test_claim_is_round_robin_between_athletes(db_path):
+    # Atletas de dos entrenadores: el primero encola una ráfaga antes que el segundo
+    with transaction(db_path) as c:
+        c.execute("INSERT INTO pacientes (nombre_paciente, entrenador_asociado) VALUES ('a', 'coach_a'), ('b', 'coach_b')")
+    _enqueue(db_path, ["a", "a", "a", "b", "b"])
+    order = []
+    for _ in range(5):
+        with transaction(db_path) as c:
+            order.append(c.execute(jobs._CLAIM_SQL).fetchone()[2])
+    assert order == ["a", "b", "a", "b", "a"]
+    with transaction(db_path) as c:
+        assert c.execute(jobs._CLAIM_SQL).fetchone() is None
+
+
+def test_failed_job_keeps_error(db_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", db_path)
+    _enqueue(db_path, ["a"])
+    runner = jobs.JobRunner(max_workers=1).start()
+    try:
+        deadline = time.time() + 60
+        while (job := jobs.get_job(1))["estado"] in ("pendiente", "en_curso") and time.time() < deadline:
+            time.sleep(0.1)
+    finally:
+        runner.stop()
+    assert job["estado"] == "error"
+    assert "no_existe.ecg" in job["error"]
+
+
+def test_requeue_only_expired_leases(db_path):
+    # Un análisis largo de otro worker vivo (lease renovado) no se reencola aunque empezara hace mucho
+    with transaction(db_path) as c:
+        c.execute("INSERT INTO ecg_jobs (paciente, ecg_path, estado, iniciado, lease_hasta) VALUES "
+                  "('vivo', 'x.ecg', 'en_curso', datetime('now', '-2 hours'), strftime('%Y-%m-%d %H:%M:%f', 'now', '+30 seconds')), "
+                  "('caido', 'x.ecg', 'en_curso', datetime('now', '-2 minutes'), strftime('%Y-%m-%d %H:%M:%f', 'now', '-1 seconds')), "
+                  "('antiguo', 'x.ecg', 'en_curso', datetime('now', '-2 hours'), NULL)")
+    assert jobs.requeue_stale(db_path) == 2
+    with transaction(db_path) as c:
+        states = dict(c.execute("SELECT paciente, estado FROM ecg_jobs").fetchall())
+    assert states == {"vivo": "en_curso", "caido": "pendiente", "antiguo": "pendiente"}
+
+
+def test_heartbeat_renews_running_leases(db_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", db_path)
+    _enqueue(db_path, ["a", "b"])
+    with transaction(db_path) as c:
+        claimed = [c.execute(jobs._CLAIM_SQL).fetchone()[0] for _ in range(2)]
+        c.execute("UPDATE ecg_jobs SET lease_hasta = strftime('%Y-%m-%d %H:%M:%f', 'now', '+1 seconds')")
+    runner = jobs.JobRunner(max_workers=2)
+    runner._running.add(claimed[0])
+    time.sleep(1.1)
+    runner._heartbeat()
+    with transaction(db_path) as c:
+        states = dict(c.execute("SELECT id, estado FROM ecg_jobs").fetchall())
+    # El de este proceso sigue en curso; el otro nadie lo renovó y vuelve a la cola
+    assert states == {claimed[0]: "en_curso", claimed[1]: "pendiente"}
@@ -0,0 +1,97 @@
+import struct
+import time
+
+import numpy as np
+import pytest
+
+from db_pool import close_pools
+import live_buffer
+import live_ingest
+
+
+def _payload(frame):
+    return frame[4:]
+
+
+def test_unpack_roundtrip():
+    athlete, fs, seq, samples = live_ingest.unpack_payload(_payload(live_ingest.pack_frame("ana", 250, 7, [1.0, 2.0])))
+    assert (athlete, fs, seq, samples.tolist()) == ("ana", 250, 7, [1.0, 2.0])
+
+
+@pytest.mark.parametrize("payload", [
+    b"",
+    b"\x09ab",                                              # nombre más largo que la trama
+    b"\x01a" + struct.pack("<HI", 250, 1) + b"\x00",        # muestras no múltiplo de 4
+    b"\x01\xff" + struct.pack("<HI", 250, 1),               # nombre que no es utf-8
+    _payload(live_ingest.pack_frame("ana", 0, 1, [0.0])),   # fs fuera de rango
+    _payload(live_ingest.pack_frame("ana", 5000, 1, [0.0])),
+])
+def test_unpack_rejects_malformed(payload):
+    with pytest.raises(ValueError):
+        live_ingest.unpack_payload(payload)
+
+
+def test_hub_evicts_least_recent_stream():
+    hub = live_ingest.LiveHub(max_streams=2)
+    hub.ingest("a", 250, 0, np.zeros(10))
+    time.sleep(0.01)
+    hub.ingest("b", 250, 0, np.zeros(10))
+    time.sleep(0.01)
+    hub.ingest("a", 250, 1, np.zeros(10))
+    hub.ingest("c", 250, 0, np.zeros(10))
+    assert sorted(hub.streams) == ["a", "c"] and hub.evicted == 1
+    # Cambiar fs de un atleta existente no cuenta como atleta nuevo
+    hub.ingest("c", 500, 1, np.zeros(10))
+    assert sorted(hub.streams) == ["a", "c"] and hub.evicted == 1
+
+
+def test_views_copy_near_overwrite():
+    ring = live_buffer.SampleRing(100)
+    ring.append(np.arange(250))
+    # Lector al día: vistas sobre el propio búfer
+    start, parts = ring.views(240)
+    assert start == 240 and parts[0].base is ring.data
+    # Lector casi una capacidad por detrás: la próxima escritura pisaría el tramo
+    start, parts = ring.views(150)
+    ring.append(np.full(30, -1))
+    assert start == 150 and np.concatenate(parts).tolist() == list(range(150, 250))
+    assert all(p.base is not ring.data for p in parts)
+
+
+def test_views_match_since():
+    ring = live_buffer.SampleRing(64)
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        ring.append(rng.normal(size=rng.integers(1, 40)))
+        index = ring.total - int(rng.integers(0, 80))
+        start, parts = ring.views(index)
+        assert (start, np.concatenate(parts).tolist()) == (ring.since(index)[0], ring.since(index)[1].tolist())
+
+
+@pytest.fixture
+def dash_app(tmp_path, monkeypatch):
+    # app migra database.db en el directorio actual al importarse
+    monkeypatch.chdir(tmp_path)
+    import app
+    hub = live_ingest.LiveHub()
+    monkeypatch.setattr(app, "live_hub", hub)
+    yield app, hub
+    close_pools()
+
+
+def test_live_tick_resets_cursor_on_new_stream(dash_app):
+    app, hub = dash_app
+    fs = 100
+    hub.ingest("ana", fs, 0, np.zeros(60 * fs))
+    data, cursor, _ = app.live_tick(1, {"athlete": "ana", "index": None})
+    assert cursor["index"] == 60 * fs
+    # Cambia la fs: el hub crea otro stream y su índice vuelve a empezar
+    hub.ingest("ana", 2 * fs, 0, np.ones(3 * fs))
+    data, cursor, _ = app.live_tick(2, cursor)
+    (x, y), traces, max_points = (data[0]["x"][0], data[0]["y"][0]), data[1], data[2]
+    assert cursor == {"athlete": "ana", "stream": hub.get("ana").id, "index": 3 * fs}
+    assert len(y) == 3 * fs and max_points == 3 * fs and x[0] == 0
+    # Siguiente tick normal: solo lo nuevo, con la ventana completa en el navegador
+    hub.ingest("ana", 2 * fs, 1, np.ones(fs))
+    data, cursor, _ = app.live_tick(3, cursor)
+    assert len(data[0]["y"][0]) == fs and data[2] == app.LIVE_WINDOW_S * 2 * fs
@@ -0,0 +1,24 @@
+import pytest
+
+import migrations
+from db_pool import close_pools
+
+
+@pytest.fixture(scope="module")
+def populated_db(tmp_path_factory):
+    # Con datos y estadísticas el planificador puede elegir otro plan que con tablas vacías
+    import synthetic
+    path = str(tmp_path_factory.mktemp("plans") / "poblada.db")
+    synthetic.populate(path, coaches=3, athletes=30, years=0.2)
+    yield path
+    close_pools()
+
+
+def test_migrations_reach_last_version(db_path):
+    assert migrations.current_version(db_path) == migrations.MIGRATIONS[-1][0]
+
+
+@pytest.mark.parametrize("sql, expected", migrations.QUERY_PLAN_EXPECTATIONS, ids=[e[1] for e in migrations.QUERY_PLAN_EXPECTATIONS])
+def test_query_plan_uses_index(db_path, populated_db, sql, expected):
+    for path in (db_path, populated_db):
+        assert migrations.check_query_plans(path, [(sql, expected)]) == []
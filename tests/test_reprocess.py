@@ -0,0 +1,39 @@
+import db
+import reprocess
+import sensors
+import synthetic
+from db_pool import fetch_all, transaction
+
+
+def _setup(app_db, tmp_path, n=4):
+    data = tmp_path / "data"
+    data.mkdir()
+    for i in range(n):
+        path = synthetic.write_ecg(str(data / f"r{i}.ecg"), synthetic.synthetic_ecg(30, bpm=60 + 10 * i, seed=i), 250)
+        training = db.guardar_entrenamiento(f"a{i}", 30, 5, 5)
+        with transaction(app_db) as c:
+            c.execute("INSERT INTO ecg_jobs (paciente, entrenamiento_id, ecg_path, estado) VALUES (?, ?, ?, 'hecho')", (f"a{i}", training, path))
+    return str(data)
+
+
+def test_resume_skips_done_recordings(app_db, tmp_path):
+    data = _setup(app_db, tmp_path)
+    first = reprocess.reprocess(data, workers=1)
+    assert (first["processed"], first["updated"]) == (4, 4)
+    bpms = [r[0] for r in fetch_all(app_db, "SELECT bpm FROM entrenamientos ORDER BY id")]
+    assert bpms == [int(sensors.stream_ecg_bpm(f"{data}/r{i}.ecg")) for i in range(4)]
+    # Relanzar con los mismos parámetros no repite nada
+    assert reprocess.reprocess(data, workers=1)["processed"] == 0
+    # Ejecución interrumpida: solo lo que falta en el checkpoint
+    with transaction(app_db) as c:
+        c.execute("DELETE FROM reprocess_checkpoint WHERE ruta LIKE '%r1' OR ruta LIKE '%r3'")
+    assert reprocess.reprocess(data, workers=1)["processed"] == 2
+
+
+def test_any_detector_parameter_starts_new_run(app_db, tmp_path, monkeypatch):
+    data = _setup(app_db, tmp_path, n=2)
+    assert reprocess.reprocess(data, workers=1)["processed"] == 2
+    for name, value in (("PEAK_WINDOW_S", 8), ("PEAK_OVERLAP_S", 1), ("PEAK_CHUNK_S", 20), ("THRESHOLD_K", 1.2)):
+        monkeypatch.setattr(sensors, name, value)
+        assert reprocess.reprocess(data, workers=1)["processed"] == 2
+    assert len({r[0] for r in fetch_all(app_db, "SELECT run_id FROM reprocess_checkpoint")}) == 5
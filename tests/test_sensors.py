@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from scipy.signal import detrend, find_peaks
+
+import sensors
+import synthetic
+
+FS, BPM = 250, 72
+
+
+def _global_peaks(signal):
+    # La detección de load_ecg_and_compute_bpm sobre la señal entera
+    clean = detrend(np.asarray(signal, dtype=float))
+    return find_peaks(clean, distance=FS * sensors.PEAK_DISTANCE_S, height=np.mean(clean) + sensors.THRESHOLD_K * np.std(clean))[0]
+
+
+@pytest.fixture(params=[".csv", ".ecg"])
+def ext(request):
+    return request.param
+
+
+def test_short_file_matches_global_analysis(tmp_path, ext):
+    # Menos de un trozo: un único análisis global, igual que load_ecg_and_compute_bpm
+    signal = synthetic.synthetic_ecg(40, FS, BPM)
+    path = synthetic.write_ecg(str(tmp_path / f"corto{ext}"), signal, FS)
+    _, _, bpm = sensors.load_ecg_and_compute_bpm(path, FS)
+    assert abs(bpm - BPM) < 2
+    assert sensors.stream_ecg_bpm(path, FS) == pytest.approx(bpm, rel=1e-9)
+    assert np.array_equal(sensors.detect_peaks(path, FS), _global_peaks(np.loadtxt(path, skiprows=1) if ext == ".csv" else signal))
+
+
+@pytest.mark.parametrize("chunk_seconds", [7, 60])
+def test_windowed_detection_across_chunks(tmp_path, ext, chunk_seconds):
+    # Trozos que no coinciden con las ventanas: ni picos duplicados ni perdidos en los solapes
+    seconds = 300
+    signal = synthetic.synthetic_ecg(seconds, FS, BPM, noise=0.02)
+    path = synthetic.write_ecg(str(tmp_path / f"largo{ext}"), signal, FS)
+    peaks = sensors.detect_peaks(path, FS, chunk_seconds=chunk_seconds)
+    expected = _global_peaks(signal)
+    assert len(peaks) == len(expected)
+    assert np.max(np.abs(peaks - expected)) <= 1
+    assert np.min(np.diff(peaks)) >= FS * sensors.PEAK_DISTANCE_S
+    assert sensors.stream_ecg_bpm(path, FS, chunk_seconds=chunk_seconds) == pytest.approx(BPM, abs=2)
+
+
+def test_small_feeds_match_file_detection(tmp_path):
+    # Paquetes pequeños como los de live_ingest: mismos picos que leyendo el fichero
+    signal = synthetic.synthetic_ecg(120, FS, BPM)
+    path = synthetic.write_ecg(str(tmp_path / "r.ecg"), signal, FS)
+    detector = sensors.PeakDetector(FS)
+    rng = np.random.default_rng(0)
+    cuts = np.cumsum(rng.integers(1, 40, len(signal)))
+    cuts = cuts[cuts < len(signal)]
+    fed = [detector.feed(part) for part in np.split(signal, cuts)] + [detector.finish()]
+    assert np.array_equal(np.concatenate(fed), sensors.detect_peaks(path, FS, chunk_seconds=30))
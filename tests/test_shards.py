@@ -0,0 +1,113 @@
+import datetime
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import bulk
+import db
+import shards
+import squad
+import synthetic
+import team_stats
+from db_pool import close_pools, fetch_all, fetch_one
+
+TODAY = datetime.date(2026, 6, 1)
+
+
+def _legacy(path, trainings):
+    # entrenadores.db con el esquema antiguo
+    c = sqlite3.connect(path)
+    c.executescript("""
+        CREATE TABLE users (username TEXT PRIMARY KEY, password TEXT);
+        CREATE TABLE patients (name TEXT PRIMARY KEY, trainer TEXT);
+        CREATE TABLE patient_info (patient TEXT PRIMARY KEY, full_name TEXT, edad INTEGER, peso REAL, altura REAL);
+        CREATE TABLE entrenamientos (id INTEGER PRIMARY KEY AUTOINCREMENT, patient TEXT, fecha TEXT, duracion INTEGER, fatiga INTEGER, rpe INTEGER, notas TEXT);
+    """)
+    c.executemany("INSERT INTO users VALUES (?, ?)", [("viejo", "x"), ("coach_1", "x")])
+    c.executemany("INSERT INTO patients VALUES (?, ?)", [("ana", "viejo"), ("runner_1", "coach_1"), ("sin_entrenador", None)])
+    c.execute("INSERT INTO patient_info VALUES ('ana', 'Ana Pérez', 30, 60, 170)")
+    c.executemany("INSERT INTO entrenamientos (patient, fecha, duracion, fatiga, rpe, notas) VALUES (?, ?, 45, 5, 6, 'ok')", trainings)
+    c.commit()
+    c.close()
+
+
+@pytest.fixture
+def populated(tmp_path, monkeypatch):
+    central = str(tmp_path / "central.db")
+    synthetic.populate(central, coaches=4, athletes=24, years=0.2, today=TODAY)
+    monkeypatch.setattr(db, "DB_PATH", central)
+    monkeypatch.setattr(shards, "SHARDS_DIR", None)
+    monkeypatch.setattr(team_stats, "_refreshed", {})
+    yield central, str(tmp_path / "shards")
+    close_pools()
+
+
+def _snapshot(central):
+    team_stats.refresh_db(central)
+    return {
+        "overview": squad.squad_overview(central, None, TODAY),
+        "coach_1": squad.squad_overview(central, db.coach_scope("coach_1", "entrenador"), TODAY),
+        "team_stats": fetch_all(central, "SELECT tipo, grupo, metrica, n, media, p10, p50, p90 FROM team_stats ORDER BY 1, 2, 3"),
+        "vs_team": [team_stats.athlete_vs_team(central, synthetic.athlete_name(i))[:3] for i in (0, 7, 13)],
+    }
+
+
+def test_split_is_repeatable_and_dedups_legacy(populated, tmp_path):
+    central, shards_dir = populated
+    legacy = str(tmp_path / "entrenadores.db")
+    _legacy(legacy, [("ana", "2020-01-01 10:00:00"), ("ana", "2020-01-01 10:00:00"), ("runner_1", "2020-01-02 09:00:00"), ("sin_entrenador", "2020-01-03 09:00:00")])
+    before = fetch_one(central, "SELECT COUNT(*) FROM cuestionarios")[0]
+    report = shards.split(central, shards_dir, legacy)
+    # La configuración del proceso no cambia: split solo usa el directorio que recibe
+    assert shards.SHARDS_DIR is None
+    assert report["pendientes"] == {}
+    assert report["legado"] == {"usuarios": 1, "pacientes": 2, "entrenamientos": 3}
+    assert fetch_one(central, "SELECT COUNT(*) FROM cuestionarios")[0] == 0
+    assert sum(fetch_one(os.path.join(shards_dir, f), "SELECT COUNT(*) FROM cuestionarios")[0] for f in os.listdir(shards_dir) if f.endswith(".db")) == before
+    # Legado en el shard de su entrenador (o en el de los no asignados)
+    assert fetch_one(shards.shard_path("viejo", shards_dir), "SELECT COUNT(*) FROM entrenamientos WHERE paciente = 'ana'")[0] == 1
+    assert fetch_one(shards.shard_path(shards.DEFAULT_COACH, shards_dir), "SELECT COUNT(*) FROM entrenamientos WHERE paciente = 'sin_entrenador'")[0] == 1
+
+    again = shards.split(central, shards_dir, legacy)
+    assert again["legado"] == {"usuarios": 0, "pacientes": 0, "entrenamientos": 0}
+    assert all(not any(moved.values()) for _, moved in again["shards"].values())
+
+
+def test_routing_follows_the_athletes_coach(populated, monkeypatch):
+    central, shards_dir = populated
+    shards.split(central, shards_dir)
+    monkeypatch.setattr(shards, "SHARDS_DIR", shards_dir)
+    athlete = synthetic.athlete_name(5)
+    coach = shards.coach_of(central, athlete)
+    count = lambda path: fetch_one(path, "SELECT COUNT(*) FROM cuestionarios WHERE paciente = ?", (athlete,))[0]
+    n = count(shards.shard_path(coach))
+    db.save_questionnaire_for_patient(athlete, athlete, 5, 6, 7, 60)
+    assert db.athlete_db(athlete) == shards.shard_path(coach)
+    assert count(shards.shard_path(coach)) == n + 1 and count(central) == 0
+
+    # Alta nueva de un entrenador y atletas nuevos por importación masiva
+    new = db.create_patient("coach_2")
+    db.save_questionnaire_for_patient(new, new, 5, 6, 7, 60)
+    assert db.athlete_db(new) == shards.shard_path("coach_2") and db.count_sessions(new) == 1
+    df = pd.DataFrame({"paciente": ["nuevo_a", athlete], "fecha": ["2020-01-01 10:00:00"] * 2, "rpe": [5, 5], "tiempo_entrenamiento": [30, 30]})
+    bulk.ingest(central, [df], "cuestionarios", coach="coach_3")
+    assert fetch_one(shards.shard_path("coach_3"), "SELECT COUNT(*) FROM cuestionarios WHERE paciente = 'nuevo_a'")[0] == 1
+    assert count(shards.shard_path(coach)) == n + 2
+
+    # Sin caché: un atleta reasignado (aquí a mano) se enruta ya a su nuevo shard
+    with sqlite3.connect(central) as c: c.execute("UPDATE pacientes SET entrenador_asociado = 'coach_0' WHERE nombre_paciente = 'nuevo_a'")
+    assert db.athlete_db("nuevo_a") == shards.shard_path("coach_0")
+    assert db.by_shard([athlete, "nuevo_a", "desconocido"]) == {
+        shards.shard_path(coach): [athlete], shards.shard_path("coach_0"): ["nuevo_a"], shards.shard_path(shards.DEFAULT_COACH): ["desconocido"]}
+
+
+def test_squad_views_match_with_and_without_shards(populated, monkeypatch):
+    central, shards_dir = populated
+    before = _snapshot(central)
+    shards.split(central, shards_dir)
+    monkeypatch.setattr(shards, "SHARDS_DIR", shards_dir)
+    after = _snapshot(central)
+    for key in before:
+        assert after[key] == before[key], key
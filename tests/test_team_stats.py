@@ -0,0 +1,13 @@
+import team_stats
+
+
+def test_empty_team_stats_refreshes_once(db_path, monkeypatch):
+    # Sin atletas team_stats queda vacía: no debe recalcularse en cada render
+    calls = []
+    refresh_db = team_stats.refresh_db
+    monkeypatch.setattr(team_stats, "_refreshed", {})
+    monkeypatch.setattr(team_stats, "refresh_db", lambda path: calls.append(path) or refresh_db(path))
+    assert team_stats.ensure_fresh(db_path, max_age=60)
+    assert not team_stats.ensure_fresh(db_path, max_age=60)
+    assert len(calls) == 1
+    assert team_stats.ensure_fresh(db_path, max_age=0)
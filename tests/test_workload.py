@@ -0,0 +1,35 @@
+import pytest
+
+import workload
+from db_pool import fetch_all, transaction
+
+
+def _save(path, paciente, fecha, rpe, minutos):
+    with transaction(path) as c:
+        c.execute("INSERT INTO cuestionarios (paciente, username, fecha, fatiga, suenio, rpe, tiempo_entrenamiento) VALUES (?, ?, ?, 5, 5, ?, ?)",
+                  (paciente, paciente, fecha, rpe, minutos))
+        workload.apply_questionnaire(c, c.lastrowid)
+
+
+def _tables(path):
+    return (fetch_all(path, "SELECT paciente, dia, carga, sesiones FROM carga_diaria ORDER BY paciente, dia"),
+            fetch_all(path, "SELECT paciente, dia, aguda, cronica FROM carga_ewma ORDER BY paciente"))
+
+
+def test_incremental_matches_rebuild(db_path):
+    # Primer día, otra sesión el mismo día, huecos sin carga y una fecha atrasada
+    for paciente, fecha, rpe, minutos in [
+        ("a", "2026-03-01 08:00:00", 6, 60), ("a", "2026-03-01 18:00:00", 4, 30),
+        ("a", "2026-03-02 09:00:00", 8, 90), ("a", "2026-03-20 09:00:00", 5, 45),
+        ("b", "2026-03-05 10:00:00", 7, 50), ("a", "2026-03-10 09:00:00", 9, 120),
+        ("b", "2026-04-30 10:00:00", 3, 20), ("a", "2026-03-21 07:00:00", 6, 0),
+    ]:
+        _save(db_path, paciente, fecha, rpe, minutos)
+    assert workload.verify(db_path) == []
+    diaria, ewma = _tables(db_path)
+    with transaction(db_path) as c: workload.rebuild(c)
+    diaria_r, ewma_r = _tables(db_path)
+    assert diaria == diaria_r
+    assert [r[:2] for r in ewma] == [r[:2] for r in ewma_r]
+    for row, row_r in zip(ewma, ewma_r):
+        assert row[2:] == pytest.approx(row_r[2:], rel=1e-9)
@@ -0,0 +1,200 @@
+import datetime
+import sys
+import numpy as np
+from scipy.signal import lfilter
+from db_pool import fetch_all, transaction
+
+# Carga de entrenamiento (sRPE = rpe * minutos) agregada por día y por atleta:
+# carga aguda (7 días) y crónica (28 días) como medias exponenciales (EWMA),
+# ACWR = aguda / crónica, monotonía (media / desviación de los últimos 7 días) y
+# strain (carga semanal * monotonía), según Foster y Williams et al.
+#
+# Dos tablas materializadas que se actualizan en la transacción de cada cuestionario:
+#   carga_diaria(paciente, dia, carga, sesiones)   suma del día
+#   carga_ewma(paciente, dia, aguda, cronica)      estado EWMA al último día con carga
+# Avanzar el estado un día sin carga es multiplicar por (1 - a), así que un
+# cuestionario nuevo actualiza el estado en O(1) sin releer el histórico.
+ACUTE_DAYS, CHRONIC_DAYS = 7, 28
+A_ACUTE, A_CHRONIC = 2 / (ACUTE_DAYS + 1), 2 / (CHRONIC_DAYS + 1)
+# "Zona óptima" del ACWR entre ACWR_LOW y ACWR_OPTIMAL_HIGH (la que se sombrea en la gráfica);
+# riesgo alto a partir de ACWR_HIGH, por encima de ella, o con una semana monótona
+ACWR_LOW, ACWR_OPTIMAL_HIGH = 0.8, 1.3
+ACWR_HIGH, MONOTONY_HIGH = 1.5, 2.0
+
+CREATE_SQL = [
+    "CREATE TABLE IF NOT EXISTS carga_diaria (paciente TEXT NOT NULL, dia TEXT NOT NULL, carga REAL DEFAULT 0, sesiones INTEGER DEFAULT 0, PRIMARY KEY (paciente, dia))",
+    "CREATE TABLE IF NOT EXISTS carga_ewma (paciente TEXT PRIMARY KEY NOT NULL, dia TEXT, aguda REAL DEFAULT 0, cronica REAL DEFAULT 0)",
+]
+
+_DAILY_AGG = """
+    SELECT paciente, substr(fecha, 1, 10), TOTAL(CAST(rpe AS FLOAT) * CAST(tiempo_entrenamiento AS FLOAT)), COUNT(*)
+    FROM cuestionarios WHERE paciente IS NOT NULL AND fecha IS NOT NULL AND {where} GROUP BY paciente, substr(fecha, 1, 10)
+"""
+
+
+def _days_between(d0, d1):
+    return (datetime.date.fromisoformat(d1) - datetime.date.fromisoformat(d0)).days
+
+
+def _ewma_state(c, paciente):
+    # Recalcula el estado de un atleta desde carga_diaria (solo si llega un día atrasado)
+    rows = c.execute("SELECT dia, carga FROM carga_diaria WHERE paciente = ? ORDER BY dia", (paciente,)).fetchall()
+    if not rows: return None
+    # y[d] = a*x[d] + (1-a)^gap * y[anterior] desenrollado: y = a * sum(x_j * (1-a)^edad_j),
+    # con edad_j = días entre j y el último día con carga (los días sin carga solo decaen)
+    dias = np.array([r[0] for r in rows], dtype="datetime64[D]")
+    carga = np.array([r[1] for r in rows], dtype=float)
+    age = (dias[-1] - dias).astype(np.int64)
+    return rows[-1][0], float(A_ACUTE * np.sum(carga * (1 - A_ACUTE) ** age)), float(A_CHRONIC * np.sum(carga * (1 - A_CHRONIC) ** age))
+
+
+def apply_questionnaire(c, row_id):
+    # Llamar dentro de la misma transacción que el INSERT en cuestionarios
+    row = c.execute("SELECT paciente, substr(fecha, 1, 10), CAST(rpe AS FLOAT) * CAST(tiempo_entrenamiento AS FLOAT) FROM cuestionarios WHERE id = ?", (row_id,)).fetchone()
+    if not row or row[0] is None or row[1] is None: return
+    paciente, dia, carga = row[0], row[1], row[2] or 0.0
+    c.execute("INSERT INTO carga_diaria (paciente, dia, carga, sesiones) VALUES (?, ?, ?, 1) "
+              "ON CONFLICT(paciente, dia) DO UPDATE SET carga = carga + excluded.carga, sesiones = sesiones + 1", (paciente, dia, carga))
+    state = c.execute("SELECT dia, aguda, cronica FROM carga_ewma WHERE paciente = ?", (paciente,)).fetchone()
+    if state is None or state[0] is None:
+        # Primer día del atleta: el EWMA parte de 0
+        new = (dia, A_ACUTE * carga, A_CHRONIC * carga)
+    elif dia == state[0]:
+        # Otra sesión el mismo día: la EWMA es lineal en la carga del día
+        new = (dia, state[1] + A_ACUTE * carga, state[2] + A_CHRONIC * carga)
+    elif dia > state[0]:
+        # Días sin carga entre medias: decaimiento y luego el día nuevo
+        gap = _days_between(state[0], dia)
+        new = (dia, state[1] * (1 - A_ACUTE) ** gap + A_ACUTE * carga, state[2] * (1 - A_CHRONIC) ** gap + A_CHRONIC * carga)
+    else:
+        # Sesión con fecha anterior al estado (importaciones): se recalcula ese atleta
+        new = _ewma_state(c, paciente)
+    c.execute("INSERT INTO carga_ewma (paciente, dia, aguda, cronica) VALUES (?, ?, ?, ?) "
+              "ON CONFLICT(paciente) DO UPDATE SET dia = excluded.dia, aguda = excluded.aguda, cronica = excluded.cronica", (paciente, *new))
+
+
+def apply_range(c, first_id, last_id):
+    # Importaciones masivas: suma por día las filas con id entre first_id y last_id y
+    # recalcula el estado EWMA solo de los atletas afectados
+    c.execute(f"INSERT INTO carga_diaria (paciente, dia, carga, sesiones) {_DAILY_AGG.format(where='id BETWEEN ? AND ?')} "
+              "ON CONFLICT(paciente, dia) DO UPDATE SET carga = carga + excluded.carga, sesiones = sesiones + excluded.sesiones", (first_id, last_id))
+    athletes = [r[0] for r in c.execute("SELECT DISTINCT paciente FROM cuestionarios WHERE id BETWEEN ? AND ? AND paciente IS NOT NULL", (first_id, last_id)).fetchall()]
+    for paciente in athletes:
+        c.execute("INSERT INTO carga_ewma (paciente, dia, aguda, cronica) VALUES (?, ?, ?, ?) "
+                  "ON CONFLICT(paciente) DO UPDATE SET dia = excluded.dia, aguda = excluded.aguda, cronica = excluded.cronica", (paciente, *_ewma_state(c, paciente)))
+    return athletes
+
+
+def daily_matrix(rows, athletes, end, days):
+    # Filas (paciente, dia, carga) -> matriz atletas x días rellenando con 0 los días sin sesión
+    index = {p: i for i, p in enumerate(athletes)}
+    start = end - datetime.timedelta(days=days - 1)
+    m = np.zeros((len(athletes), days))
+    if rows:
+        pi = np.array([index[r[0]] for r in rows])
+        di = np.array([(datetime.date.fromisoformat(r[1]) - start).days for r in rows])
+        ok = (di >= 0) & (di < days)
+        np.add.at(m, (pi[ok], di[ok]), np.array([r[2] for r in rows], dtype=float)[ok])
+    return m, start
+
+
+def weekly_monotony(m):
+    # Monotonía y strain de los últimos 7 días de cada fila (vectorizado)
+    week = m[:, -ACUTE_DAYS:]
+    mean, sd = week.mean(axis=1), week.std(axis=1)
+    monotony = np.divide(mean, sd, out=np.zeros_like(mean), where=sd > 0)
+    return monotony, week.sum(axis=1) * monotony
+
+
+def risk_flag(acwr, monotony, cronica):
+    if cronica <= 0: return "sin historial"
+    if acwr > ACWR_HIGH: return "riesgo alto"
+    if monotony > MONOTONY_HIGH: return "monotonía alta"
+    if acwr < ACWR_LOW: return "baja carga"
+    return "ok"
+
+
+def squad_status(path, athletes, today=None):
+    # Estado actual de toda la plantilla: dos consultas y aritmética vectorizada
+    athletes = list(dict.fromkeys(athletes))
+    if not athletes: return []
+    today = today or datetime.date.today()
+    marks = ", ".join("?" for _ in athletes)
+    state = {r[0]: r[1:] for r in fetch_all(path, f"SELECT paciente, dia, aguda, cronica FROM carga_ewma WHERE paciente IN ({marks})", athletes)}
+    since = (today - datetime.timedelta(days=ACUTE_DAYS - 1)).isoformat()
+    rows = fetch_all(path, f"SELECT paciente, dia, carga FROM carga_diaria WHERE dia >= ? AND paciente IN ({marks})", (since, *athletes))
+
+    gap = np.array([max(0, (today - datetime.date.fromisoformat(state[p][0])).days) if p in state and state[p][0] else 0 for p in athletes])
+    aguda = np.array([state[p][1] if p in state else 0.0 for p in athletes]) * (1 - A_ACUTE) ** gap
+    cronica = np.array([state[p][2] if p in state else 0.0 for p in athletes]) * (1 - A_CHRONIC) ** gap
+    acwr = np.divide(aguda, cronica, out=np.zeros_like(aguda), where=cronica > 0)
+    monotony, strain = weekly_monotony(daily_matrix(rows, athletes, today, ACUTE_DAYS)[0])
+    return [{"paciente": p, "aguda": float(aguda[i]), "cronica": float(cronica[i]), "acwr": float(acwr[i]),
+             "monotonia": float(monotony[i]), "strain": float(strain[i]), "riesgo": risk_flag(acwr[i], monotony[i], cronica[i])}
+            for i, p in enumerate(athletes)]
+
+
+def workload_curves(path, athletes, days=120, today=None):
+    # Series diarias de los últimos `days` días para graficar, todas las filas a la vez.
+    # El filtro recorre todo el histórico y luego se recorta la ventana, así el último
+    # punto coincide con carga_ewma aunque el histórico sea más largo que lo dibujado.
+    athletes = list(dict.fromkeys(athletes))
+    today = today or datetime.date.today()
+    marks = ", ".join("?" for _ in athletes)
+    rows = fetch_all(path, f"SELECT paciente, dia, carga FROM carga_diaria WHERE paciente IN ({marks}) ORDER BY dia", athletes)
+    first = min((datetime.date.fromisoformat(r[1]) for r in rows), default=today)
+    total_days = max(days, (today - first).days + 1)
+    m, start = daily_matrix(rows, athletes, today, total_days)
+    # EWMA por filas con un filtro IIR de primer orden: y[n] = a*x[n] + (1-a)*y[n-1]
+    aguda = lfilter([A_ACUTE], [1, -(1 - A_ACUTE)], m, axis=1)[:, -days:]
+    cronica = lfilter([A_CHRONIC], [1, -(1 - A_CHRONIC)], m, axis=1)[:, -days:]
+    acwr = np.divide(aguda, cronica, out=np.full_like(aguda, np.nan), where=cronica > 1e-9)
+    # Monotonía móvil de 7 días con sumas acumuladas (sin bucles por día)
+    cs = np.cumsum(np.pad(m, ((0, 0), (ACUTE_DAYS, 0))), axis=1)
+    cs2 = np.cumsum(np.pad(m ** 2, ((0, 0), (ACUTE_DAYS, 0))), axis=1)
+    wsum = (cs[:, ACUTE_DAYS:] - cs[:, :-ACUTE_DAYS])[:, -days:]
+    wsum2 = (cs2[:, ACUTE_DAYS:] - cs2[:, :-ACUTE_DAYS])[:, -days:]
+    mean = wsum / ACUTE_DAYS
+    sd = np.sqrt(np.maximum(wsum2 / ACUTE_DAYS - mean ** 2, 0))
+    monotony = np.divide(mean, sd, out=np.zeros_like(mean), where=sd > 1e-9)
+    dates = [start + datetime.timedelta(days=i) for i in range(total_days - days, total_days)]
+    return {"dias": dates, "atletas": athletes, "carga": m[:, -days:], "aguda": aguda, "cronica": cronica,
+            "acwr": acwr, "monotonia": monotony, "strain": wsum * monotony}
+
+
+def rebuild(c):
+    for sql in CREATE_SQL: c.execute(sql)
+    c.execute("DELETE FROM carga_diaria")
+    c.execute("DELETE FROM carga_ewma")
+    c.execute(f"INSERT INTO carga_diaria (paciente, dia, carga, sesiones) {_DAILY_AGG.format(where='1')}")
+    for (paciente,) in c.execute("SELECT DISTINCT paciente FROM carga_diaria").fetchall():
+        c.execute("INSERT INTO carga_ewma (paciente, dia, aguda, cronica) VALUES (?, ?, ?, ?)", (paciente, *_ewma_state(c, paciente)))
+
+
+def verify(path, tolerance=1e-6):
+    # Compara el estado incremental con un recálculo vectorizado desde carga_diaria
+    state = {r[0]: r[1:] for r in fetch_all(path, "SELECT paciente, dia, aguda, cronica FROM carga_ewma")}
+    if not state: return []
+    athletes = sorted(state)
+    drift = []
+    for p in athletes:
+        dia, aguda, cronica = state[p]
+        curves = workload_curves(path, [p], days=1, today=datetime.date.fromisoformat(dia))
+        for col, saved in (("aguda", aguda), ("cronica", cronica)):
+            real = float(curves[col][0, -1])
+            if abs(saved - real) > tolerance * max(1, abs(real)): drift.append((p, col, saved, real))
+    return drift
+
+
+if __name__ == "__main__":
+    # python workload.py [ruta.db] [--rebuild]
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    path = args[0] if args else "database.db"
+    drift = verify(path)
+    for paciente, col, saved, real in drift:
+        print(f"⚠️ {paciente}.{col}: guardado={saved} real={real}")
+    print(f"Desviaciones encontradas: {len(drift)}")
+    if "--rebuild" in sys.argv:
+        with transaction(path) as c: rebuild(c)
+        print(f"✅ carga_diaria/carga_ewma reconstruidas. Desviaciones tras reconstruir: {len(verify(path))}")
+    elif drift: sys.exit(1)